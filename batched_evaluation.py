@@ -0,0 +1,275 @@
+"""Monte-Carlo evaluation of the block tasks over many randomized layouts at once, with a kinematic proxy of the primitives.
+
+One Genesis scene is built with N parallel envs (scenes.create_scene_batched),
+each with its own random block layout. All envs are driven in lockstep:
+
+    1. read block, hand and gripper states of all envs in batched calls
+    2. ground every env (symbolic_abstraction.ground_facts) and plan its
+       next action (task_planning.TaskPlanner, with a plan cache since
+       most envs go through the same symbolic states)
+    3. turn every env's action into the same sequence of phases (hover,
+       descend, close/open gripper, lift), solve IK for all envs in one
+       batched call per phase and interpolate in joint space
+
+Sampling-based motion planning (PlannerInterface.plan_path) only supports a
+single env, so the phases move in straight joint-space interpolations.
+Envs that reached their goal (or failed) hold their pose until all are
+done. Only the blocks world domain (goals 1-3) is supported.
+
+The phases are a kinematic proxy of MotionPrimitives, not the primitives
+themselves: fixed-length interpolations with no motion planner, no
+settling, no attach_object and their own put-down spots. The success rate
+and time-to-goal therefore evaluate grounding and task planning under this
+simplified controller, not the execution demo.py runs.
+
+Run:
+    python batched_evaluation.py --goal 1 --layout 6blocks --envs 256 [--gpu]
+"""
+import argparse
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+import genesis as gs
+from genesis.utils.misc import tensor_to_array
+
+from caching import PersistentLRUCache
+from scenes import create_scene_batched
+from symbolic_abstraction import BLOCKS_PREDICATES, GOALS, ground_facts
+from symbolic_state import Action, SymbolicProblem, SymbolicState, parse_facts
+from task_planning import TaskPlanner
+
+# steps of each phase of a primitive
+MOVE_STEPS = 100
+GRIP_STEPS = 50
+# hand height above the block it grasps / is placed on (same offsets as motion_primitives)
+HOVER_Z = 0.21
+GRASP_Z = 0.11
+STACK_Z = 0.16
+# free spots to put blocks down at
+PUT_DOWN_HOVER_Z = 0.18
+PUT_DOWN_Z = 0.13
+PUT_DOWN_CLEARANCE = 0.15
+HAND_QUAT = np.array([0.0, 1.0, 0.0, 0.0])
+GRIPPER_OPEN = 0.04
+
+
+class BatchedEvaluator:
+    def __init__(self, layout: str, goal_num: int, n_envs: int, headless: bool = True,
+                 max_actions: int = 30, seed: Optional[int] = None):
+        """Build the batched scene and the task planner.
+
+        Args:
+            layout: layout name (see scenes.load_layout), e.g. "6blocks", "8blocks" or "stacked"
+            goal_num: 1, 2 or 3 (see symbolic_abstraction.GOALS)
+            n_envs: number of parallel envs, i.e. randomized layouts
+            headless: no viewer/rendering
+            max_actions: envs that have not reached the goal after this many actions count as failed
+            seed: seed for the put-down spot sampling
+        """
+        if goal_num not in GOALS:
+            gs.raise_exception(f"Batched evaluation only supports goals {list(GOALS)}.")
+        self.goal_num = goal_num
+        self.goal = parse_facts(GOALS[goal_num])
+        self.n_envs = n_envs
+        self.max_actions = max_actions
+        self.rng = np.random.default_rng(seed)
+
+        self.scene, self.franka, self.blocks, self.initial_positions = create_scene_batched(layout, n_envs, headless=headless)
+        self.block_names = list(self.blocks.keys())
+        self.hand = self.franka.get_link("hand")
+        self.motors_dof = np.arange(7)
+        self.fingers_dof = np.arange(7, 9)
+        self.dt = self.scene.sim_options.dt
+
+        self.task_planner = TaskPlanner("domain.pddl", search="bfs", plan_cache=PersistentLRUCache(max_entries=4096))
+
+        self.gripper_closed = np.zeros(n_envs, dtype=bool)
+        self.n_actions = np.zeros(n_envs, dtype=int)
+        self.done = np.zeros(n_envs, dtype=bool)
+        self.failed = np.zeros(n_envs, dtype=bool)
+        self.time_to_goal = np.full(n_envs, np.nan)
+        self.n_steps = 0
+
+        # start with the gripper open in every env
+        self.franka.control_dofs_position(np.full((n_envs, 2), GRIPPER_OPEN), self.fingers_dof)
+
+    # ------------------------------------------------------------------ state
+
+    def _block_positions(self) -> np.ndarray:
+        links_idx = [block.link_start for block in self.blocks.values()]
+        pos = tensor_to_array(self.scene.rigid_solver.get_links_pos(links_idx))
+        return np.asarray(pos, dtype=float).reshape(self.n_envs, len(links_idx), 3)
+
+    def ground(self) -> List[SymbolicState]:
+        """Symbolic state of every env."""
+        block_pos = self._block_positions()
+        ee_pos = np.asarray(tensor_to_array(self.hand.get_pos()), dtype=float).reshape(self.n_envs, 3)
+        gripper_qpos = np.asarray(tensor_to_array(self.franka.get_qpos()), dtype=float).reshape(self.n_envs, -1)[:, -2:]
+        objects = {name: "block" for name in self.block_names}
+        return [
+            SymbolicState(objects, ground_facts(self.block_names, block_pos[i], ee_pos[i], gripper_qpos[i]))
+            for i in range(self.n_envs)
+        ]
+
+    # -------------------------------------------------------------- execution
+
+    def _phases(self, actions: List[Optional[Action]], block_pos: np.ndarray, ee_pos: np.ndarray):
+        """Hand targets of every env for each phase: hover, descend, grip, lift.
+
+        Returns:
+            list of (hand positions (n_envs, 3) or None for a gripper phase, envs_to_close, envs_to_open)
+        """
+        index = {name: i for i, name in enumerate(self.block_names)}
+        hover = ee_pos.copy()
+        target = ee_pos.copy()
+        close = np.zeros(self.n_envs, dtype=bool)
+        release = np.zeros(self.n_envs, dtype=bool)
+        for i_env, action in enumerate(actions):
+            if action is None:
+                continue
+            name = action[0]
+            if name in ("pick-up", "unstack"):
+                block = block_pos[i_env, index[action[1]]]
+                hover[i_env] = block + (0.005, 0.0, HOVER_Z)
+                target[i_env] = block + (0.005, 0.0, GRASP_Z)
+                close[i_env] = True
+            elif name == "stack":
+                below = block_pos[i_env, index[action[2]]]
+                hover[i_env] = below + (0.005, 0.0, HOVER_Z)
+                target[i_env] = below + (0.005, 0.0, STACK_Z)
+                release[i_env] = True
+            elif name == "put-down":
+                spot = self._free_spot(block_pos[i_env])
+                hover[i_env] = spot + (0.0, 0.0, PUT_DOWN_HOVER_Z)
+                target[i_env] = spot + (0.0, 0.0, PUT_DOWN_Z)
+                release[i_env] = True
+        return [(hover, None, None), (target, None, None), (None, close, release), (hover, None, None)]
+
+    def _free_spot(self, block_pos: np.ndarray) -> np.ndarray:
+        # same area as MotionPrimitives.generateValidState, sampled in one go; the first
+        # candidate with enough clearance from all blocks, else the one with the most
+        candidates = np.column_stack([
+            self.rng.uniform(0.45, 0.65, 64), self.rng.uniform(-0.4, 0.4, 64), np.zeros(64),
+        ])
+        dist = np.linalg.norm(candidates[:, None, :2] - block_pos[None, :, :2], axis=-1).min(axis=1)
+        free = dist >= PUT_DOWN_CLEARANCE
+        return candidates[np.argmax(free)] if free.any() else candidates[np.argmax(dist)]
+
+    def _move(self, hand_pos: np.ndarray, active: np.ndarray) -> None:
+        """Move the hand of all `active` envs to `hand_pos` with one batched IK and joint interpolation."""
+        q_start = np.asarray(tensor_to_array(self.franka.get_qpos()), dtype=float).reshape(self.n_envs, -1)
+        q_goal = tensor_to_array(self.franka.inverse_kinematics(
+            link=self.hand,
+            pos=hand_pos,
+            quat=np.tile(HAND_QUAT, (self.n_envs, 1)),
+            init_qpos=q_start,
+        ))
+        q_goal = np.asarray(q_goal, dtype=float).reshape(self.n_envs, -1)
+        # inactive envs hold their pose
+        q_goal[~active] = q_start[~active]
+        for s in np.linspace(0.0, 1.0, MOVE_STEPS + 1)[1:]:
+            q = q_start + s * (q_goal - q_start)
+            self.franka.control_dofs_position(q[:, :7], self.motors_dof)
+            self._step()
+
+    def _grip(self, close: np.ndarray, release: np.ndarray) -> None:
+        self.gripper_closed[close] = True
+        self.gripper_closed[release] = False
+        closed_envs = np.flatnonzero(self.gripper_closed)
+        open_envs = np.flatnonzero(~self.gripper_closed)
+        if len(closed_envs):
+            self.franka.control_dofs_force(np.tile([-1.0, -1.0], (len(closed_envs), 1)), self.fingers_dof, envs_idx=closed_envs)
+        if len(open_envs):
+            self.franka.control_dofs_position(np.full((len(open_envs), 2), GRIPPER_OPEN), self.fingers_dof, envs_idx=open_envs)
+        for _ in range(GRIP_STEPS):
+            self._step()
+
+    def _step(self) -> None:
+        self.scene.step()
+        self.n_steps += 1
+
+    def step(self) -> bool:
+        """Ground, plan and execute one action in every env still running.
+
+        Returns:
+            True once every env has either reached its goal or failed
+        """
+        states = self.ground()
+        goal = frozenset(self.goal)
+        actions: List[Optional[Action]] = [None] * self.n_envs
+        for i_env, state in enumerate(states):
+            if self.done[i_env] or self.failed[i_env]:
+                continue
+            if goal <= state.facts:
+                self.done[i_env] = True
+                self.time_to_goal[i_env] = self.n_steps * self.dt
+                continue
+            if self.n_actions[i_env] >= self.max_actions:
+                self.failed[i_env] = True
+                continue
+            plan = self.task_planner.plan_problem(SymbolicProblem("BLOCKS", state.select(BLOCKS_PREDICATES), self.goal))
+            if not plan:
+                self.failed[i_env] = True
+                continue
+            actions[i_env] = plan[0]
+            self.n_actions[i_env] += 1
+
+        active = np.array([action is not None for action in actions])
+        if not active.any():
+            return True
+
+        block_pos = self._block_positions()
+        ee_pos = np.asarray(tensor_to_array(self.hand.get_pos()), dtype=float).reshape(self.n_envs, 3)
+        for hand_pos, close, release in self._phases(actions, block_pos, ee_pos):
+            if hand_pos is None:
+                self._grip(close, release)
+            else:
+                self._move(hand_pos, active)
+        return False
+
+    def run(self) -> Dict[str, float]:
+        """Run all envs to completion and return the statistics (see stats)."""
+        start = time.perf_counter()
+        while not self.step():
+            pass
+        stats = self.stats()
+        stats["wall_time_s"] = time.perf_counter() - start
+        return stats
+
+    def stats(self) -> Dict[str, float]:
+        """Success rate and time-to-goal (simulated seconds) of the kinematic proxy over all envs."""
+        times = self.time_to_goal[self.done]
+        stats = {
+            "controller": "kinematic proxy",
+            "n_envs": self.n_envs,
+            "success_rate": float(self.done.mean()),
+            "mean_actions": float(self.n_actions[self.done].mean()) if self.done.any() else float("nan"),
+            "sim_time_s": self.n_steps * self.dt,
+        }
+        for name, fn in (("mean", np.mean), ("median", np.median), ("p90", lambda t: np.percentile(t, 90)), ("max", np.max)):
+            stats[f"time_to_goal_{name}_s"] = float(fn(times)) if len(times) else float("nan")
+        return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--goal", type=int, default=1, choices=sorted(GOALS))
+    parser.add_argument("--layout", default="6blocks")
+    parser.add_argument("--envs", type=int, default=256)
+    parser.add_argument("--max-actions", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--gpu", action="store_true")
+    parser.add_argument("--viewer", action="store_true")
+    args = parser.parse_args()
+
+    gs.init(backend=gs.gpu if args.gpu else gs.cpu, logging_level='Warning', logger_verbose_time=False)
+    evaluator = BatchedEvaluator(args.layout, args.goal, args.envs, headless=not args.viewer,
+                                 max_actions=args.max_actions, seed=args.seed)
+    stats = evaluator.run()
+    for key, value in stats.items():
+        print(f"{key:>22}: {value:.4g}" if isinstance(value, float) else f"{key:>22}: {value}")
+
+
+if __name__ == "__main__":
+    main()
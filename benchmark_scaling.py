@@ -0,0 +1,149 @@
+"""How grounding, task planning, motion planning and execution scale with the number of blocks.
+
+Sweeps N over procedurally generated scenes (procedural_scenes.py) and, for
+each one:
+
+    1. builds the scene headless and grounds it (symbolic_abstraction.ground_scene)
+    2. plans the whole task (task_planning.TaskPlanner; the compact slot
+       encoding for structures, domain.pddl otherwise)
+    3. executes the plan open loop with the motion primitives; the
+       profiler's plan_path spans (and the slot_poses.build span of
+       structures) are the motion planning time, its scene.step spans the
+       simulation time (see profiling.py)
+
+With --symbolic-only no scene is built: the generated block positions are
+grounded directly (symbolic_abstraction.ground_facts) and only stages 1 and 2
+run, so the symbolic side can be swept much further.
+
+Run:
+    python benchmark_scaling.py --kind table --blocks 6 10 16 24 --seeds 0 1 [--symbolic-only] [--pipelined] [--gpu] [--trace trace.json]
+"""
+import argparse
+import time
+from typing import Any, Dict
+
+import numpy as np
+import genesis as gs
+
+import motion_primitives as motionp
+from pipelined_execution import PipelinedExecutor
+from procedural_scenes import KINDS, generate_layout
+from profiling import profiler
+from scenes import build_scene_from_layout, sample_layout
+from settling import step_until_settled
+from slot_encoding import SlotEncoding
+from symbolic_abstraction import BLOCKS_PREDICATES, SPECIAL_PREDICATES, ground_facts, ground_scene
+from symbolic_state import SymbolicProblem, SymbolicState
+from task_planning import TaskPlanner
+
+# hand above the table with the gripper open, as after scenes.DEFAULT_QPOS
+EE_POS = (0.3, 0.0, 0.5)
+GRIPPER_OPEN = (0.04, 0.04)
+
+
+def make_task_planner(layout: Dict[str, Any], search: str) -> TaskPlanner:
+    if layout["slot_names"]:
+        return SlotEncoding(layout["slot_facts"], name="SLOTS-" + layout["name"].upper()).task_planner(search=search)
+    return TaskPlanner("domain.pddl", search=search)
+
+
+def make_problem(layout: Dict[str, Any], state: SymbolicState) -> SymbolicProblem:
+    if layout["slot_names"]:
+        return SymbolicProblem("BLOCKS2", state.select(SPECIAL_PREDICATES).union(layout["slot_facts"]), layout["goal"])
+    return SymbolicProblem("BLOCKS", state.select(BLOCKS_PREDICATES), layout["goal"])
+
+
+def run_symbolic(layout: Dict[str, Any], search: str) -> Dict[str, Any]:
+    """Stages 1 and 2 on the generated positions, without a scene."""
+    block_pos, slot_pos = sample_layout(layout)
+    objects = {name: "block" for name in layout["block_names"]}
+    objects.update({name: "slot" for name in layout["slot_names"]})
+    task_planner = make_task_planner(layout, search)
+
+    start = time.perf_counter()
+    facts = ground_facts(
+        list(layout["block_names"]), block_pos, np.asarray(EE_POS), np.asarray(GRIPPER_OPEN),
+        list(layout["slot_names"]) or None, slot_pos if layout["slot_names"] else None,
+    )
+    problem = make_problem(layout, SymbolicState(objects, facts))
+    grounded = time.perf_counter()
+    plan = task_planner.plan_problem(problem)
+    planned = time.perf_counter()
+    return {
+        "grounding_s": grounded - start,
+        "task_plan_s": planned - grounded,
+        "motion_plan_s": float("nan"),
+        "execution_s": float("nan"),
+        "sim_time_s": float("nan"),
+        "plan_length": None if plan is None else len(plan),
+    }
+
+
+def run_full(layout: Dict[str, Any], search: str, pipelined: bool = False) -> Dict[str, Any]:
+    """All four stages on a headless scene."""
+    scene, franka, blocks_state, slots_state = build_scene_from_layout(layout, headless=True)
+    # let the blocks settle before grounding
+    step_until_settled(scene, blocks=list(blocks_state.values()), max_steps=50)
+    task_planner = make_task_planner(layout, search)
+
+    start = time.perf_counter()
+    state = ground_scene(scene, franka, blocks_state, slots_state or None)
+    problem = make_problem(layout, state)
+    grounded = time.perf_counter()
+    plan = task_planner.plan_problem(problem)
+    planned = time.perf_counter()
+
+    # only the execution goes into the profile, the other stages are timed above
+    profiler.reset()
+    if plan is not None:
+        motion = motionp.MotionPrimitives(franka, scene, blocks_state, slots_state or None)
+        if pipelined:
+            PipelinedExecutor(motion).run(plan)
+        else:
+            for action in plan:
+                motion.executeAction(action)
+    summary = profiler.summary()
+    return {
+        "grounding_s": grounded - start,
+        "task_plan_s": planned - grounded,
+        "motion_plan_s": sum(summary["stages"].get(stage, {}).get("total_s", 0.0) for stage in ("plan_path", "slot_poses.build")),
+        "execution_s": summary["stages"].get("scene.step", {}).get("total_s", 0.0),
+        "sim_time_s": summary["counters"].get("sim_steps", 0) * scene.sim_options.dt,
+        "plan_length": None if plan is None else len(plan),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--kind", default="table", choices=KINDS)
+    parser.add_argument("--blocks", type=int, nargs="+", default=[6, 10, 16, 24])
+    parser.add_argument("--seeds", type=int, nargs="+", default=[0])
+    parser.add_argument("--max-height", type=int, default=4)
+    parser.add_argument("--search", default="gbf", choices=["bfs", "gbf"])
+    parser.add_argument("--symbolic-only", action="store_true")
+    parser.add_argument("--pipelined", action="store_true", help="plan each next motion during execution")
+    parser.add_argument("--gpu", action="store_true")
+    parser.add_argument("--trace", default=None, help="save a Chrome trace of the last scene's execution")
+    args = parser.parse_args()
+
+    if not args.symbolic_only:
+        gs.init(backend=gs.gpu if args.gpu else gs.cpu, logging_level='Warning', logger_verbose_time=False)
+        profiler.enable()
+
+    print(f"{'blocks':>6} {'seed':>5} {'ground [s]':>10} {'task [s]':>9} {'motion [s]':>10} "
+          f"{'exec [s]':>9} {'sim [s]':>8} {'plan':>5}")
+    for n_blocks in args.blocks:
+        for seed in args.seeds:
+            layout = generate_layout(n_blocks, kind=args.kind, seed=seed, max_height=args.max_height)
+            result = run_symbolic(layout, args.search) if args.symbolic_only else run_full(layout, args.search, args.pipelined)
+            print(
+                f"{n_blocks:>6} {seed:>5} {result['grounding_s']:>10.4f} {result['task_plan_s']:>9.4f} "
+                f"{result['motion_plan_s']:>10.4f} {result['execution_s']:>9.4f} {result['sim_time_s']:>8.2f} "
+                f"{str(result['plan_length']):>5}"
+            )
+    if args.trace is not None and not args.symbolic_only:
+        profiler.save_chrome_trace(args.trace)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Bounded LRU cache with optional on-disk storage.
+
+Used to memoize expensive results (motion plans, task plans, IK solutions)
+across calls and, when a path is given, across runs.
+
+Usage:
+    cache = PersistentLRUCache(max_entries=256, path="plans.pkl")
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        cache.put(key, value)   # saved to disk when autosave is on
+"""
+import hashlib
+import os
+import pickle
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+import numpy as np
+
+
+def quantize(values, step: float) -> tuple:
+    """Round `values` to a grid of size `step` and return a hashable tuple of ints."""
+    return tuple(int(v) for v in np.round(np.asarray(values, dtype=float).ravel() / step))
+
+
+def stable_hash(obj: Any) -> str:
+    """Hash of `obj`'s repr that is stable across processes (unlike `hash` on strings)."""
+    return hashlib.sha1(repr(obj).encode("utf-8")).hexdigest()
+
+
+class PersistentLRUCache:
+    def __init__(self, max_entries: int = 1024, path: Optional[str] = None, autosave: bool = True):
+        """
+        Args:
+            max_entries: least recently used entries are evicted beyond this size
+            path: optional pickle file the cache is loaded from and saved to
+            autosave: save to `path` after every insertion
+        """
+        self.max_entries = max_entries
+        self.path = path
+        self.autosave = autosave
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if path is not None and os.path.exists(path):
+            self.load()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        if key not in self._entries:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return self._entries[key]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        if self.autosave and self.path is not None:
+            self.save()
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        return self._entries.pop(key, default)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def save(self, path: Optional[str] = None) -> None:
+        path = path or self.path
+        # write to a temp file first so an interrupted save never corrupts the cache
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(list(self._entries.items()), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    def load(self, path: Optional[str] = None) -> None:
+        path = path or self.path
+        with open(path, "rb") as f:
+            entries = pickle.load(f)
+        self._entries = OrderedDict(entries[-self.max_entries:])
@@ -3,15 +3,33 @@ import numpy as np
 import genesis as gs
 from scenes import create_scene_6blocks, create_scene_stacked, create_scene_special_1, create_scene_special_2, create_scene_8blocks
 from symbolic_abstraction import generate_pddl, generate_pddl_special
-import pyperplan
-import subprocess
-from pathlib import Path
+from slot_encoding import SlotEncoding
+from task_planning import TaskPlanner, write_plan
+from caching import PersistentLRUCache
+from profiling import profiler
 import motion_primitives as motionp
+from pipelined_execution import PipelinedExecutor
 from time import sleep
 
+# Plan the special structures with the compiled slot encoding (slot_encoding.py)
+# instead of custom_domain.pddl (see benchmark_slot_encoding.py), off by default
+COMPACT_SLOT_ENCODING = False
+
+
+# Command line flags: "gpu" to simulate on the GPU, "headless" to run without the viewer,
+# "profile" to time every stage and save profile_trace.json (open in chrome://tracing),
+# "pipelined" to plan the next action's motion while the current one executes (goals 3-5),
+# "roadmap" to answer the primitives' motion queries from the persistent roadmap (saved to roadmap.npz),
+# "batch" to collision check motions on a batched copy of the scene (one collision detection per 32 states)
+headless = "headless" in sys.argv[1:]
+pipelined = "pipelined" in sys.argv[1:]
+use_roadmap = "roadmap" in sys.argv[1:]
+batch_checks = "batch" in sys.argv[1:]
+if "profile" in sys.argv[1:]:
+    profiler.enable()
 
 # Ensure Genesis is initialized before building scenes
-if len(sys.argv) > 1 and sys.argv[1] == "gpu":
+if "gpu" in sys.argv[1:]:
     gs.init(backend=gs.gpu, logging_level='Warning', logger_verbose_time=False)
 else:
     gs.init(backend=gs.cpu, logging_level='Warning', logger_verbose_time=False)
@@ -42,53 +60,55 @@ while not valid_goal:
     if goal_num == 1 or goal_num == 2:
         while not valid_scene:
             if scene_num == 1:
-                scene, franka, BlocksState = create_scene_6blocks()
+                scene, franka, BlocksState = create_scene_6blocks(headless=headless)
                 valid_scene = True
             elif scene_num == 2:
-                scene, franka, BlocksState = create_scene_stacked()
+                scene, franka, BlocksState = create_scene_stacked(headless=headless)
                 valid_scene = True
             else:
                 scene_num = int(input("Please enter a valid scene number (1 or 2): "))
         valid_goal = True
     elif goal_num == 3:
-        scene, franka, BlocksState = create_scene_8blocks()
+        scene, franka, BlocksState = create_scene_8blocks(headless=headless)
         valid_goal = True
     elif goal_num == 4:
-        scene, franka, BlocksState, SlotsState = create_scene_special_1()
+        scene, franka, BlocksState, SlotsState = create_scene_special_1(headless=headless)
         valid_goal = True
     elif goal_num == 5:
-        scene, franka, BlocksState, SlotsState = create_scene_special_2() 
+        scene, franka, BlocksState, SlotsState = create_scene_special_2(headless=headless) 
         valid_goal = True
     else:
         goal_num = int(input("Please enter a valid goal number (1-5): "))
 
-# Symbolically abstract scene to formulate pddl problem (generates .pddl file after call)
+# Plans of already solved symbolic states, kept across runs
+plan_cache = PersistentLRUCache(max_entries=4096, path="plan_cache.pkl")
+
+# Parse the domain once and keep it in memory for all (re-)planning
 if goal_num == 1 or goal_num == 2 or goal_num == 3:
-    generate_pddl(scene, franka, BlocksState, goal_num)
+    # Run pyperplan with bfs
+    task_planner = TaskPlanner("domain.pddl", search="bfs", plan_cache=plan_cache)
+elif COMPACT_SLOT_ENCODING:
+    # Slot relations of the structure compiled into a much smaller domain
+    slot_encoding = SlotEncoding.from_init_file("Init_1.txt" if goal_num == 4 else "Init_2.txt")
+    task_planner = slot_encoding.task_planner(search="gbf", plan_cache=plan_cache)
 else:
-    generate_pddl_special(scene, franka, BlocksState, SlotsState, goal_num)
+    # Run pyperplan with greedy best first search rather than bfs
+    task_planner = TaskPlanner("custom_domain.pddl", search="gbf", plan_cache=plan_cache)
 
-# Check if pddl was properly generated, otherwise, throw an error
-pddl_problem = Path("problem.pddl")
-if not pddl_problem.exists():
-    raise FileNotFoundError(f"The file {pddl_problem} does not exist.")
-else:
+def plan_task():
+    """Symbolically abstract the scene, plan in-process and save actions to actions.soln (also returned)."""
     if goal_num == 1 or goal_num == 2 or goal_num == 3:
-        pddl_domain = Path("domain.pddl")
-        # Run pyperplan with bfs
-        subprocess.run([
-            "pyperplan", str(pddl_domain), str(pddl_problem)],
-            check=True
-        )
+        problem = generate_pddl(scene, franka, BlocksState, goal_num)
     else:
-        pddl_domain = Path("custom_domain.pddl")
-        # Run pyperplan with greedy best first search rather than bfs
-        subprocess.run([
-            "pyperplan", "-s", "gbf", str(pddl_domain), str(pddl_problem)],
-            check=True
-        )
-    # Save actions to .soln file & rename it 
-    Path("problem.pddl.soln").rename("actions.soln")
+        problem = generate_pddl_special(scene, franka, BlocksState, SlotsState, goal_num)
+    plan = task_planner.plan_problem(problem)
+    if plan is None:
+        raise RuntimeError("No plan found for the current scene.")
+    write_plan(plan, "actions.soln")
+    return plan
+
+# Symbolically abstract scene to formulate pddl problem and solve it
+plan = plan_task()
 
 franka.set_dofs_kp(
     np.array([4500, 4500, 3500, 3500, 2000, 2000, 2000, 100, 100]),
@@ -102,10 +122,19 @@ franka.set_dofs_force_range(
 )
 
 
-motion = motionp.MotionPrimitives(franka, scene, BlocksState)
+motion = motionp.MotionPrimitives(franka, scene, BlocksState, SlotsState if goal_num >= 4 else None)
+if batch_checks:
+    motion.planner.enable_batch_checks()
+if use_roadmap:
+    # built once (or loaded), then reused for every pick/place query
+    motion.planner.build_roadmap(path="roadmap.npz")
+    motion.planner.default_planner = "roadmap"
 
 ##  No re-planning
-if (goal_num >= 3):
+if (goal_num >= 3) and pipelined and (goal_num == 3 or COMPACT_SLOT_ENCODING):
+    # motion planning of the next action overlaps with the execution of the current one
+    PipelinedExecutor(motion).run(plan)
+elif (goal_num >= 3):
     motion.runSolution('actions.soln')
 else:
     # With re-planning
@@ -119,33 +148,11 @@ else:
             else:
                 print("Re-ground predicates and re-planning")
                 finished = motion.runSolutionStep("actions.soln")
-                motion.scene.step(50)
-                # Symbolically abstract scene to formulate pddl problem (generates .pddl file after call)
-                if goal_num == 1 or goal_num == 2 or goal_num == 3:
-                    generate_pddl(scene, franka, BlocksState, goal_num)
-                else:
-                    generate_pddl_special(scene, franka, BlocksState, SlotsState, goal_num)
-
-                # Check if pddl was properly generated, otherwise, throw an error
-                pddl_problem = Path("problem.pddl")
-                if not pddl_problem.exists():
-                    raise FileNotFoundError(f"The file {pddl_problem} does not exist.")
-                else:
-                    if goal_num == 1 or goal_num == 2 or goal_num == 3:
-                        pddl_domain = Path("domain.pddl")
-                        # Run pyperplan with bfs
-                        subprocess.run([
-                            "pyperplan", str(pddl_domain), str(pddl_problem)],
-                            check=True
-                        )
-                    else:
-                        pddl_domain = Path("custom_domain.pddl")
-                        # Run pyperplan with greedy best first search rather than bfs
-                        subprocess.run([
-                            "pyperplan", "-s", "gbf", str(pddl_domain), str(pddl_problem)],
-                            check=True
-                        )
-                    # Save actions to .soln file & rename it 
-                    Path("problem.pddl.soln").rename("actions.soln")
-
+                # wait for the robot and blocks to come to rest before re-grounding
+                motion.settle(max_steps=50)
+                # Symbolically abstract scene, re-plan and save actions to actions.soln
+                plan_task()
 
+if profiler.enabled:
+    profiler.print_summary()
+    profiler.save_chrome_trace("profile_trace.json")
@@ -7,17 +7,163 @@ import torch
 from typing import Any
 from genesis.utils.misc import tensor_to_array
 from scipy.spatial.transform import Rotation as R
+from slot_poses import SlotPoseTable
+from plan_parser import as_plan_action, read_plan
+from symbolic_state import fact_to_str
+from caching import PersistentLRUCache, quantize
+from profiling import profiler
+from settling import step_until_settled
+from trajectory import FRANKA_ACC_LIMITS, FRANKA_VEL_LIMITS, time_parameterize
+
+# max position (m) and rotation (rad) error of an IK solution that is cached
+IK_POS_TOL = 1e-3
+IK_ROT_TOL = 1e-2
+
+
+class IKService:
+    """Hand IK for all the poses of a primitive in one call.
+
+    With the planner's batched collision model (PlannerInterface.enable_batch_checks)
+    the poses missing from the cache are solved in one batched IK call, one
+    env per pose, all warm-started from the current qpos. Without it they are
+    solved in order, each warm-started from the solution of the previous one.
+    Converged arm solutions (pose error below IK_POS_TOL/IK_ROT_TOL) are kept
+    in a bounded cache keyed by the quantized target pose, so approaching the
+    same block or slot pose again skips the solver. The other dofs (fingers)
+    of every solution are those of the current qpos.
+
+    Usage:
+        pre_qpos, place_qpos, post_qpos = ik.solve([(pre_pos, quat), (place_pos, quat), (post_pos, quat)])
+    """
+
+    def __init__(self, robot: Any, link: str = "hand", max_entries: int = 1024, step: float = 1e-3,
+                 arm_dofs=np.arange(7), planner_interface: Any = None):
+        """
+        Args:
+            robot: robot (adapter) to solve for
+            link: name of the link the poses are for
+            max_entries: least recently used solutions are evicted beyond this size
+            step: quantization of the target position (m) and quaternion of the cache keys
+            arm_dofs: dofs the IK solves for, the others are kept
+            planner_interface: planning.PlannerInterface whose batched model, if enabled, solves the poses in one call
+        """
+        self.robot = robot
+        self.link_name = link
+        self.link = robot.get_link(link)
+        self.step = step
+        self.arm_dofs = np.asarray(arm_dofs)
+        self.planner_interface = planner_interface
+        self.cache = PersistentLRUCache(max_entries=max_entries, autosave=False)
+
+    def solve(self, poses, init_qpos=None):
+        """Joint configurations (tensors) reaching every (pos, quat) in `poses`."""
+        qpos_cur = np.array(tensor_to_array(self.robot.get_qpos() if init_qpos is None else init_qpos), dtype=float)
+        poses = [(np.asarray(tensor_to_array(pos), dtype=float), np.asarray(tensor_to_array(quat), dtype=float))
+                 for pos, quat in poses]
+        keys = [(quantize(pos, self.step), quantize(quat, self.step)) for pos, quat in poses]
+        with profiler.span("ik_service", n_poses=len(poses)):
+            arms = [self.cache.get(key) for key in keys]
+            missing = [i for i, arm in enumerate(arms) if arm is None]
+            profiler.count("ik_cache_hits", len(poses) - len(missing))
+            if missing:
+                profiler.count("ik_solves", len(missing))
+                batch_robot = None if self.planner_interface is None else self.planner_interface.batch_robot
+                if batch_robot is not None and len(missing) <= self.planner_interface.batch_n_envs:
+                    solved = self._solve_batched(batch_robot, [poses[i] for i in missing], qpos_cur)
+                else:
+                    solved = self._solve_chained(poses, missing, arms, qpos_cur)
+                for i, (arm, converged) in zip(missing, solved):
+                    arms[i] = arm
+                    if converged:
+                        self.cache.put(keys[i], arm)
+                    else:
+                        profiler.count("ik_unconverged")
+
+        solutions = []
+        for arm in arms:
+            solution = qpos_cur.copy()
+            solution[self.arm_dofs] = arm
+            solutions.append(torch.as_tensor(solution, dtype=gs.tc_float, device=gs.device))
+        return solutions
+
+    def _solve_batched(self, batch_robot, poses, qpos_cur):
+        # one env per pose, the envs beyond len(poses) are left as they are
+        n_poses = len(poses)
+        qpos, error = batch_robot.inverse_kinematics(
+            link=batch_robot.get_link(self.link_name),
+            pos=np.stack([pos for pos, _ in poses]),
+            quat=np.stack([quat for _, quat in poses]),
+            init_qpos=np.tile(qpos_cur, (n_poses, 1)),
+            return_error=True,
+            envs_idx=np.arange(n_poses),
+        )
+        qpos = np.array(tensor_to_array(qpos), dtype=float).reshape(n_poses, -1)
+        error = np.array(tensor_to_array(error), dtype=float).reshape(n_poses, -1)
+        return [(qpos[i, self.arm_dofs], self._converged(error[i])) for i in range(n_poses)]
+
+    def _solve_chained(self, poses, missing, arms, qpos_cur):
+        # in order, each pose warm-started from the solution (or cached arm) of the previous one
+        solved = []
+        seed = qpos_cur.copy()
+        for i, (pos, quat) in enumerate(poses):
+            if i in missing:
+                qpos, error = self.robot.inverse_kinematics(link=self.link, pos=pos, quat=quat, init_qpos=seed,
+                                                            return_error=True)
+                arm = np.array(tensor_to_array(qpos), dtype=float)[self.arm_dofs]
+                solved.append((arm, self._converged(np.array(tensor_to_array(error), dtype=float))))
+            else:
+                arm = arms[i]
+            seed = qpos_cur.copy()
+            seed[self.arm_dofs] = arm
+        return solved
+
+    @staticmethod
+    def _converged(error) -> bool:
+        # error: [pos_x, pos_y, pos_z, rot_x, rot_y, rot_z] of the solution, see RigidEntity.inverse_kinematics
+        return bool(np.linalg.norm(error[:3]) <= IK_POS_TOL and np.linalg.norm(error[3:]) <= IK_ROT_TOL)
+
 
 class MotionPrimitives:
-    def __init__(self, robot_: Any, scene_: Any, blocks_: Any):
+    def __init__(self, robot_: Any, scene_: Any, blocks_: Any, slots_: Any = None):
         # ensure we have a RobotAdapter so the rest of the code can rely on a
         # stable interface (but attribute access is forwarded to the raw robot)
         self.robot = robot_
-        #planner._ensure_adapter(robot_, scene_)
-        #self.planner = planner_
+        # plans against the live scene, blocks are the movable obstacles
+        self.planner = planner.PlannerInterface(robot_, scene_, obstacles=blocks_)
         self.scene = scene_
         self.blocks = blocks_
+        # slot name -> slot position, for the special structures
+        self.slots = slots_
+        # batched, warm-started and cached IK of the hand poses of each primitive
+        self.ik = IKService(robot_, planner_interface=self.planner)
+        # placing poses of the structure's slots, solved on first use (see slot_poses)
+        self._slot_poses = None
+        # plan_parser.PlanAction kind -> primitive, called with (action, approach, spot)
+        self.dispatch = {
+            "pick": lambda action, approach, spot: self.pick_up(action.block, approach=approach),
+            "put-down": lambda action, approach, spot: self.put_down(action.block, approach=approach, spot=spot),
+            "stack": lambda action, approach, spot: self.stack(action.block, action.target, approach=approach),
+            "place-above": lambda action, approach, spot: self.stack(action.block, action.target, shape=True),
+            "place-direction": lambda action, approach, spot: self.place_direction(action.block, action.target, action.direction),
+            #release the block where the hand is (see place_first)
+            "place-first": lambda action, approach, spot: self.ungrasp(self.robot.get_qpos()),
+            "fill": lambda action, approach, spot: self.place_in_slot(action.block, action.target, approach=approach),
+        }
     
+    @property
+    def slot_poses(self):
+        #Placing poses of the structure's slots, built on the first placement (profiled as "slot_poses.build")
+        if self._slot_poses is None and self.slots:
+            self._slot_poses = SlotPoseTable(self, self.slots)
+        return self._slot_poses
+
+    def reset(self, snapshot, noise=0.0, block_positions=None):
+        """Start a new trial in the same scene from a scenes.SceneSnapshot (see SceneSnapshot.restore)."""
+        positions = snapshot.restore(self.robot, self.blocks, block_positions=block_positions, noise=noise)
+        # nothing is held after a reset
+        self.planner.release_object()
+        return positions
+
     motors_dof = np.arange(7)
     fingers_dof = np.arange(7, 9)
     
@@ -27,8 +173,8 @@ class MotionPrimitives:
             self.robot.control_dofs_position(qpos,np.arange(9))
         else:
             self.robot.control_dofs_position(qpos[:-2], self.motors_dof)
-        for i in range(50):
-            self.scene.step()
+            qpos = qpos[:-2]
+        self.settle(qpos, np.arange(9) if gripper else self.motors_dof, max_steps=50)
     
     def moveStep(self, qpos, gripper=True):
         if gripper:
@@ -36,6 +182,40 @@ class MotionPrimitives:
         else:
             self.robot.control_dofs_position(qpos[:-2], self.motors_dof)
         self.scene.step()
+
+    def settle(self, qpos_target=None, dofs=None, grasped=None, min_steps=1, max_steps=50):
+        #Step until the joints reached qpos_target and the blocks are at rest, at most max_steps (see settling.py)
+        return step_until_settled(self.scene, self.robot, qpos_target=qpos_target, dofs=dofs,
+            blocks=list(self.blocks.values()), grasped=grasped, finger_dofs=self.fingers_dof,
+            min_steps=min_steps, max_steps=max_steps)
+
+    def followPath(self, path, gripper=True, settle_steps=25):
+        #Stream the path time-parameterized under the joint limits, one setpoint per sim step (see trajectory.py),
+        #then allow up to settle_steps for the robot to reach the final position
+        print("following path")
+        if not len(path):
+            return
+        dofs = np.arange(9) if gripper else self.motors_dof
+        waypoints = np.stack([tensor_to_array(w) for w in path])[:, dofs]
+        setpoints = time_parameterize(waypoints, self.scene.sim_options.dt,
+            vel_limits=FRANKA_VEL_LIMITS[dofs], acc_limits=FRANKA_ACC_LIMITS[dofs])
+        with profiler.span("scene.step", n_waypoints=len(path)):
+            for qpos in setpoints:
+                self.robot.control_dofs_position(qpos, dofs)
+                self.scene.step()
+        profiler.count("sim_steps", len(setpoints))
+        self.settle(setpoints[-1, self.motors_dof], self.motors_dof, min_steps=0, max_steps=settle_steps)
+
+    def approachPath(self, qpos_goal, approach=None, **plan_kwargs):
+        #Use a path planned ahead of time (see pipelined_execution) if it still fits the actual scene,
+        #otherwise plan it now
+        if approach is not None:
+            path = self.planner.validate_path(approach, qpos_goal=qpos_goal)
+            if path:
+                profiler.count("pipeline_hits")
+                return path
+            profiler.count("pipeline_misses")
+        return self.planner.plan_path(qpos_goal=qpos_goal, **plan_kwargs)
     
     def getBlockPose(self, block):
         pos = block.get_pos()
@@ -44,35 +224,41 @@ class MotionPrimitives:
         r, p, y = rot.as_euler('xyz', degrees=False)
         return pos, r, p, y
     
-    def calcPreGraspPose(self, block, stacking=False):
-
-        block_pos, block_roll, block_pitch, block_yaw = self.getBlockPose(block)
-        #Calculate pre-grasp pose just above block
-        pre_grasp_pos = block_pos
+    @staticmethod
+    def preGraspTarget(block_pos, block_quat, stacking=False):
+        #Hand pose just above a block at block_pos/block_quat (also used to predict poses, see pipelined_execution)
+        r, p, y = R.from_quat(tensor_to_array(block_quat)).as_euler('xyz', degrees=False)
+        pre_grasp_pos = np.array(tensor_to_array(block_pos), dtype=float)
         if stacking:
             z_adjust = 0.2
         else:
             z_adjust = 0.21
-        print(f"block z: {pre_grasp_pos[2]}")
         pre_grasp_pos[2] = pre_grasp_pos[2] + z_adjust
         pre_grasp_pos[0] = pre_grasp_pos[0] + 0.005
-        print(f"pre_grasp z: {pre_grasp_pos[2]}")
-        pre_grasp_yaw = block_yaw + np.pi #Z axis rotated 180 degrees
-        pre_grasp_R = R.from_euler('xyz', [block_roll, block_pitch, pre_grasp_yaw])
+        pre_grasp_yaw = y + np.pi #Z axis rotated 180 degrees
+        pre_grasp_R = R.from_euler('xyz', [r, p, pre_grasp_yaw])
         pre_grasp_quat = pre_grasp_R.as_quat()
         pre_grasp_quat[1] = 1
+        return pre_grasp_pos, pre_grasp_quat
+
+    def calcPreGraspPose(self, block, stacking=False):
+
+        #Calculate pre-grasp pose just above block
+        print(f"block z: {float(block.get_pos()[2])}")
+        pre_grasp_pos, pre_grasp_quat = self.preGraspTarget(block.get_pos(), block.get_quat(), stacking=stacking)
+        print(f"pre_grasp z: {pre_grasp_pos[2]}")
         #IK for pre-grasp pose
-        qpos = self.robot.inverse_kinematics(link=self.robot.get_link("hand"), 
-            pos=pre_grasp_pos, quat=pre_grasp_quat, init_qpos=self.robot.get_qpos())
+        qpos = self.ik.solve([(pre_grasp_pos, pre_grasp_quat)])[0]
         qpos[-2:] = 0.04 # gripper open
         print(f"pre_grasp_pos: {pre_grasp_pos}")
         return qpos, pre_grasp_pos, pre_grasp_quat
 
-    def calcPrePlacePose(self, block, direction):
-
-        block_pos, block_roll, block_pitch, block_yaw = self.getBlockPose(block)
+    @staticmethod
+    def prePlaceTargetAt(block_pos, block_quat, direction):
+        #Hand pose above the spot next to a block at block_pos/block_quat (also used by slot_poses.SlotPoseTable)
+        block_roll, block_pitch, block_yaw = R.from_quat(tensor_to_array(block_quat)).as_euler('xyz', degrees=False)
         #Calculate pre-grasp pose just above block
-        pre_place_pos = block_pos
+        pre_place_pos = np.array(tensor_to_array(block_pos), dtype=float)
         pre_place_pos[2] += 0.22
         match direction:
             case "north":
@@ -100,39 +286,50 @@ class MotionPrimitives:
         pre_place_R = R.from_euler('xyz', [block_roll, block_pitch, pre_place_yaw])
         pre_place_quat = pre_place_R.as_quat()
         pre_place_quat[1] = 1
+        return pre_place_pos, pre_place_quat
+
+    def prePlaceTarget(self, block, direction):
+        return self.prePlaceTargetAt(block.get_pos(), block.get_quat(), direction)
+
+    def slotPose(self, slot_str, direction=None):
+        #Precomputed (pre-place, place, retreat) qpos and descent path of a slot, None if not in the table
+        entry = None if self.slot_poses is None else self.slot_poses.lookup(slot_str, direction)
+        if entry is None:
+            return None
+        profiler.count("slot_pose_hits")
+        #copies, grasp/ungrasp write the finger targets into the qpos
+        return entry.pre_place.clone(), entry.place.clone(), entry.retreat.clone(), entry.descent
+
+    def calcPrePlacePose(self, block, direction):
+        pre_place_pos, pre_place_quat = self.prePlaceTarget(block, direction)
         #IK for pre-grasp pose
-        qpos = self.robot.inverse_kinematics(link=self.robot.get_link("hand"), 
-            pos=pre_place_pos, quat=pre_place_quat, init_qpos=self.robot.get_qpos())
+        qpos = self.ik.solve([(pre_place_pos, pre_place_quat)])[0]
         qpos[-2:] = 0.04 # gripper open
         print(f"pre_grasp_pos: {pre_place_pos}")
         return qpos, pre_place_pos, pre_place_quat
 
-    def grasp(self, qpos):
+    def grasp(self, qpos, block=None):
         self.robot.control_dofs_position(qpos[:-2], self.motors_dof)
         self.robot.control_dofs_force(np.array([-1, -1]), self.fingers_dof)
         print("grasping")
-        for i in range(50):
-            self.scene.step()
+        # give the fingers a few steps to start closing before checking the contact
+        n_steps = self.settle(qpos[:-2], self.motors_dof, grasped=block, min_steps=5, max_steps=50)
+        print(f"grasped after {n_steps} steps")
 
     def ungrasp(self, qpos):
         qpos[-2:] = 0.04
         self.robot.control_dofs_position(qpos, np.arange(9))
-        #self.planner.attached_object = None 
-        for i in range(50):
-            self.scene.step()
+        self.planner.release_object()
+        n_steps = self.settle(qpos, np.arange(9), max_steps=50)
+        print(f"released after {n_steps} steps")
 
     def follow_path(self, qpos, gripper=True):
-        path = self.robot.plan_path(
+        path = self.planner.plan_path(
         qpos_goal=qpos,
         num_waypoints=200,
         planner="RRT") # 2s duration
 
-        #Follow path to pre-grasp state
-        print("following path")
-        for waypoint in path:
-            self.moveStep(waypoint, gripper=gripper)
-        for i in range(100): #allow some time for robot to move to final position
-            self.scene.step()
+        self.followPath(path, gripper=gripper, settle_steps=100)
 
     def generateBlockPos(self):
         x_pos = random.uniform(0.45,0.65)
@@ -157,105 +354,81 @@ class MotionPrimitives:
             #once all blocks are considered, if valid_state remains true, loop ends & function returns
         return x_pos, y_pos, z_pos
 
-    def pick_up(self, block_str):
+    @profiler.timed("primitive.pick_up")
+    def pick_up(self, block_str, approach=None):
         #Retrieve block object from dictionary
         block = self.blocks[block_str]
         #print(block)
-        #Calculate pre-grasp pose just above block
-        pregrasp_qpos, pre_grasp_pos, pre_grasp_quat = self.calcPreGraspPose(block)
-        pre_grasp_quat[1] = 1
-        grasp_pos = tensor_to_array(pre_grasp_pos).copy()
+        #Calculate pre-grasp pose just above block, the grasp pose 0.1 below it and
+        #the post-grasp pose back at the pre-grasp pose, IK for all of them at once
+        pre_grasp_pos, pre_grasp_quat = self.preGraspTarget(block.get_pos(), block.get_quat())
+        grasp_pos = pre_grasp_pos.copy()
+        grasp_pos[2] -= 0.1
+        pregrasp_qpos, grasp_qpos, post_grasp_qpos = self.ik.solve([
+            (pre_grasp_pos, pre_grasp_quat), (grasp_pos, pre_grasp_quat), (pre_grasp_pos, pre_grasp_quat)])
+        pregrasp_qpos[-2:] = 0.04 # gripper open
+        grasp_qpos[-2:] = 0.04 # still open on the way down, grasp closes it
         #print(f"quat: {pre_grasp_quat}")
         print(f"pregrasp pos: {pre_grasp_pos}")
         #self.follow_path(pregrasp_qpos)
-        path = self.robot.plan_path(
-        qpos_goal=pregrasp_qpos,
+        path = self.approachPath(pregrasp_qpos, approach,
         num_waypoints=200,
         resolution=0.2)  # 2s duration
 
-        print("following path")
-        #Follow path to pre-grasp state
-        for waypoint in path:
-            self.moveStep(waypoint)
-        for i in range(25): #allow some time for robot to move to final position
-            self.scene.step()
+        self.followPath(path, settle_steps=25)
+
 
-        
-        grasp_pos[2] -= 0.1
-        grasp_qpos = self.robot.inverse_kinematics(init_qpos=self.robot.get_qpos(), 
-            link=self.robot.get_link("hand"), pos=grasp_pos, quat=pre_grasp_quat)
         print(f"grasp pos: {grasp_pos}")
-        path2 = self.robot.plan_path(
+        path2 = self.planner.plan_path(
         qpos_goal=grasp_qpos,
         num_waypoints=50,
         resolution=0.2)  # 2s duration
 
-        print("following path")
-        #Follow path to pre-grasp state
-        for waypoint in path2:
-            self.moveStep(waypoint)
-        for i in range(25): #allow some time for robot to move to final position
-            self.scene.step()
+        self.followPath(path2, settle_steps=25)
 
         #self.moveTo(grasp_qpos, gripper=True)
         # close gripper
-        self.grasp(grasp_qpos)
+        self.grasp(grasp_qpos, block)
 
-        grasp_pos[2] += 0.1
-        post_grasp_qpos = self.robot.inverse_kinematics(init_qpos=self.robot.get_qpos(), 
-            link=self.robot.get_link("hand"), pos=grasp_pos, quat=pre_grasp_quat)
-        #self.planner.attached_object = block
+        self.planner.attach_object(block)
         self.moveTo(post_grasp_qpos, gripper=False)
 
-    def put_down(self, block_str):
+    @profiler.timed("primitive.put_down")
+    def put_down(self, block_str, approach=None, spot=None):
 
         #self.moveTo()
-        x_pos, y_pos, z_pos = self.generateValidState()
+        if spot is None:
+            x_pos, y_pos, z_pos = self.generateValidState()
+        else:
+            x_pos, y_pos, z_pos = spot
         #qpos_2, pos_2, quat = self.calcPreGraspPose(self.blocks[block_str])
         quat = np.array([0, 1, 0, 0])
         #Check if state is valid once OMPL works
         pos = np.array([x_pos,y_pos,z_pos])
-        pre_place_qpos = self.robot.inverse_kinematics(
-        link=self.robot.get_link("hand"),
-        pos=torch.tensor(pos),
-        quat=torch.tensor(quat))
+        place_pos = pos.copy()
+        place_pos[2] -= 0.05
+        post_place_pos = place_pos.copy()
+        post_place_pos[2] += 0.1
+        pre_place_qpos, place_qpos, post_place_qpos = self.ik.solve([
+            (pos, quat), (place_pos, quat), (post_place_pos, quat)])
+        post_place_qpos[-2:] = 0.04 # released before retreating
 
-        path = self.robot.plan_path(
-        qpos_goal=pre_place_qpos,
+        path = self.approachPath(pre_place_qpos, approach,
         num_waypoints=200,
         resolution=0.2)  # 2s duration
 
-        print("following path")
-        #Follow path to pre-grasp state
-        for waypoint in path:
-            self.moveStep(waypoint, gripper=False)
-        for i in range(25): #allow some time for robot to move to final position
-            self.scene.step()
+        self.followPath(path, gripper=False, settle_steps=25)
 
-        pos[2] -= 0.05
-        place_qpos = self.robot.inverse_kinematics(
-        link=self.robot.get_link("hand"),
-        pos=pos,
-        quat=quat)
-        path2 = self.robot.plan_path(
+        path2 = self.planner.plan_path(
         qpos_goal=place_qpos,
         num_waypoints=50,
         resolution=0.2)  # 2s duration
 
-        print("following path")
-        #Follow path to pre-grasp state
-        for waypoint in path2:
-            self.moveStep(waypoint)
-        for i in range(25): #allow some time for robot to move to final position
-            self.scene.step()
+        self.followPath(path2, settle_steps=25)
         self.ungrasp(place_qpos)
-        pos[2] += 0.1
-        post_place_qpos = self.robot.inverse_kinematics(
-        link=self.robot.get_link("hand"),
-        pos=pos,
-        quat=quat)
         self.moveTo(post_place_qpos)
 
+    @profiler.timed("primitive.place_first")
     def place_first(self, block_str):
         quat = np.array([0, 1, 0, 0])
         pos = self.robot.forward_kinematics(qpos=self.robot.get_qpos(), 
@@ -267,16 +440,11 @@ class MotionPrimitives:
         pos=pos,
         quat=quat)
 
-        path = self.robot.plan_path(
+        path = self.planner.plan_path(
         qpos_goal=pre_place_qpos,
         num_waypoints=200)  # 2s duration
 
-        print("following path")
-        #Follow path to pre-grasp state
-        for waypoint in path:
-            self.moveStep(waypoint, gripper=False)
-        for i in range(25): #allow some time for robot to move to final position
-            self.scene.step()
+        self.followPath(path, gripper=False, settle_steps=25)
 
         pos[2] -= 0.05
         place_qpos = self.robot.inverse_kinematics(
@@ -293,206 +461,144 @@ class MotionPrimitives:
         self.moveTo(post_place_qpos)
 
     #Stacks blockA on blockB, assumes blockA in hand
-    def stack(self, blockA_str,blockB_str, shape=False):
+    @profiler.timed("primitive.stack")
+    def stack(self, blockA_str,blockB_str, shape=False, approach=None):
         #self.pick_up(blockA_str)
         blockA = self.blocks[blockA_str]
         blockB = self.blocks[blockB_str]
-        prestack_qpos, pre_stack_pos, pre_stack_quat = self.calcPreGraspPose(blockB, stacking=True)
+        pre_stack_pos, approach_quat = self.preGraspTarget(blockB.get_pos(), blockB.get_quat(), stacking=True)
         pre_stack_quat = np.array([0, 1, 0, 0])
-        stack_pos = tensor_to_array(pre_stack_pos).copy()
+        stack_pos = pre_stack_pos.copy()
         if shape:
             adjust = 0.0
         else:
             adjust = 0.04
         stack_pos[2] -= adjust
-
-        path = self.robot.plan_path(
-        qpos_goal=prestack_qpos,
+        post_stack_pos = stack_pos.copy()
+        post_stack_pos[2] += 0.1
+        prestack_qpos, stack_qpos, post_stack_qpos = self.ik.solve([
+            (pre_stack_pos, approach_quat), (stack_pos, pre_stack_quat), (post_stack_pos, pre_stack_quat)])
+        post_stack_qpos[-2:] = 0.04 # released before retreating
+        prestack_qpos[-2:] = 0.04 # gripper open
+
+        path = self.approachPath(prestack_qpos, approach,
         num_waypoints=200,
         resolution=0.2)  # 2s duration
 
-        print("following path")
-        #Follow path to pre-grasp state
-        for waypoint in path:
-            self.moveStep(waypoint, gripper=False)
-        for i in range(25): #allow some time for robot to move to final position
-            self.scene.step()
-   
-        stack_qpos = self.robot.inverse_kinematics(
-        link=self.robot.get_link("hand"),
-        pos=stack_pos,
-        quat=pre_stack_quat)
+        self.followPath(path, gripper=False, settle_steps=25)
 
         self.moveTo(stack_qpos, gripper=False)
         
         self.ungrasp(stack_qpos)
-        stack_pos[2] += 0.1
-        post_stack_qpos = self.robot.inverse_kinematics(
-        link=self.robot.get_link("hand"),
-        pos=stack_pos,
-        quat=pre_stack_quat,)
         self.moveTo(post_stack_qpos)
 
+    @profiler.timed("primitive.place_direction")
     def place_direction(self, blockA_str, blockB_str, direction):
         blockA = self.blocks[blockA_str]
         blockB = self.blocks[blockB_str]
-        preplace_qpos, pre_place_pos, pre_place_quat = self.calcPrePlacePose(blockB, direction=direction)
-        pre_place_quat = np.array([0, 1, 0, 0])
-        place_pos = tensor_to_array(pre_place_pos).copy()
-        place_pos[2] -= 0.05
-
-        path = self.robot.plan_path(
+        #blockB sitting in a slot of the structure: poses from the table
+        slot_pose = None if self.slot_poses is None else self.slotPose(self.slot_poses.slot_at(blockB.get_pos()), direction)
+        if slot_pose is not None:
+            preplace_qpos, place_qpos, post_place_qpos, descent = slot_pose
+        else:
+            pre_place_pos, approach_quat = self.prePlaceTarget(blockB, direction=direction)
+            pre_place_quat = np.array([0, 1, 0, 0])
+            place_pos = pre_place_pos.copy()
+            place_pos[2] -= 0.05
+            post_place_pos = place_pos.copy()
+            post_place_pos[2] += 0.1
+            preplace_qpos, place_qpos, post_place_qpos = self.ik.solve([
+                (pre_place_pos, approach_quat), (place_pos, pre_place_quat), (post_place_pos, pre_place_quat)])
+            post_place_qpos[-2:] = 0.04 # released before retreating
+            preplace_qpos[-2:] = 0.04 # gripper open
+            descent = []
+
+        path = self.planner.plan_path(
         qpos_goal=preplace_qpos,
         num_waypoints=200,
         resolution=0.2)  # 2s duration
 
-        print("following path")
-        #Follow path to pre-grasp state
-        for waypoint in path:
-            self.moveStep(waypoint, gripper=False)
-        for i in range(100): #allow some time for robot to move to final position
-            self.scene.step()
-   
-        place_qpos = self.robot.inverse_kinematics(
-        link=self.robot.get_link("hand"),
-        pos=place_pos,
-        quat=pre_place_quat)
+        self.followPath(path, gripper=False, settle_steps=100)
 
-        self.moveTo(place_qpos, gripper=False)
+        if descent:
+            self.followPath(descent, gripper=False, settle_steps=50)
+        else:
+            self.moveTo(place_qpos, gripper=False)
         
         self.ungrasp(place_qpos)
-        place_pos[2] += 0.1
-        post_place_qpos = self.robot.inverse_kinematics(
-        link=self.robot.get_link("hand"),
-        pos=place_pos,
-        quat=pre_place_quat,)
         self.moveTo(post_place_qpos)
        
 
-    def primitiveFromString(self, string, line):
-        index = line.find(string)
-        match string:
-            case "pick-up":
-                block_index = index + 8
-                block_str = line[block_index]
-                print(f"picking up {block_str}")
-                self.pick_up(block_str)
-            case "put-down":
-                block_index = index + 9
-                block_str = line[block_index]
-                print(f"putting down {block_str}")
-                self.put_down(block_str)
-            case "stack":
-                block1_index = index + 6
-                block1_str = line[block1_index]
-                block2_index = index + 8
-                block2_str = line[block2_index]
-                print(f"stacking {block1_str}, {block2_str}")
-                self.stack(block1_str, block2_str)
-            case "unstack":
-                block_index = index + 8
-                block_str = line[block_index]
-                print(f"unstacking {block_str}")
-                self.pick_up(block_str)
-            case "place-above":
-                block1_index = index + 14
-                block1_str = line[block1_index]
-                block2_index = index + 16
-                block2_str = line[block2_index]
-                self.stack(block1_str, block2_str, shape=True)
-            case "place-first":
-                block_index = index + 12
-                block_str = line[block_index]
-                self.ungrasp(self.robot.get_qpos())
-                #self.place_first(block_str)
-            case "place-north":
-                block1_index = index + 12
-                block1_str = line[block1_index]
-                block2_index = index + 14
-                block2_str = line[block2_index]
-                self.place_direction(block1_str, block2_str, "north")
-            case "place-west":
-                block1_index = index + 11
-                block1_str = line[block1_index]
-                block2_index = index + 13
-                block2_str = line[block2_index]
-                self.place_direction(block1_str, block2_str, "west")
-            case "place-south":
-                block1_index = index + 12
-                block1_str = line[block1_index]
-                block2_index = index + 14
-                block2_str = line[block2_index]
-                self.place_direction(block1_str, block2_str, "south")
-            case "place-east":
-                block1_index = index + 11
-                block1_str = line[block1_index]
-                block2_index = index + 13
-                block2_str = line[block2_index]
-                self.place_direction(block1_str, block2_str, "east")
-            case "place-northeast":
-                block1_index = index + 16
-                block1_str = line[block1_index]
-                block2_index = index + 18
-                block2_str = line[block2_index]
-                self.place_direction(block1_str, block2_str, "northeast")
-            case "place-northwest":
-                block1_index = index + 16
-                block1_str = line[block1_index]
-                block2_index = index + 18
-                block2_str = line[block2_index]
-                self.place_direction(block1_str, block2_str, "northwest")
-            case "place-southeast":
-                block1_index = index + 16
-                block1_str = line[block1_index]
-                block2_index = index + 18
-                block2_str = line[block2_index]
-                self.place_direction(block1_str, block2_str, "southeast")
-            case "place-southwest":
-                block1_index = index + 16
-                block1_str = line[block1_index]
-                block2_index = index + 18
-                block2_str = line[block2_index]
-                self.place_direction(block1_str, block2_str, "southwest")
+    #Places the block in hand into a slot of the special structure
+    @profiler.timed("primitive.place_in_slot")
+    def place_in_slot(self, block_str, slot_str, approach=None):
+        slot_pose = self.slotPose(slot_str)
+        if slot_pose is not None:
+            preplace_qpos, place_qpos, post_place_qpos, descent = slot_pose
+        else:
+            slot_pos = np.array(self.slots[slot_str], dtype=float)
+            quat = np.array([0, 1, 0, 0])
+            pre_place_pos = slot_pos.copy()
+            pre_place_pos[2] += 0.22
+            place_pos = pre_place_pos.copy()
+            place_pos[2] -= 0.05
+            post_place_pos = place_pos.copy()
+            post_place_pos[2] += 0.1
+            preplace_qpos, place_qpos, post_place_qpos = self.ik.solve([
+                (pre_place_pos, quat), (place_pos, quat), (post_place_pos, quat)])
+            post_place_qpos[-2:] = 0.04 # released before retreating
+            preplace_qpos[-2:] = 0.04 # gripper open
+            descent = []
+
+        path = self.approachPath(preplace_qpos, approach,
+        num_waypoints=200,
+        resolution=0.2)  # 2s duration
+
+        self.followPath(path, gripper=False, settle_steps=100)
+
+        if descent:
+            self.followPath(descent, gripper=False, settle_steps=50)
+        else:
+            self.moveTo(place_qpos, gripper=False)
 
+        self.ungrasp(place_qpos)
+        self.moveTo(post_place_qpos)
 
+    def executeAction(self, action, approach=None, spot=None):
+        #Run one planned action, a plan_parser.PlanAction or an action tuple like ("stack", "r", "g"),
+        #through the dispatch table of its kind
+        plan_action = as_plan_action(action)
+        run = None if plan_action is None else self.dispatch.get(plan_action.kind)
+        if run is None:
+            gs.raise_exception(f"Action {action!r} has no motion primitive.")
+        run(plan_action, approach, spot)
 
     def runSolution(self, f_soln):
-        primitives = ["pick-up", "put-down", "unstack", "stack", "place-first", \
-        "place-northeast", "place-northwest", "place-southeast", "place-southwest","place-west", "place-north", "place-east", "place-south", "place-above"]
         try:
-            with open(f_soln, 'r') as f:
-                current_line = f.readline()
-                print (current_line)
-                while current_line:
-                    for string in primitives:
-                            if string in current_line:
-                                self.primitiveFromString(string, current_line)
-                                break #only 1 primitive per line
-                    
-                    current_line = f.readline()
-                    #re-ground primitives
-                    #re-plan if necessary
-                    #call runSolution again with new .soln file
+            plan = read_plan(f_soln)
         except FileNotFoundError:
             print("Solution File Not Found")
+            return
+        for action in plan:
+            print(fact_to_str(action))
+            if action.kind is None:
+                print(f"skipping {action.name}, no motion primitive")
+                continue
+            self.executeAction(action)
+            #re-ground primitives
+            #re-plan if necessary
+            #call runSolution again with new .soln file
 
     def runSolutionStep(self, f_soln):
-        primitives = ["pick-up", "put-down", "unstack", "stack", "place-first", \
-        "place-northeast", "place-northwest", "place-southeast", "place-southwest","place-west", "place-north", "place-east", "place-south", "place-above"]
+        #Run the first action of the plan, 1 if the plan is empty
         try:
-            with open(f_soln, 'r') as f:
-                current_line = f.readline()
-                if current_line:
-                    print (current_line)
-                    for string in primitives:
-                        if string in current_line:
-                            self.primitiveFromString(string, current_line)
-                            prev_step = current_line
-                            break #only 1 primitive per line
-                    return 0
-                else:
-                    return 1
-
+            plan = read_plan(f_soln)
         except FileNotFoundError:
             print("Solution File Not Found")
-            
\ No newline at end of file
+            return
+        if not plan:
+            return 1
+        print(fact_to_str(plan[0]))
+        if plan[0].kind is not None:
+            self.executeAction(plan[0])
+        return 0
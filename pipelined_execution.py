@@ -0,0 +1,194 @@
+"""Pipelined execution of a task plan.
+
+MotionPrimitives.runSolution plans the approach motion of an action, streams
+it into the simulation, and only then starts planning the next action. Here
+the approach of the next action (IK of its pre-grasp/pre-place pose and the
+motion plan to it) is planned in a background worker process while the
+current action executes:
+
+    1. predict the world state at the end of the current action: where its
+       block ends up, which block is held, where the hand is
+    2. submit IK and planning for the next action's approach in that state
+       (PlannerInterface.plan_path_async, on its own collision model)
+    3. execute the current action in this process
+    4. before the next action, validate the prefetched path against the
+       actual state (PlannerInterface.validate_path: starts at the current
+       qpos, ends at the freshly solved approach pose, collision free); the
+       primitive plans as usual if it does not fit
+
+The background worker is started (and its collision model built) when the
+executor is created, so the first prefetch does not pay for it. A prefetch
+that is not ready in time is cancelled, so the worker is free for the next
+one.
+
+The offsets below mirror the ones used by the motion primitives. Only the
+actions of domain.pddl and of the compact slot encoding are supported. The
+place-* actions of custom_domain.pddl get no prefetch: where their block
+lands is up to the simulation, and their primitives plan the approach
+themselves.
+
+Usage:
+    executor = PipelinedExecutor(motion)
+    executor.run(plan)   # e.g. task_planner.plan_problem(problem)
+"""
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from genesis.utils.misc import tensor_to_array
+
+from profiling import profiler
+from slot_encoding import SlotEncoding
+from task_planning import Action
+
+# hand quaternion of all placing motions (pick_up ends at its pre-grasp pose, see preGraspTarget)
+PLACE_QUAT = np.array([0.0, 1.0, 0.0, 0.0])
+# hand above a put-down spot (generateValidState's z) at the start / end of put_down
+PUT_DOWN_Z = 0.18
+PUT_DOWN_END_Z = 0.23
+# hand above the lower block at the end of stack (0.2 - 0.04 + 0.1)
+STACK_END_Z = 0.26
+# hand above a slot at the start / end of place_in_slot
+SLOT_APPROACH_Z = 0.22
+SLOT_END_Z = 0.27
+# block below the hand when held (see symbolic_abstraction.EE_BLOCK_Z_OFFSET)
+HELD_BLOCK_Z = 0.11
+BLOCK_SIZE = 0.04
+TABLE_Z = 0.02
+GRIPPER_OPEN = 0.04
+GRIPPER_CLOSED = 0.02
+
+
+class PredictedState:
+    """World state the next action is planned in: block poses, held block, hand pose and fingers."""
+
+    def __init__(self, block_poses: Dict[str, Tuple[np.ndarray, np.ndarray]], attached: Optional[str],
+                 hand: Optional[Tuple[np.ndarray, np.ndarray]], gripper: Optional[float]):
+        self.block_poses = block_poses
+        self.attached = attached
+        self.hand = hand
+        self.gripper = gripper
+
+
+class PipelinedExecutor:
+    def __init__(self, motion: Any, timeout: float = 5.0, planner: str = "RRTConnect"):
+        """
+        Args:
+            motion: motion_primitives.MotionPrimitives of the live scene
+            timeout: planning timeout of the background worker (s)
+            planner: OMPL planner of the background worker (see PlannerInterface.plan_path)
+        """
+        self.motion = motion
+        self.planner = motion.planner
+        self.timeout = timeout
+        self.planner_name = planner
+        # put-down spots, chosen ahead so the prediction and the execution agree
+        self._spots: Dict[int, Tuple[float, float, float]] = {}
+        self.planner.start_prefetch_worker()
+
+    # -------------------------------------------------------------- prediction
+
+    def _current_state(self) -> PredictedState:
+        block_poses = {
+            name: (np.array(tensor_to_array(block.get_pos()), dtype=float), np.array(tensor_to_array(block.get_quat()), dtype=float))
+            for name, block in self.motion.blocks.items()
+        }
+        attached = next((name for name, block in self.motion.blocks.items() if block is self.planner.attached_object), None)
+        # None: start from the current qpos
+        return PredictedState(block_poses, attached, None, None)
+
+    def _spot(self, i_action: int) -> Tuple[float, float, float]:
+        if i_action not in self._spots:
+            self._spots[i_action] = self.motion.generateValidState()
+        return self._spots[i_action]
+
+    def _slot_pos(self, action: Action) -> np.ndarray:
+        return np.array(self.motion.slots[SlotEncoding.slot_of_action(action)], dtype=float)
+
+    def predict(self, action: Action, i_action: int, state: PredictedState) -> Optional[PredictedState]:
+        """State after `action` (the `i_action`-th of the plan) is executed from `state`, None if not supported."""
+        block_poses = dict(state.block_poses)
+        name = action[0]
+        if name in ("pick-up", "unstack"):
+            pos, quat = block_poses[action[1]]
+            hand = self.motion.preGraspTarget(pos, quat)
+            # the block hangs below the hand
+            block_poses[action[1]] = (hand[0] - np.array([0.005, 0.0, HELD_BLOCK_Z]), quat)
+            return PredictedState(block_poses, action[1], hand, GRIPPER_CLOSED)
+        if name == "put-down":
+            x, y, _ = self._spot(i_action)
+            block_poses[action[1]] = (np.array([x, y, TABLE_Z]), block_poses[action[1]][1])
+            return PredictedState(block_poses, None, (np.array([x, y, PUT_DOWN_END_Z]), PLACE_QUAT), GRIPPER_OPEN)
+        if name == "stack":
+            below = block_poses[action[2]][0]
+            block_poses[action[1]] = (below + np.array([0.0, 0.0, BLOCK_SIZE]), block_poses[action[2]][1])
+            hand = self.motion.preGraspTarget(*block_poses[action[2]], stacking=True)[0]
+            hand[2] = below[2] + STACK_END_Z
+            return PredictedState(block_poses, None, (hand, PLACE_QUAT), GRIPPER_OPEN)
+        if name.startswith("fill"):
+            slot_pos = self._slot_pos(action)
+            block_poses[action[1]] = (slot_pos, block_poses[action[1]][1])
+            return PredictedState(block_poses, None, (slot_pos + np.array([0.0, 0.0, SLOT_END_Z]), PLACE_QUAT), GRIPPER_OPEN)
+        return None
+
+    def approach_target(self, action: Action, i_action: int, state: PredictedState) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Hand pose (pos, quat) the primitive of `action` first moves to, None if not supported."""
+        name = action[0]
+        if name in ("pick-up", "unstack"):
+            return self.motion.preGraspTarget(*state.block_poses[action[1]])
+        if name == "put-down":
+            x, y, _ = self._spot(i_action)
+            return np.array([x, y, PUT_DOWN_Z]), PLACE_QUAT
+        if name == "stack":
+            return self.motion.preGraspTarget(*state.block_poses[action[2]], stacking=True)
+        if name.startswith("fill"):
+            return self._slot_pos(action) + np.array([0.0, 0.0, SLOT_APPROACH_Z]), PLACE_QUAT
+        return None
+
+    # --------------------------------------------------------------- execution
+
+    def _submit(self, action: Action, i_action: int, state: Optional[PredictedState]):
+        if state is None:
+            return None
+        target = self.approach_target(action, i_action, state)
+        if target is None:
+            return None
+        return self.planner.plan_path_async(
+            hand_goal=target,
+            hand_start=state.hand,
+            block_poses=state.block_poses,
+            attached=state.attached,
+            gripper_start=state.gripper,
+            gripper_goal=GRIPPER_OPEN,
+            timeout=self.timeout,
+            num_waypoints=200,
+            planner=self.planner_name,
+            resolution=0.2,
+        )
+
+    def _collect(self, future) -> Optional[np.ndarray]:
+        if future is None:
+            return None
+        with profiler.span("pipeline.wait"):
+            try:
+                _, _, waypoints = future.result(timeout=self.timeout + 1.0)
+            except Exception:
+                # late or failed prefetch: stop it so it does not hold the worker, the primitive plans the approach itself
+                future.cancel()
+                self.planner.cancel_prefetch()
+                return None
+        return waypoints
+
+    def run(self, plan: List[Action]) -> None:
+        """Execute `plan`, planning each next approach while the current action runs."""
+        self._spots = {}
+        # the first approach has nothing to overlap with, the primitive plans it itself
+        future = None
+        for i_action, action in enumerate(plan):
+            approach = self._collect(future)
+            future = None
+            if i_action + 1 < len(plan):
+                predicted = self.predict(action, i_action, self._current_state())
+                future = self._submit(plan[i_action + 1], i_action + 1, predicted)
+            print(f"executing {action}")
+            spot = self._spot(i_action) if action[0] == "put-down" else None
+            self.motion.executeAction(action, approach=approach, spot=spot)
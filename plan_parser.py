@@ -0,0 +1,107 @@
+"""Parsing of task plans into typed actions.
+
+MotionPrimitives.runSolution used to find the primitive of a .soln line by
+substring matching against a list of action names (in an order that kept
+"stack" from matching "unstack") and read the block names at fixed
+character offsets, which limited them to one character. Here a plan,
+from a .soln file or from TaskPlanner, is tokenized into PlanActions:
+
+    (stack r g)               PlanAction kind="stack", block="r", target="g"
+    (place-north b10 b2 ...)  kind="place-direction", direction="north"
+    (fill-s2-next-s1 r)       kind="fill", target="s2"
+
+A PlanAction is still the action tuple (e.g. ("stack", "r", "g")), so it can
+be passed wherever task_planning.Action is expected. Its kind comes from a
+table lookup on the action name; the numbered place-above-N variants of
+custom_domain.pddl and the fill-* actions of the compact slot encoding are
+looked up by their family name.
+
+Usage:
+    plan = read_plan("actions.soln")
+    plan = parse_plan(text)
+    action = PlanAction(("pick-up", "b12"))
+"""
+from typing import Iterable, List, Optional
+
+from slot_encoding import SlotEncoding
+from slot_poses import DIRECTIONS
+from symbolic_state import fact_to_str, parse_facts
+
+# action name (or family) -> kind of primitive that executes it
+ACTION_KINDS = {
+    "pick-up": "pick",
+    "unstack": "pick",
+    "put-down": "put-down",
+    "stack": "stack",
+    "place-first": "place-first",
+    "place-above": "place-above",
+    "fill": "fill",
+}
+ACTION_KINDS.update({f"place-{direction}": "place-direction" for direction in DIRECTIONS})
+# kinds whose second argument is the reference block
+_TARGET_KINDS = ("stack", "place-above", "place-direction")
+
+
+def _family(name: str) -> str:
+    """Name shared by the variants of an action, e.g. "place-above-16" -> "place-above"."""
+    if name.startswith("fill-"):
+        return "fill"
+    head, _, tail = name.rpartition("-")
+    return head if tail.isdigit() else name
+
+
+class PlanAction(tuple):
+    """One planned action, the action tuple plus what its primitive needs.
+
+    Attributes:
+        name: action name, e.g. "place-above-3"
+        kind: primitive kind (see ACTION_KINDS), None if no primitive executes it
+        block: block being moved (first argument)
+        target: reference block of stack/place-above/place-<direction>, slot of fill-*
+        direction: direction of place-<direction>
+    """
+
+    def __new__(cls, tokens: Iterable[str]):
+        action = super().__new__(cls, tokens)
+        if not action:
+            raise ValueError("Empty action.")
+        name = action[0]
+        action.name = name
+        action.kind = ACTION_KINDS.get(name) or ACTION_KINDS.get(_family(name))
+        action.block = action[1] if len(action) > 1 else None
+        action.target = None
+        action.direction = None
+        if action.kind in _TARGET_KINDS:
+            if len(action) < 3:
+                raise ValueError(f"Action {fact_to_str(action)} needs a reference block.")
+            action.target = action[2]
+        if action.kind == "place-direction":
+            action.direction = name[len("place-"):]
+        elif action.kind == "fill":
+            action.target = SlotEncoding.slot_of_action(action)
+        return action
+
+    def __getnewargs__(self):
+        # pickle rebuilds the action from its tokens
+        return (tuple(self),)
+
+
+def parse_plan(text: str) -> List[PlanAction]:
+    """Parse the actions of a plan in .soln format, e.g. "(pick-up m)\\n(stack m c)", ignoring ; comments."""
+    return [PlanAction(tokens) for tokens in parse_facts(text)]
+
+
+def read_plan(path: str) -> List[PlanAction]:
+    """Actions of the .soln file at `path` (see task_planning.write_plan)."""
+    with open(path, "r") as f:
+        return parse_plan(f.read())
+
+
+def as_plan_action(action) -> Optional[PlanAction]:
+    """`action` (a PlanAction, an action tuple or "(stack r g)") as a PlanAction, None if it has no tokens."""
+    if isinstance(action, PlanAction):
+        return action
+    if isinstance(action, str):
+        actions = parse_plan(action)
+        return actions[0] if actions else None
+    return PlanAction(action)
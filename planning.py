@@ -1,11 +1,152 @@
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
 import genesis as gs
 import numpy as np
 import torch
-from typing import Any
+from typing import Any, Dict
 import ompl
+from ompl import base as ob
 
 from genesis.utils.misc import tensor_to_array
 from robot_adapter import RobotAdapter
+from roadmap import Roadmap, interpolate_waypoints
+from caching import PersistentLRUCache, quantize, stable_hash
+from profiling import profiler
+
+
+# per-process planner used by portfolio workers (see PlannerInterface.plan_path_portfolio)
+_portfolio_planner = None
+# id of the current query of this worker's pool (portfolio or prefetch), shared with the parent process; jobs of
+# older queries stop planning
+_portfolio_query = None
+
+
+def _portfolio_worker_init(block_names, query=None, ready=None):
+    """Build this worker's own collision model (robot + blocks, no viewer), then count it in `ready`."""
+    global _portfolio_planner, _portfolio_query
+    from scenes import create_collision_scene
+
+    gs.init(backend=gs.cpu, logging_level="warning")
+    scene, franka, blocks = create_collision_scene(block_names)
+    _portfolio_planner = PlannerInterface(franka, scene, obstacles=blocks)
+    _portfolio_query = query
+    if ready is not None:
+        with ready.get_lock():
+            ready.value += 1
+
+
+def _worker_noop():
+    return None
+
+
+def _start_workers(pool, n_workers, ready, timeout=120.0):
+    """Start the `n_workers` processes of `pool` and wait until all of them built their collision model."""
+    # the pool spawns a process per submitted job while none is idle
+    futures = [pool.submit(_worker_noop) for _ in range(n_workers)]
+    deadline = time.monotonic() + timeout
+    while ready.value < n_workers:
+        for future in futures:
+            if future.done():
+                # raises if the worker failed to start
+                future.result()
+        if time.monotonic() > deadline:
+            gs.raise_exception(f"Planner worker processes did not start within {timeout} s.")
+        time.sleep(0.01)
+
+
+def _query_stale(task):
+    """Whether the query `task` belongs to was answered, timed out or cancelled in the parent."""
+    return _portfolio_query is not None and _portfolio_query.value != task["query"]
+
+
+def _sync_worker_scene(task):
+    """Set the worker's block poses and attached object to those of `task`."""
+    planner_interface = _portfolio_planner
+    for name, (pos, quat) in task["block_poses"].items():
+        entity = planner_interface.obstacles[name]
+        entity.set_pos(pos)
+        entity.set_quat(quat)
+    planner_interface.attached_object = planner_interface.obstacles.get(task["attached"])
+    return planner_interface
+
+
+def _portfolio_worker_solve(task):
+    """Run one planner/seed of the portfolio. Returns (planner, seed, waypoints or None)."""
+    from ompl import util as ou
+
+    def stale():
+        return _query_stale(task)
+
+    if stale():
+        return task["planner"], task["seed"], None
+    planner_interface = _sync_worker_scene(task)
+    if task["seed"] is not None:
+        # reseeds the generator of new RNG instances; plan_path builds a fresh planner and samplers, so the job is
+        # reproducible although this worker already sampled (OMPL logs an error about that, silenced here)
+        ou.setLogLevel(ou.LOG_NONE)
+        ou.RNG.setSeed(task["seed"])
+
+    waypoints = planner_interface.plan_path(
+        qpos_goal=task["qpos_goal"],
+        qpos_start=task["qpos_start"],
+        timeout=task["timeout"],
+        smooth_path=task["smooth_path"],
+        num_waypoints=task["num_waypoints"],
+        planner=task["planner"],
+        terminate=stale,
+    )
+    if not waypoints:
+        return task["planner"], task["seed"], None
+    return task["planner"], task["seed"], np.stack([tensor_to_array(w) for w in waypoints])
+
+
+def _ik_worker_solve(task):
+    """IK and plan_path for a predicted world state (see PlannerInterface.plan_path_async).
+
+    Returns (qpos_start, qpos_goal, waypoints or None).
+    """
+    def stale():
+        return _query_stale(task)
+
+    if stale():
+        return task["qpos_start"], None, None
+    planner_interface = _sync_worker_scene(task)
+    robot = planner_interface.robot
+    hand = robot.get_link("hand")
+
+    qpos_start = task["qpos_start"]
+    if qpos_start is None:
+        pos, quat = task["hand_start"]
+        qpos_start = np.array(tensor_to_array(
+            robot.inverse_kinematics(link=hand, pos=pos, quat=quat, init_qpos=task["ik_seed"])
+        ), dtype=float)
+        if task["gripper_start"] is not None:
+            qpos_start[-2:] = task["gripper_start"]
+    pos, quat = task["hand_goal"]
+    qpos_goal = np.array(tensor_to_array(
+        robot.inverse_kinematics(link=hand, pos=pos, quat=quat, init_qpos=qpos_start)
+    ), dtype=float)
+    if task["gripper_goal"] is not None:
+        qpos_goal[-2:] = task["gripper_goal"]
+
+    waypoints = planner_interface.plan_path(
+        qpos_goal=qpos_goal,
+        qpos_start=qpos_start,
+        timeout=task["timeout"],
+        num_waypoints=task["num_waypoints"],
+        planner=task["planner"],
+        resolution=task["resolution"],
+        terminate=stale,
+    )
+    if not waypoints:
+        return qpos_start, qpos_goal, None
+    return qpos_start, qpos_goal, np.stack([tensor_to_array(w) for w in waypoints])
+
+
+def _path_length(waypoints):
+    return float(np.linalg.norm(np.diff(waypoints, axis=0), axis=1).sum())
 
 
 def _ensure_adapter(robot: Any, scene: Any) -> RobotAdapter:
@@ -18,13 +159,203 @@ def _ensure_adapter(robot: Any, scene: Any) -> RobotAdapter:
         return robot
     return RobotAdapter(robot, scene)
 
+# roles of collision geoms, used to filter allowed collision pairs
+GEOM_OTHER = 0
+GEOM_GRIPPER = 1
+GEOM_ATTACHED = 2
+GRIPPER_LINKS = ("left_finger", "right_finger", "hand")
+
+
+class BatchedMotionValidator(ob.MotionValidator):
+    """OMPL motion validator that checks a whole edge in one call.
+
+    The edge between two states is discretized at the state space's
+    validity-checking resolution (same as OMPL's DiscreteMotionValidator),
+    and all intermediate configurations are handed to
+    `PlannerInterface.check_states_valid` at once instead of OMPL calling
+    the Python validity callback per state. With a batched collision model
+    (see `PlannerInterface.enable_batch_checks`) the whole edge is checked
+    with one collision detection per `n_envs` states.
+    """
+
+    def __init__(self, si, planner_interface):
+        super().__init__(si)
+        self.si = si
+        self.planner_interface = planner_interface
+
+    def checkMotion(self, s1, s2, last_valid=None):
+        space = self.si.getStateSpace()
+        n_segments = space.validSegmentCount(s1, s2)
+        q1 = self.planner_interface._ompl_state_to_array(s1)
+        q2 = self.planner_interface._ompl_state_to_array(s2)
+
+        # s1 is assumed valid, check every other point on the edge (including s2)
+        t = np.arange(1, n_segments + 1, dtype=float) / n_segments
+        qs = q1 + t[:, None] * (q2 - q1)
+        valid = self.planner_interface.check_states_valid(qs)
+        if valid.all():
+            return True
+
+        if last_valid is not None:
+            # report the last valid point along the edge to the planner
+            i_bad = int(np.argmin(valid))
+            t_last = (i_bad / n_segments) if i_bad > 0 else 0.0
+            try:
+                if last_valid.first is not None:
+                    space.interpolate(s1, s2, t_last, last_valid.first)
+                last_valid.second = t_last
+            except AttributeError:
+                pass
+        return False
+
+
 class PlannerInterface:
-    def __init__(self, robot: Any, scene: Any):
+    def __init__(self, robot: Any, scene: Any, obstacles: Dict[str, Any] = None):
         # ensure we have a RobotAdapter so the rest of the code can rely on a
         # stable interface (but attribute access is forwarded to the raw robot)
         self.robot = _ensure_adapter(robot, scene)
         self.scene = scene
-        self.attached_object = None
+        # geom index -> link name / role tables, built on first use (see _build_geom_table)
+        self._geom_link_names = None
+        self._geom_roles = None
+        self._attached_object = None
+        # movable obstacles (blocks) in the live scene, keyed by name
+        self.obstacles = obstacles if obstacles is not None else {}
+
+        # reusable qpos buffers for the per-state validity callback (see _ompl_state_to_scratch): a host tensor,
+        # its numpy view the OMPL state is copied into, and the tensor on the sim device (the host one on CPU)
+        self._scratch_host = torch.empty(self.robot.n_qs, dtype=gs.tc_float)
+        self._scratch_host_np = self._scratch_host.numpy()
+        self._scratch_qpos = self._scratch_host.to(gs.device)
+
+        # long-lived multi-query roadmap, built on first use (see build_roadmap)
+        self.roadmap = None
+        # planner of plan_path calls that don't name one, e.g. the primitives' moves; "roadmap" reuses the roadmap
+        # for all of them (see demo.py's "roadmap" flag)
+        self.default_planner = "RRTConnect"
+
+        # process pool for plan_path_portfolio, created on first use, and its number of workers
+        self._portfolio_pool = None
+        self._portfolio_pool_config = None
+        # shared id of the current portfolio query (see _portfolio_worker_solve)
+        self._portfolio_query = None
+        # single worker for plan_path_async, so prefetches never queue behind portfolio jobs, and the shared id of
+        # its current query (see cancel_prefetch)
+        self._prefetch_pool = None
+        self._prefetch_query = None
+
+        # memoized plan_path results, see enable_path_cache
+        self.path_cache = None
+        self._path_cache_step = 1e-2
+
+        # collision model with one env per checked state, see enable_batch_checks
+        self.batch_robot = None
+        self.batch_obstacles = {}
+        self.batch_n_envs = 0
+        self._batch_geom_roles = None
+        self._batch_obstacle_poses = None
+
+    def enable_batch_checks(self, n_envs=32):
+        """
+        Check configurations in batches on a collision model with `n_envs` parallel envs.
+
+        The model is a viewer-less copy of the robot and blocks (see `scenes.create_collision_scene`), built once. Block
+        poses are synced from this scene when they change. `check_states_valid` then sets one configuration per env and
+        runs collision detection once for up to `n_envs` configurations, instead of once per configuration on the live
+        scene.
+
+        Parameters
+        ----------
+        n_envs : int, optional
+            The number of configurations checked per collision detection. Defaults to 32.
+        """
+        from scenes import create_collision_scene
+
+        with profiler.span("batch_checks.build", n_envs=n_envs):
+            _, self.batch_robot, self.batch_obstacles = create_collision_scene(list(self.obstacles.keys()), n_envs=n_envs)
+        self.batch_n_envs = n_envs
+        geom_link_names = np.array([geom.link.name for geom in self.batch_robot._solver.geoms])
+        self._batch_geom_roles = np.where(
+            np.isin(geom_link_names, GRIPPER_LINKS), GEOM_GRIPPER, GEOM_OTHER
+        ).astype(np.int8)
+        self._batch_obstacle_poses = None
+
+    def build_roadmap(self, n_nodes=1000, path=None, seed=None, k_neighbors=10, resolution=0.05):
+        """
+        Build (or load) the persistent roadmap used by `plan_path(planner="roadmap")`.
+
+        Parameters
+        ----------
+        n_nodes : int, optional
+            The number of configurations to sample. Defaults to 1000.
+        path : None | str, optional
+            If given and the file exists, the roadmap is loaded from it instead of being built. A newly built roadmap
+            is saved to this path. Defaults to None.
+        seed : None | int, optional
+            Seed for the node sampler. Defaults to None.
+        k_neighbors : int, optional
+            The number of neighbors each node is connected to. Defaults to 10.
+        resolution : float, optional
+            The max joint-space step between collision checks on an edge. Defaults to 0.05.
+
+        Returns
+        -------
+        roadmap : Roadmap
+        """
+        if path is not None and os.path.exists(path):
+            roadmap = Roadmap.load(path)
+            if roadmap.nodes.shape[1] != self.robot.n_qs:
+                gs.raise_exception(f"Roadmap in {path} does not match the robot ({self.robot.n_qs} dofs).")
+            self.roadmap = roadmap
+            # blocks may have moved since the roadmap was saved
+            self._sync_roadmap_obstacles()
+            return self.roadmap
+
+        q_limit_lower = np.asarray(self.robot.q_limit[0], dtype=float)
+        q_limit_upper = np.asarray(self.robot.q_limit[1], dtype=float)
+        self.roadmap = Roadmap(q_limit_lower, q_limit_upper, k_neighbors=k_neighbors, resolution=resolution)
+        self.roadmap.build(self, n_nodes=n_nodes, seed=seed, attached=self._attached_name())
+        self.roadmap.obstacle_pos = self._obstacle_positions()
+        if path is not None:
+            self.roadmap.save(path)
+        return self.roadmap
+
+    def _attached_name(self):
+        return next((name for name, entity in self.obstacles.items() if entity is self.attached_object), None)
+
+    def _obstacle_positions(self):
+        return {name: tensor_to_array(entity.get_pos()).astype(float) for name, entity in self.obstacles.items()}
+
+    def _sync_roadmap_obstacles(self, radius=0.15, tol=1e-3):
+        """Invalidate the roadmap only around blocks that moved since its last query, and switch its validity to the
+        currently held block."""
+        self.roadmap.set_attached(self._attached_name())
+        current = self._obstacle_positions()
+        moved_points = []
+        for name, pos in current.items():
+            old_pos = self.roadmap.obstacle_pos.get(name)
+            if old_pos is None:
+                moved_points.append(pos)
+            elif np.linalg.norm(pos - old_pos) > tol:
+                moved_points.extend([old_pos, pos])
+        if moved_points:
+            n_reset = self.roadmap.invalidate_near(np.array(moved_points), radius=radius)
+            gs.logger.debug(f"Roadmap: {n_reset} edges reset around moved blocks.")
+        self.roadmap.obstacle_pos = current
+
+    def _plan_path_roadmap(self, qpos_start, qpos_goal, num_waypoints):
+        if self.roadmap is None:
+            self.build_roadmap()
+        else:
+            self._sync_roadmap_obstacles()
+
+        path = self.roadmap.query(self, qpos_start, qpos_goal)
+        if path is None:
+            gs.logger.warning("Roadmap query failed. Returning empty path.")
+            return []
+        gs.logger.info("Path solution found successfully.")
+        path = interpolate_waypoints(path, num_waypoints)
+        return [torch.as_tensor(q, dtype=gs.tc_float, device=gs.device) for q in path]
 
     def diagnose_bounds_violation(self, si, state):
         # print the bounds the current state is violating
@@ -39,16 +370,58 @@ class PlannerInterface:
 
     def diagnose_valid_violation(self, state):
         # set robot to the candidate start and check collisions / joint violations
-        #self.robot.set_qpos(self._ompl_state_to_tensor(state))
+        #self.robot.set_qpos(self._ompl_state_to_scratch(state))
         print(self.robot.get_qpos())
         collision_pairs = self.robot.detect_collision()
         if collision_pairs.any() and len(collision_pairs) > 0:
-            bad_links = set()
-            for a, b in collision_pairs:
-                bad_links.add(self.scene.rigid_solver.geoms[a].link.name)
-                bad_links.add(self.scene.rigid_solver.geoms[b].link.name)
+            bad_links = set(self._get_geom_link_names()[np.asarray(collision_pairs)].ravel())
             gs.logger.warning(f"State causes collisions between links: {sorted(bad_links)}")
 
+    ########## collision filtering ##########
+
+    @property
+    def attached_object(self):
+        return self._attached_object
+
+    @attached_object.setter
+    def attached_object(self, entity):
+        self._attached_object = entity
+        if self._geom_roles is not None:
+            self._update_attached_roles()
+
+    def attach_object(self, entity):
+        """Allow collisions between the gripper and `entity` (e.g. a grasped block)."""
+        self.attached_object = entity
+
+    def release_object(self):
+        self.attached_object = None
+
+    def _build_geom_table(self):
+        """Build the geom index -> link name / role tables once the scene is built."""
+        geoms = self.scene.rigid_solver.geoms
+        self._geom_link_names = np.array([geom.link.name for geom in geoms])
+        self._geom_roles = np.where(
+            np.isin(self._geom_link_names, GRIPPER_LINKS), GEOM_GRIPPER, GEOM_OTHER
+        ).astype(np.int8)
+        self._update_attached_roles()
+
+    def _update_attached_roles(self):
+        self._geom_roles[self._geom_roles == GEOM_ATTACHED] = GEOM_OTHER
+        if self._attached_object is not None:
+            entity = self._attached_object
+            self._geom_roles[entity.geom_start:entity.geom_end] = GEOM_ATTACHED
+
+    def _get_geom_link_names(self):
+        if self._geom_link_names is None:
+            self._build_geom_table()
+        return self._geom_link_names
+
+    def _get_geom_roles(self):
+        if self._geom_roles is None:
+            self._build_geom_table()
+        return self._geom_roles
+
+    @profiler.timed("plan_path")
     def plan_path(
             self,
             qpos_goal,
@@ -56,7 +429,12 @@ class PlannerInterface:
             timeout=5.0,
             smooth_path=True,
             num_waypoints=100,
-            planner="RRTConnect",
+            planner=None,
+            batch_motion_check=True,
+            resolution=0.05,
+            try_straight_line=True,
+            straight_line_max_dist=0.5,
+            terminate=None,
     ):
         """
         Plan a path from `qpos_start` to `qpos_goal`.
@@ -73,12 +451,22 @@ class PlannerInterface:
             Whether to smooth the path after finding a solution. Defaults to True.
         num_waypoints : int, optional
             The number of waypoints to interpolate the path. If None, no interpolation will be performed. Defaults to 100.
-        ignore_collision : bool, optional
-            Whether to ignore collision checking during motion planning. Defaults to False.
-        ignore_joint_limit : bool, optional
-            Whether to ignore joint limits during motion planning. Defaults to False.
         planner : str, optional
-            The name of the motion planning algorithm to use. Supported planners: 'PRM', 'RRT', 'RRTConnect', 'RRTstar', 'EST', 'FMT', 'BITstar', 'ABITstar'. Defaults to 'RRTConnect'.
+            The name of the motion planning algorithm to use. Supported planners: 'PRM', 'RRT', 'RRTConnect', 'RRTstar', 'EST', 'FMT', 'roadmap'. 'roadmap' queries the persistent roadmap on this interface (see `build_roadmap`) instead of building a new planner. Defaults to None (`self.default_planner`).
+        batch_motion_check : bool, optional
+            Whether to validate whole edges with `BatchedMotionValidator` instead of one callback per state. Defaults to True.
+        resolution : float, optional
+            The state validity checking resolution of OMPL, as a fraction of the state space extent. Defaults to 0.05.
+        try_straight_line : bool, optional
+            Whether to first try a densely collision-checked straight line in joint space (see `plan_straight_line`) and
+            only run the sampling-based planner if it collides. Defaults to True.
+        straight_line_max_dist : float, optional
+            The straight line is only tried if no joint moves more than this (rad), i.e. for short moves such as the
+            descend/lift motions of the primitives. Longer transit moves rarely are collision-free lines and their
+            dense check would cost more than it saves. Defaults to 0.5.
+        terminate : None | callable, optional
+            Polled while the sampling-based planner runs, planning stops early once it returns True (e.g. when another
+            portfolio job already found a solution). Defaults to None.
 
         Returns
         -------
@@ -98,13 +486,16 @@ class PlannerInterface:
                     "Failed to import OMPL. Did you install? (For installation instructions, see https://genesis-world.readthedocs.io/en/latest/user_guide/overview/installation.html#optional-motion-planning)"
             )
 
+        if planner is None:
+            planner = self.default_planner
         supported_planners = [
             "PRM",
             "RRT",
             "RRTConnect",
             "RRTstar",
             "EST",
-            "FMT",]
+            "FMT",
+            "roadmap",]
         if planner not in supported_planners:
             gs.raise_exception(f"Planner {planner} is not supported. Supported planners: {supported_planners}.")
 
@@ -124,108 +515,634 @@ class PlannerInterface:
         if qpos_start.shape != (self.robot.n_qs,) or qpos_goal.shape != (self.robot.n_qs,):
             gs.raise_exception("Invalid shape for `qpos_start` or `qpos_goal`.")
 
-        ######### process joint limit ##########
+        cache_key = None
+        if self.path_cache is not None:
+            cache_key = self._path_cache_key(qpos_start, qpos_goal, planner, num_waypoints)
+            waypoints = self._get_cached_path(cache_key, qpos_start, qpos_goal)
+            if waypoints:
+                profiler.count("plan_path_cache_hits")
+                self.robot.set_qpos(qpos_cur)
+                return waypoints
 
-        # ensure we use numpy float64 for bounds
-        q_limit_lower = np.asarray(self.robot.q_limit[0], dtype=float)
-        q_limit_upper = np.asarray(self.robot.q_limit[1], dtype=float)
+        if try_straight_line and np.abs(qpos_goal - qpos_start).max() <= straight_line_max_dist:
+            with profiler.span("plan_path.straight_line"):
+                waypoints = self.plan_straight_line(qpos_goal, qpos_start, num_waypoints=num_waypoints)
+            if waypoints:
+                gs.logger.info("Straight-line path is collision free.")
+                self._put_cached_path(cache_key, waypoints)
+                self.robot.set_qpos(qpos_cur)
+                return waypoints
 
-        ######### setup OMPL ##########
-        space = ob.RealVectorStateSpace(self.robot.n_qs)
-        bounds = ob.RealVectorBounds(self.robot.n_qs)
+        if planner == "roadmap":
+            with profiler.span("plan_path.roadmap"):
+                waypoints = self._plan_path_roadmap(qpos_start, qpos_goal, num_waypoints)
+            self._put_cached_path(cache_key, waypoints)
+            self.robot.set_qpos(qpos_cur)
+            return waypoints
 
-        for i_q in range(self.robot.n_qs):
-            # pass native Python float (double) to OMPL to match C++ signature
-            bounds.setLow(i_q, float(q_limit_lower[i_q]))
-            bounds.setHigh(i_q, float(q_limit_upper[i_q]))
-        space.setBounds(bounds)
-        ss = ompl.geometric.SimpleSetup(space)
+        with profiler.span("plan_path.setup", planner=planner):
+            ######### process joint limit ##########
+
+            # ensure we use numpy float64 for bounds
+            q_limit_lower = np.asarray(self.robot.q_limit[0], dtype=float)
+            q_limit_upper = np.asarray(self.robot.q_limit[1], dtype=float)
+
+            ######### setup OMPL ##########
+            space = ob.RealVectorStateSpace(self.robot.n_qs)
+            bounds = ob.RealVectorBounds(self.robot.n_qs)
+
+            for i_q in range(self.robot.n_qs):
+                # pass native Python float (double) to OMPL to match C++ signature
+                bounds.setLow(i_q, float(q_limit_lower[i_q]))
+                bounds.setHigh(i_q, float(q_limit_upper[i_q]))
+            space.setBounds(bounds)
+            ss = ompl.geometric.SimpleSetup(space)
         
-        ss.setStateValidityChecker(ob.StateValidityCheckerFn(self._is_ompl_state_valid))
-        ss.setPlanner(getattr(ompl.geometric, planner)(ss.getSpaceInformation()))
+            ss.setStateValidityChecker(ob.StateValidityCheckerFn(self._is_ompl_state_valid))
+            ss.getSpaceInformation().setStateValidityCheckingResolution(resolution)
+            if batch_motion_check:
+                si = ss.getSpaceInformation()
+                # keep a reference so the python object outlives the OMPL setup
+                self._motion_validator = BatchedMotionValidator(si, self)
+                si.setMotionValidator(self._motion_validator)
+            ss.setPlanner(getattr(ompl.geometric, planner)(ss.getSpaceInformation()))
 
-        state_start = ob.State(space)
-        state_goal = ob.State(space)
-        for i_q in range(self.robot.n_qs):
-            state_start[i_q] = float(qpos_start[i_q])
-            state_goal[i_q] = float(qpos_goal[i_q])
-        # Diagnostic: check start/goal satisfy bounds and are valid according to the state validity checker
-        si = ss.getSpaceInformation()
-        start_in_bounds = bool(si.satisfiesBounds(state_start.get()))
-        if not start_in_bounds:
-            gs.logger.warning(f"OMPL start state out of bounds")
-            self.diagnose_bounds_violation(si, state_start.get())
-
-        goal_in_bounds = bool(si.satisfiesBounds(state_goal.get()))
-        if not goal_in_bounds:
-            gs.logger.warning(f"OMPL goal state out of bounds")
-            self.diagnose_bounds_violation(si, state_goal)
-
-        start_valid = bool(si.isValid(state_start.get()))
-        if not start_valid:
-            gs.logger.warning(f"OMPL start state invalid")
-            self.diagnose_valid_violation(state_start)
-
-        goal_valid = bool(si.isValid(state_goal.get()))
-        if not goal_valid:
-            gs.logger.warning(f"OMPL goal state invalid")
-            self.diagnose_valid_violation(state_goal)
-
-        # set start/goal in OMPL
-        ss.setStartAndGoalStates(state_start, state_goal)
-        ss.setup()
+            state_start = ob.State(space)
+            state_goal = ob.State(space)
+            for i_q in range(self.robot.n_qs):
+                state_start[i_q] = float(qpos_start[i_q])
+                state_goal[i_q] = float(qpos_goal[i_q])
+            # Diagnostic: check start/goal satisfy bounds and are valid according to the state validity checker
+            si = ss.getSpaceInformation()
+            start_in_bounds = bool(si.satisfiesBounds(state_start.get()))
+            if not start_in_bounds:
+                gs.logger.warning(f"OMPL start state out of bounds")
+                self.diagnose_bounds_violation(si, state_start.get())
+
+            goal_in_bounds = bool(si.satisfiesBounds(state_goal.get()))
+            if not goal_in_bounds:
+                gs.logger.warning(f"OMPL goal state out of bounds")
+                self.diagnose_bounds_violation(si, state_goal)
+
+            start_valid = bool(si.isValid(state_start.get()))
+            if not start_valid:
+                gs.logger.warning(f"OMPL start state invalid")
+                self.diagnose_valid_violation(state_start)
+
+            goal_valid = bool(si.isValid(state_goal.get()))
+            if not goal_valid:
+                gs.logger.warning(f"OMPL goal state invalid")
+                self.diagnose_valid_violation(state_goal)
+
+            # set start/goal in OMPL
+            ss.setStartAndGoalStates(state_start, state_goal)
+            ss.setup()
 
         ######### solve ##########
-        solved = ss.solve(timeout)
+        with profiler.span("plan_path.solve", planner=planner):
+            if terminate is None:
+                solved = ss.solve(timeout)
+            else:
+                ptc = ob.plannerOrTerminationCondition(
+                    ob.timedPlannerTerminationCondition(timeout),
+                    ob.PlannerTerminationCondition(ob.PlannerTerminationConditionFn(terminate)),
+                )
+                solved = ss.solve(ptc)
         waypoints = []
         if solved:
             gs.logger.info("Path solution found successfully.")
             path = ss.getSolutionPath()
             if smooth_path:
-                ss.simplifySolution()
+                with profiler.span("plan_path.simplify"):
+                    ss.simplifySolution()
 
-            path.interpolate(num_waypoints)
-            print("Number of waypoints in path:", path.getStateCount())
-            waypoints = self._ompl_states_to_tensor_list(path.getStates())
+            with profiler.span("plan_path.interpolate", num_waypoints=num_waypoints):
+                path.interpolate(num_waypoints)
+                waypoints = self._ompl_states_to_tensor_list(path.getStates())
+            print("Number of waypoints in path:", len(waypoints))
         else:
             gs.logger.warning("Path planning failed. Returning empty path.")
 
+        self._put_cached_path(cache_key, waypoints)
+
         ########## restore original state #########
         self.robot.set_qpos(qpos_cur)
 
         return waypoints
 
+    def plan_straight_line(self, qpos_goal, qpos_start=None, num_waypoints=100, max_step=0.01, chunk_size=32):
+        """
+        Interpolate a straight line in joint space and collision check it densely.
+
+        Parameters
+        ----------
+        qpos_goal : array_like
+            The goal state.
+        qpos_start : None | array_like, optional
+            The start state. If None, the current state of the rigid entity will be used. Defaults to None.
+        num_waypoints : int, optional
+            The number of waypoints of the returned path. Defaults to 100.
+        max_step : float, optional
+            The max change of any joint (rad) between two collision checks. Defaults to 0.01.
+        chunk_size : int, optional
+            The number of states per check_states_valid call, checking stops at the first chunk with a collision. Defaults to 32.
+
+        Returns
+        -------
+        waypoints : list
+            Same as `plan_path`, or an empty list if the line is not collision free.
+        """
+        if qpos_start is None:
+            qpos_start = self.robot.get_qpos()
+        qpos_start = np.asarray(tensor_to_array(qpos_start), dtype=float)
+        qpos_goal = np.asarray(tensor_to_array(qpos_goal), dtype=float)
+
+        q_limit_lower = np.asarray(self.robot.q_limit[0], dtype=float)
+        q_limit_upper = np.asarray(self.robot.q_limit[1], dtype=float)
+        for qpos in (qpos_start, qpos_goal):
+            if (qpos < q_limit_lower).any() or (qpos > q_limit_upper).any():
+                return []
+
+        if not self._path_valid(np.stack([qpos_start, qpos_goal]), max_step, chunk_size):
+            return []
+
+        t = np.linspace(0.0, 1.0, num_waypoints)
+        buffer = torch.as_tensor(qpos_start + t[:, None] * (qpos_goal - qpos_start), dtype=gs.tc_float, device=gs.device)
+        return list(buffer.unbind(0))
+
+    def _path_valid(self, waypoints, max_step=0.01, chunk_size=32):
+        """Whether the (N, n_qs) `waypoints` and the straight edges between them are collision free.
+
+        Every edge is checked at steps of at most `max_step` (rad) per joint, `chunk_size` states per
+        check_states_valid call, stopping at the first chunk with a collision.
+        """
+        qs = [waypoints[:1]]
+        for q_from, q_to in zip(waypoints[:-1], waypoints[1:]):
+            n_steps = max(int(np.ceil(np.abs(q_to - q_from).max() / max_step)), 1)
+            t = np.arange(1, n_steps + 1) / n_steps
+            qs.append(q_from + t[:, None] * (q_to - q_from))
+        qs = np.concatenate(qs)
+        for i_start in range(0, len(qs), chunk_size):
+            if not self.check_states_valid(qs[i_start:i_start + chunk_size]).all():
+                return False
+        return True
+
+    ########## path cache ##########
+
+    def enable_path_cache(self, max_entries=256, path=None, quantization=1e-2):
+        """
+        Memoize `plan_path` results keyed by quantized start/goal and the obstacle poses.
+
+        Cached paths are revalidated, waypoints and the edges between them, before being returned.
+
+        Parameters
+        ----------
+        max_entries : int, optional
+            The number of paths kept, least recently used ones are evicted. Defaults to 256.
+        path : None | str, optional
+            A pickle file the cache is loaded from and saved to. Defaults to None (memory only).
+        quantization : float, optional
+            Grid size (rad for joints, m for block positions) used to build the keys. Defaults to 1e-2.
+        """
+        self.path_cache = PersistentLRUCache(max_entries=max_entries, path=path)
+        self._path_cache_step = quantization
+        return self.path_cache
+
+    def _obstacle_fingerprint(self):
+        poses = []
+        for name in sorted(self.obstacles):
+            entity = self.obstacles[name]
+            pos = quantize(tensor_to_array(entity.get_pos()), self._path_cache_step)
+            quat = quantize(tensor_to_array(entity.get_quat()), 0.05)
+            poses.append((name, pos, quat, entity is self.attached_object))
+        return stable_hash(poses)
+
+    def _path_cache_key(self, qpos_start, qpos_goal, planner, num_waypoints):
+        return (
+            quantize(qpos_start, self._path_cache_step),
+            quantize(qpos_goal, self._path_cache_step),
+            self._obstacle_fingerprint(),
+            planner,
+            num_waypoints,
+        )
+
+    def _get_cached_path(self, key, qpos_start, qpos_goal):
+        path = self.path_cache.get(key)
+        if path is None:
+            return []
+        # snap the ends to the exact query, the cached ones are only equal up to quantization
+        path = path.copy()
+        path[0] = qpos_start
+        path[-1] = qpos_goal
+        # obstacles that moved by less than the fingerprint's quantization can still block an edge
+        if not self._path_valid(path):
+            self.path_cache.pop(key)
+            return []
+        gs.logger.info("Path solution found in cache.")
+        buffer = torch.as_tensor(path, dtype=gs.tc_float, device=gs.device)
+        return list(buffer.unbind(0))
+
+    def _put_cached_path(self, key, waypoints):
+        if key is None or not waypoints:
+            return
+        self.path_cache.put(key, np.stack([tensor_to_array(w) for w in waypoints]).astype(float))
+
+    def plan_path_portfolio(
+            self,
+            qpos_goal,
+            qpos_start=None,
+            planners=("RRTConnect", "RRT", "EST"),
+            seeds=(None,),
+            timeout=5.0,
+            smooth_path=True,
+            num_waypoints=100,
+            mode="first",
+            n_workers=None,
+    ):
+        """
+        Race several planners and seeds on a process pool and return one solution.
+
+        Each worker process builds its own collision model of the robot and blocks once (see
+        `scenes.create_collision_scene`), when the pool is created, and stays alive across queries. The deadline starts
+        once all workers are ready. Block poses and the attached object are synced from this scene for every query.
+        Once the query is answered (or the deadline passes), jobs still running stop planning, so they don't hold their
+        worker until their own timeout.
+
+        Parameters
+        ----------
+        qpos_goal, qpos_start, timeout, smooth_path, num_waypoints :
+            Same as `plan_path`. `timeout` is the deadline for the whole portfolio.
+        planners : sequence of str, optional
+            The planners to run, see `plan_path`. Defaults to ('RRTConnect', 'RRT', 'EST').
+        seeds : sequence of None | int, optional
+            Seeds (positive ints) to run each planner with. Every (planner, seed) pair is one job, seeded jobs sample
+            the same way in whichever worker runs them. Defaults to (None,).
+        mode : str, optional
+            'first' returns the first solution found, 'shortest' returns the shortest solution found before the
+            deadline. Defaults to 'first'.
+        n_workers : None | int, optional
+            The number of worker processes. Defaults to the number of jobs, capped at the CPU count.
+
+        Returns
+        -------
+        waypoints : list
+            Same as `plan_path`. Empty if no job found a solution before the deadline.
+        """
+        if mode not in ("first", "shortest"):
+            gs.raise_exception(f"Portfolio mode {mode} is not supported. Supported modes: ['first', 'shortest'].")
+
+        if qpos_start is None:
+            qpos_start = self.robot.get_qpos()
+        qpos_start = tensor_to_array(qpos_start)
+        qpos_goal = tensor_to_array(qpos_goal)
+
+        jobs = [(planner, seed) for planner in planners for seed in seeds]
+        pool = self._get_portfolio_pool(n_workers or min(len(jobs), os.cpu_count() or 1))
+        query = self._portfolio_query.value
+
+        block_poses = {
+            name: (tensor_to_array(entity.get_pos()), tensor_to_array(entity.get_quat()))
+            for name, entity in self.obstacles.items()
+        }
+        attached = self._attached_name()
+        futures = [
+            pool.submit(_portfolio_worker_solve, {
+                "qpos_start": qpos_start,
+                "qpos_goal": qpos_goal,
+                "planner": planner,
+                "seed": seed,
+                "timeout": timeout,
+                "smooth_path": smooth_path,
+                "num_waypoints": num_waypoints,
+                "block_poses": block_poses,
+                "attached": attached,
+                "query": query,
+            })
+            for planner, seed in jobs
+        ]
+
+        # the workers are ready (see _get_portfolio_pool), they get their full planning timeout plus some slack for
+        # the scene sync and transfer
+        deadline = time.monotonic() + timeout + 1.0
+        best = None
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=max(deadline - time.monotonic(), 0.0), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                planner, seed, path = future.result()
+                if path is None:
+                    continue
+                if best is None or _path_length(path) < _path_length(best[2]):
+                    best = (planner, seed, path)
+            if best is not None and mode == "first":
+                break
+        for future in pending:
+            future.cancel()
+        # jobs already running see the new query id and stop
+        self._portfolio_query.value = query + 1
+
+        if best is None:
+            gs.logger.warning("Portfolio planning failed. Returning empty path.")
+            return []
+        gs.logger.info(f"Portfolio solution found by {best[0]} (seed {best[1]}).")
+        buffer = torch.as_tensor(best[2], dtype=gs.tc_float, device=gs.device)
+        return list(buffer.unbind(0))
+
+    def plan_path_async(
+            self,
+            hand_goal,
+            hand_start=None,
+            qpos_start=None,
+            block_poses=None,
+            attached=None,
+            gripper_start=None,
+            gripper_goal=None,
+            timeout=5.0,
+            num_waypoints=100,
+            planner="RRTConnect",
+            resolution=0.05,
+    ):
+        """
+        Solve IK and plan a path in a background worker process, for a predicted world state.
+
+        The worker is a dedicated process with its own collision model (see `plan_path_portfolio`), so planning runs
+        while this scene keeps stepping and never waits for portfolio jobs. It is started on first use, or ahead of
+        time with `start_prefetch_worker`. The result is only a proposal: check it against the actual state with
+        `validate_path` before use. `cancel_prefetch` stops jobs whose result is no longer needed.
+
+        Parameters
+        ----------
+        hand_goal : tuple
+            (pos, quat) of the hand at the goal.
+        hand_start : None | tuple, optional
+            (pos, quat) of the hand at the start, solved with IK. Ignored if `qpos_start` is given.
+        qpos_start : None | array_like, optional
+            The start state. If both are None, the current state is used. Defaults to None.
+        block_poses : None | dict, optional
+            Predicted block name -> (pos, quat). Defaults to the current poses.
+        attached : None | str, optional
+            Name of the block predicted to be in the gripper. Without `block_poses`, defaults to the currently attached
+            one. Defaults to None.
+        gripper_start, gripper_goal : None | float, optional
+            Finger positions set on the IK solutions. Defaults to None (as solved).
+        timeout, num_waypoints, planner, resolution :
+            Same as `plan_path`.
+
+        Returns
+        -------
+        future : concurrent.futures.Future
+            Resolves to (qpos_start, qpos_goal, waypoints), with the waypoints as an (N, n_qs) array or None.
+        """
+        if qpos_start is None and hand_start is None:
+            qpos_start = self.robot.get_qpos()
+        if block_poses is None:
+            block_poses = {
+                name: (tensor_to_array(entity.get_pos()), tensor_to_array(entity.get_quat()))
+                for name, entity in self.obstacles.items()
+            }
+            if attached is None:
+                attached = self._attached_name()
+        pool = self._get_prefetch_pool()
+        return pool.submit(_ik_worker_solve, {
+            "hand_goal": hand_goal,
+            "hand_start": hand_start,
+            "qpos_start": None if qpos_start is None else tensor_to_array(qpos_start),
+            "ik_seed": tensor_to_array(self.robot.get_qpos()),
+            "gripper_start": gripper_start,
+            "gripper_goal": gripper_goal,
+            "timeout": timeout,
+            "num_waypoints": num_waypoints,
+            "planner": planner,
+            "resolution": resolution,
+            "block_poses": block_poses,
+            "attached": attached,
+            "query": self._prefetch_query.value,
+        })
+
+    def start_prefetch_worker(self):
+        """Start the `plan_path_async` worker and wait until it built its collision model."""
+        self._get_prefetch_pool()
+
+    def cancel_prefetch(self):
+        """Stop the running and queued `plan_path_async` jobs, their futures resolve without waypoints."""
+        if self._prefetch_query is not None:
+            self._prefetch_query.value += 1
+
+    def validate_path(self, waypoints, qpos_goal=None, tol=0.05):
+        """
+        Check a path planned elsewhere (e.g. by `plan_path_async`) against the actual state.
+
+        Parameters
+        ----------
+        waypoints : array_like
+            The path, shape (N, n_qs).
+        qpos_goal : None | array_like, optional
+            The goal the path has to end at. Defaults to None (not checked).
+        tol : float, optional
+            The max joint deviation of the path's start from the current state (and of its end from `qpos_goal`).
+            Defaults to 0.05.
+
+        Returns
+        -------
+        waypoints : list
+            Same as `plan_path`, or an empty list if the path does not start at the current state, does not end at
+            `qpos_goal` or is no longer collision free (waypoints and the edges between them).
+        """
+        waypoints = np.asarray(tensor_to_array(waypoints), dtype=float)
+        if waypoints.ndim != 2 or len(waypoints) == 0:
+            return []
+        if np.abs(waypoints[0] - tensor_to_array(self.robot.get_qpos())).max() > tol:
+            return []
+        if qpos_goal is not None and np.abs(waypoints[-1] - tensor_to_array(qpos_goal)).max() > tol:
+            return []
+        if not self._path_valid(waypoints):
+            return []
+        buffer = torch.as_tensor(waypoints, dtype=gs.tc_float, device=gs.device)
+        return list(buffer.unbind(0))
+
+    def _get_portfolio_pool(self, n_workers):
+        """Pool of `n_workers` ready processes, rebuilt if the size differs from the last query."""
+        config = n_workers
+        if self._portfolio_pool is not None and self._portfolio_pool_config != config:
+            self._portfolio_pool.shutdown(wait=False, cancel_futures=True)
+            self._portfolio_pool = None
+        if self._portfolio_pool is None:
+            # spawn so every worker starts a clean genesis/OMPL process
+            context = multiprocessing.get_context("spawn")
+            if self._portfolio_query is None:
+                self._portfolio_query = context.Value("q", 0, lock=False)
+            ready = context.Value("i", 0)
+            self._portfolio_pool = ProcessPoolExecutor(
+                max_workers=n_workers,
+                mp_context=context,
+                initializer=_portfolio_worker_init,
+                initargs=(list(self.obstacles.keys()), self._portfolio_query, ready),
+            )
+            self._portfolio_pool_config = config
+            with profiler.span("plan_path_portfolio.start_workers", n_workers=n_workers):
+                _start_workers(self._portfolio_pool, n_workers, ready)
+        return self._portfolio_pool
+
+    def _get_prefetch_pool(self):
+        if self._prefetch_pool is None:
+            context = multiprocessing.get_context("spawn")
+            if self._prefetch_query is None:
+                self._prefetch_query = context.Value("q", 0, lock=False)
+            ready = context.Value("i", 0)
+            self._prefetch_pool = ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=context,
+                initializer=_portfolio_worker_init,
+                initargs=(list(self.obstacles.keys()), self._prefetch_query, ready),
+            )
+            with profiler.span("plan_path_async.start_worker"):
+                _start_workers(self._prefetch_pool, 1, ready)
+        return self._prefetch_pool
+
+    def close_portfolio(self):
+        """Shut down the portfolio and prefetch worker processes."""
+        if self._portfolio_pool is not None:
+            self._portfolio_pool.shutdown(wait=False, cancel_futures=True)
+            self._portfolio_pool = None
+        if self._prefetch_pool is not None:
+            self._prefetch_pool.shutdown(wait=False, cancel_futures=True)
+            self._prefetch_pool = None
+
     def _is_ompl_state_valid(self, state):     
-        self.robot.set_qpos(self._ompl_state_to_tensor(state))
+        profiler.count("collision_checks")
+        self.robot.set_qpos(self._ompl_state_to_scratch(state))
         collision_pairs = self.robot.detect_collision()
+        return self._collision_pairs_allowed(collision_pairs)
 
+    def _collision_pairs_allowed(self, collision_pairs, roles=None):
         if not len(collision_pairs):
             return True
         if not self.attached_object:
             return False
 
-        return self.collision_with_attached_object(collision_pairs)
-
-    def collision_with_attached_object(self, collision_pairs):
-        finger_names = {"left_finger", "right_finger", "hand"}
-        for a, b in collision_pairs:
-            name_a = self.scene.rigid_solver.geoms[a].link.name
-            name_b = self.scene.rigid_solver.geoms[b].link.name
-            if (name_a in finger_names and b == self.attached_object.idx) or \
-                 (name_b in finger_names and a == self.attached_object.idx) or \
-                 (name_b in finger_names and name_a in finger_names):
-                continue
-            return False
-        return True
+        return self.collision_with_attached_object(collision_pairs, roles)
+
+    def check_states_valid(self, qpos_batch):
+        """
+        Check a batch of configurations for collisions.
+
+        Parameters
+        ----------
+        qpos_batch : array_like
+            Configurations to check, shape (N, n_qs).
+
+        Returns
+        -------
+        valid : np.ndarray
+            Boolean mask of shape (N,), True where the configuration is collision free.
+        """
+        qpos_batch = np.atleast_2d(np.asarray(tensor_to_array(qpos_batch), dtype=float))
+        if qpos_batch.shape[1] != self.robot.n_qs:
+            gs.raise_exception("Invalid shape for `qpos_batch`.")
+        profiler.count("collision_checks", len(qpos_batch))
+
+        if self.batch_robot is not None:
+            return self._check_states_valid_batched(qpos_batch)
+
+        # no batched model, one state at a time on the live scene, the robot's qpos is restored afterwards
+        qpos_cur = self.robot.get_qpos()
+        valid = np.empty(len(qpos_batch), dtype=bool)
+        for i, qpos in enumerate(qpos_batch):
+            self.robot.set_qpos(qpos)
+            valid[i] = self._collision_pairs_allowed(self.robot.detect_collision())
+        self.robot.set_qpos(qpos_cur)
+        return valid
+
+    def _check_states_valid_batched(self, qpos_batch):
+        self._sync_batch_obstacles()
+        # geom roles of the batched model, the attached block is the one of the same name
+        roles = self._batch_geom_roles.copy()
+        attached = self._attached_name()
+        if attached is not None:
+            entity = self.batch_obstacles[attached]
+            roles[entity.geom_start:entity.geom_end] = GEOM_ATTACHED
+
+        robot = self.batch_robot
+        valid = np.empty(len(qpos_batch), dtype=bool)
+        for i_start in range(0, len(qpos_batch), self.batch_n_envs):
+            chunk = qpos_batch[i_start:i_start + self.batch_n_envs]
+            robot.set_qpos(chunk, envs_idx=np.arange(len(chunk)))
+            for i_env, collision_pairs in enumerate(self._batch_collision_pairs(len(chunk))):
+                valid[i_start + i_env] = self._collision_pairs_allowed(collision_pairs, roles)
+        return valid
+
+    def _batch_collision_pairs(self, n_envs):
+        """Run collision detection once for all envs of the batched model and split the pairs per env."""
+        robot = self.batch_robot
+        solver = robot._solver
+        # detect_collision runs the detection for every env but only returns the pairs of env 0, the other envs' pairs
+        # are read from the collider state (named collider_state or _collider_state depending on the genesis version)
+        pairs_env0 = robot.detect_collision(0)
+        collider_state = getattr(solver.collider, "collider_state", None) or getattr(solver.collider, "_collider_state", None)
+        try:
+            n_contacts = collider_state.n_contacts.to_numpy()
+            geom_a = collider_state.contact_data.geom_a.to_numpy()
+            geom_b = collider_state.contact_data.geom_b.to_numpy()
+        except AttributeError:
+            # unknown collider layout, detect once per env instead
+            return [pairs_env0] + [robot.detect_collision(i_env) for i_env in range(1, n_envs)]
+
+        pairs_per_env = []
+        for i_env in range(n_envs):
+            n = n_contacts[i_env]
+            pairs = np.stack([geom_a[:n, i_env], geom_b[:n, i_env]], axis=1)
+            # only pairs involving the robot, same as RigidEntity.detect_collision
+            pairs_per_env.append(pairs[((pairs >= robot.geom_start) & (pairs < robot.geom_end)).any(axis=1)])
+        return pairs_per_env
+
+    def _sync_batch_obstacles(self):
+        """Copy the block poses of this scene to every env of the batched model, if they changed."""
+        names = list(self.batch_obstacles)
+        poses = np.array([
+            np.concatenate([tensor_to_array(self.obstacles[name].get_pos()), tensor_to_array(self.obstacles[name].get_quat())])
+            for name in names
+        ], dtype=float)
+        if self._batch_obstacle_poses is not None and np.allclose(poses, self._batch_obstacle_poses, atol=1e-6):
+            return
+        for name, pose in zip(names, poses):
+            entity = self.batch_obstacles[name]
+            entity.set_pos(np.tile(pose[:3], (self.batch_n_envs, 1)))
+            entity.set_quat(np.tile(pose[3:], (self.batch_n_envs, 1)))
+        self._batch_obstacle_poses = poses
+
+    def collision_with_attached_object(self, collision_pairs, roles=None):
+        # allowed: gripper-attached object and gripper-gripper contacts
+        if roles is None:
+            roles = self._get_geom_roles()
+        roles = roles[np.asarray(collision_pairs)]
+        gripper = roles == GEOM_GRIPPER
+        attached = roles == GEOM_ATTACHED
+        allowed = (gripper[:, 0] & (gripper[:, 1] | attached[:, 1])) | (attached[:, 0] & gripper[:, 1])
+        return bool(allowed.all())
 
     def _ompl_states_to_tensor_list(self, states):
-        tensor_list = []
-        for state in states:
-            tensor_list.append(self._ompl_state_to_tensor(state))
-        return tensor_list
+        # convert the whole path in one go, each waypoint is a row view of one buffer
+        buffer = torch.as_tensor(self._ompl_states_to_array(states), dtype=gs.tc_float, device=gs.device)
+        return list(buffer.unbind(0))
+
+    def _ompl_states_to_array(self, states):
+        """Read all `states` into one (num_states, n_qs) array in a single pass."""
+        n_qs = self.robot.n_qs
+        return np.fromiter(
+            (state[i] for state in states for i in range(n_qs)), dtype=float, count=len(states) * n_qs
+        ).reshape(len(states), n_qs)
+
+    def _ompl_state_to_array(self, state):
+        return np.fromiter((state[i] for i in range(self.robot.n_qs)), dtype=float, count=self.robot.n_qs)
 
-    def _ompl_state_to_tensor(self, state):
-        tensor = torch.empty(self.robot.n_qs, dtype=gs.tc_float, device=gs.device)
+    def _ompl_state_to_scratch(self, state):
+        """Copy `state` into a scratch qpos tensor that is reused across validity checks."""
+        # the OMPL bindings only expose a state element by element, hence the loop
+        scratch_np = self._scratch_host_np
         for i in range(self.robot.n_qs):
-            tensor[i] = state[i]
-        return tensor
\ No newline at end of file
+            scratch_np[i] = state[i]
+        if self._scratch_qpos is not self._scratch_host:
+            self._scratch_qpos.copy_(self._scratch_host)
+        return self._scratch_qpos
@@ -0,0 +1,237 @@
+"""Procedurally generated N-block scenes for scaling benchmarks.
+
+The hand-written layouts (layouts/*.json) stop at 10 blocks. The generator
+here produces layout specs of the same format for any number of blocks,
+reproducibly from a seed:
+
+    "table"      N blocks scattered on the table, goal: random towers
+    "stacks"     N blocks in random towers, goal: random towers
+    "structure"  N blocks on the table and a layered slot structure with
+                 N slots next to them, goal: every slot filled. The slot
+                 relations are the same kind as in Init_1.txt / Init_2.txt
+                 (ontable, north, east, above, no-*), so the structure can be
+                 planned with custom_domain.pddl or slot_encoding.SlotEncoding
+
+Blocks are put on a jittered grid over the robot's workspace, so they
+never overlap; all randomness comes from the seed and the specs have no
+sampling noise left.
+
+Usage:
+    spec = generate_spec(24, kind="structure", seed=0)
+    layout = generate_layout(24, kind="structure", seed=0)
+    scene, franka, blocks_state, slots_state = build_scene_from_layout(layout, headless=True)
+    save_spec(spec, "structure_24_0")  # layouts/structure_24_0.json + layouts/Init_structure_24_0.txt
+"""
+import colorsys
+import json
+import math
+import os
+import string
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from scenes import LAYOUT_DIR, layout_from_spec
+
+KINDS = ("table", "stacks", "structure")
+
+BLOCK_SIZE = 0.04
+TABLE_Z = 0.02
+# part of the table the blocks are put on (x and y range, m)
+TABLE_REGION = ((0.35, 0.75), (-0.45, 0.45))
+# distance between grid cells, leaves room for the gripper fingers
+CELL_SIZE = 0.1
+# the structure is built at the same spot as the special structures
+SLOT_ORIGIN = (0.45, -0.25, TABLE_Z)
+# share of the slots in the bottom layer of a structure
+BOTTOM_LAYER_SHARE = 2.0 / 3.0
+
+
+def block_names(n_blocks: int) -> List[str]:
+    """a, b, ..., z, aa, ab, ... (all lowercase, valid PDDL names)."""
+    names = []
+    for i in range(n_blocks):
+        name = ""
+        i += 1
+        while i > 0:
+            i, rest = divmod(i - 1, 26)
+            name = string.ascii_lowercase[rest] + name
+        names.append(name)
+    return names
+
+
+def block_colors(n_blocks: int) -> List[List[float]]:
+    """Evenly spaced hues, so neighbouring names have distinguishable colors."""
+    return [list(colorsys.hsv_to_rgb(i / max(n_blocks, 1), 0.9, 1.0)) for i in range(n_blocks)]
+
+
+def _table_cells(exclude: Optional[Tuple[Tuple[float, float], Tuple[float, float]]] = None) -> np.ndarray:
+    """Centers (M, 2) of the grid cells over TABLE_REGION, without those overlapping `exclude` (x/y ranges)."""
+    (x_min, x_max), (y_min, y_max) = TABLE_REGION
+    xs = np.arange(x_min + CELL_SIZE / 2, x_max, CELL_SIZE)
+    ys = np.arange(y_min + CELL_SIZE / 2, y_max, CELL_SIZE)
+    cells = np.stack(np.meshgrid(xs, ys, indexing="ij"), axis=-1).reshape(-1, 2)
+    if exclude is not None:
+        (ex_min, ex_max), (ey_min, ey_max) = exclude
+        half = CELL_SIZE / 2
+        overlap = (
+            (cells[:, 0] + half > ex_min) & (cells[:, 0] - half < ex_max)
+            & (cells[:, 1] + half > ey_min) & (cells[:, 1] - half < ey_max)
+        )
+        cells = cells[~overlap]
+    return cells
+
+
+def _pick_cells(rng: np.random.Generator, n_cells: int, exclude=None) -> np.ndarray:
+    """`n_cells` distinct random cells, jittered within their cell."""
+    cells = _table_cells(exclude)
+    if n_cells > len(cells):
+        raise ValueError(f"{n_cells} positions do not fit on the table ({len(cells)} free cells).")
+    chosen = cells[rng.choice(len(cells), size=n_cells, replace=False)]
+    jitter = (CELL_SIZE - BLOCK_SIZE) / 4
+    return chosen + rng.uniform(-jitter, jitter, chosen.shape)
+
+
+def _split_towers(rng: np.random.Generator, names: List[str], max_height: int) -> List[List[str]]:
+    """Shuffle `names` into towers of 1..max_height blocks, bottom block first."""
+    order = [names[i] for i in rng.permutation(len(names))]
+    towers = []
+    while order:
+        height = int(rng.integers(1, max_height + 1))
+        towers.append(order[:height])
+        order = order[height:]
+    return towers
+
+
+def _towers_goal(towers: List[List[str]]) -> str:
+    return " ".join(f"(on {top} {bottom})" for tower in towers for bottom, top in zip(tower, tower[1:]))
+
+
+def structure_slots(n_slots: int) -> Tuple[List[str], List[List[float]], str]:
+    """Layered slot structure with `n_slots` slots.
+
+    The bottom layer is a row-major grid of about BOTTOM_LAYER_SHARE of the
+    slots; every further layer sits on top of the first slots of the layer
+    below. Every side of a slot either has a neighbour in its layer or is
+    marked as an edge (no-*), so each upper slot can be supported.
+
+    Returns:
+        slot names, offsets from the structure origin, slot relations (Init file text)
+    """
+    n_bottom = max(1, min(n_slots, math.ceil(n_slots * BOTTOM_LAYER_SHARE)))
+    width = math.ceil(math.sqrt(n_bottom))
+
+    # (layer, column, row) of every slot, layer by layer
+    cells = [(0, i % width, i // width) for i in range(n_bottom)]
+    while len(cells) < n_slots:
+        layer = cells[-1][0] + 1
+        below = [cell for cell in cells if cell[0] == layer - 1][:n_slots - len(cells)]
+        cells += [(layer, column, row) for _, column, row in below]
+
+    names = [f"s{i + 1}" for i in range(len(cells))]
+    index = {cell: name for cell, name in zip(cells, names)}
+    offsets = [[column * BLOCK_SIZE, row * BLOCK_SIZE, layer * BLOCK_SIZE] for layer, column, row in cells]
+
+    lines = []
+    for layer in range(cells[-1][0] + 1):
+        relations = []
+        edges = []
+        for cell in (cell for cell in cells if cell[0] == layer):
+            name = index[cell]
+            _, column, row = cell
+            if layer == 0:
+                relations.append(f"(ontable {name})")
+            else:
+                relations.append(f"(above {name} {index[(layer - 1, column, row)]})")
+            for direction, (d_column, d_row) in (("north", (0, 1)), ("east", (1, 0)), ("south", (0, -1)), ("west", (-1, 0))):
+                neighbour = index.get((layer, column + d_column, row + d_row))
+                if neighbour is None:
+                    edges.append(f"(no-{direction} {name})")
+                elif direction in ("north", "east"):
+                    relations.append(f"({direction} {neighbour} {name})")
+        lines += [f"; Layer {layer + 1}", " ".join(relations), " ".join(edges)]
+    return names, offsets, "\n".join(lines) + "\n"
+
+
+def generate_spec(n_blocks: int, kind: str = "table", seed: Optional[int] = None,
+                  max_height: int = 4) -> Dict[str, Any]:
+    """Layout spec (the format of layouts/*.json) of an N-block scene.
+
+    Args:
+        n_blocks: number of blocks (and slots for "structure")
+        kind: "table", "stacks" or "structure" (see module docstring)
+        seed: same seed, same scene
+        max_height: highest tower in the initial state ("stacks") and in the goal
+
+    Returns:
+        JSON-serializable spec; structures carry their slot relations inline
+    """
+    if kind not in KINDS:
+        raise ValueError(f"Kind {kind} is not supported. Supported kinds: {list(KINDS)}.")
+    rng = np.random.default_rng(seed)
+    names = block_names(n_blocks)
+
+    slots = None
+    exclude = None
+    if kind == "stacks":
+        towers = _split_towers(rng, names, max_height)
+        cells = _pick_cells(rng, len(towers))
+        anchors_by_name = {}
+        for tower, (x, y) in zip(towers, cells.tolist()):
+            for level, name in enumerate(tower):
+                anchors_by_name[name] = [x, y, TABLE_Z + level * BLOCK_SIZE]
+        anchors = [anchors_by_name[name] for name in names]
+    else:
+        if kind == "structure":
+            slot_names, offsets, relations = structure_slots(n_blocks)
+            footprint = np.asarray(offsets)[:, :2] + np.asarray(SLOT_ORIGIN[:2])
+            # keep the blocks a cell away from the structure
+            exclude = (
+                (footprint[:, 0].min() - CELL_SIZE / 2, footprint[:, 0].max() + CELL_SIZE / 2),
+                (footprint[:, 1].min() - CELL_SIZE / 2, footprint[:, 1].max() + CELL_SIZE / 2),
+            )
+            slots = {"origin": list(SLOT_ORIGIN), "noise": 0.0, "names": slot_names,
+                     "offsets": offsets, "relations": relations}
+        anchors = [[x, y, TABLE_Z] for x, y in _pick_cells(rng, n_blocks, exclude).tolist()]
+
+    spec = {
+        "description": f"Generated: {n_blocks} blocks, {kind}, seed {seed}",
+        "blocks": {"names": names, "anchors": anchors, "noise": 0.0, "colors": block_colors(n_blocks)},
+    }
+    if slots is not None:
+        spec["slots"] = slots
+        spec["goal"] = " ".join(f"(filled {name})" for name in slots["names"])
+    else:
+        spec["goal"] = _towers_goal(_split_towers(rng, names, max_height))
+    return spec
+
+
+def spec_name(n_blocks: int, kind: str, seed: Optional[int]) -> str:
+    return f"{kind}_{n_blocks}_{'none' if seed is None else seed}"
+
+
+def generate_layout(n_blocks: int, kind: str = "table", seed: Optional[int] = None,
+                    max_height: int = 4) -> Dict[str, Any]:
+    """Generated layout, ready for scenes.build_scene_from_layout (see generate_spec)."""
+    spec = generate_spec(n_blocks, kind=kind, seed=seed, max_height=max_height)
+    return layout_from_spec(spec, spec_name(n_blocks, kind, seed))
+
+
+def save_spec(spec: Dict[str, Any], name: str, directory: str = LAYOUT_DIR) -> str:
+    """Write a generated spec as <name>.json, and its slot relations as Init_<name>.txt next to it.
+
+    Returns:
+        path of the .json file, loadable with scenes.load_layout
+    """
+    spec = dict(spec)
+    if "slots" in spec and "relations" in spec["slots"]:
+        slots = dict(spec["slots"])
+        init_file = f"Init_{name}.txt"
+        with open(os.path.join(directory, init_file), "w") as f:
+            f.write(slots.pop("relations"))
+        slots["init_file"] = init_file
+        spec["slots"] = slots
+    path = os.path.join(directory, name + ".json")
+    with open(path, "w") as f:
+        json.dump(spec, f, indent=4)
+    return path
@@ -0,0 +1,167 @@
+"""Stage-level timing of the pipeline.
+
+Spans time the stages of a task (scene build, grounding, task planning,
+each plan_path phase, IK, the simulation steps of every primitive) and
+counters count cheap, frequent events such as collision checks. Spans
+nest per thread and are exported as a Chrome trace (chrome://tracing or
+https://ui.perfetto.dev) or as a per-stage summary.
+
+The module-level `profiler` is disabled by default; while disabled a span
+is a shared no-op context manager and a count is one attribute check, so
+the instrumentation can stay in the hot paths.
+
+Usage:
+    from profiling import profiler
+    profiler.enable()
+    with profiler.span("plan_path.solve", planner="RRT"):
+        ...
+    profiler.count("collision_checks")
+    profiler.save_chrome_trace("profile_trace.json")
+    profiler.print_summary()
+"""
+import functools
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("profiler", "name", "args", "start_ns")
+
+    def __init__(self, profiler: "Profiler", name: str, args: Dict[str, Any]):
+        self.profiler = profiler
+        self.name = name
+        self.args = args
+        self.start_ns = 0
+
+    def __enter__(self):
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        end_ns = time.perf_counter_ns()
+        self.profiler._record(self.name, self.start_ns, end_ns - self.start_ns, self.args)
+        return False
+
+
+class Profiler:
+    def __init__(self, enabled: bool = False):
+        """
+        Args:
+            enabled: record spans and counters right away
+        """
+        self.enabled = enabled
+        # (name, start ns, duration ns, thread id, args) of every finished span
+        self.events: List[tuple] = []
+        self.counters: Dict[str, int] = defaultdict(int)
+        self._origin_ns = time.perf_counter_ns()
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def reset(self) -> None:
+        self.events = []
+        self.counters = defaultdict(int)
+        self._origin_ns = time.perf_counter_ns()
+
+    def span(self, name: str, **args):
+        """Context manager timing the enclosed block as `name`; `args` show up in the trace."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, args)
+
+    def timed(self, name: Optional[str] = None):
+        """Decorator timing every call of a function (named after it by default)."""
+        def decorator(fn):
+            span_name = name or fn.__qualname__
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                with _Span(self, span_name, {}):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def count(self, name: str, n: int = 1) -> None:
+        if self.enabled:
+            self.counters[name] += n
+
+    def _record(self, name: str, start_ns: int, duration_ns: int, args: Dict[str, Any]) -> None:
+        # list.append is atomic, spans of worker threads need no lock
+        self.events.append((name, start_ns, duration_ns, threading.get_ident(), args))
+
+    # ---------------------------------------------------------------- export
+
+    def summary(self) -> Dict[str, Any]:
+        """Per span name: number of calls, total/mean/max seconds; plus the counters."""
+        stages: Dict[str, Dict[str, float]] = {}
+        for name, _, duration_ns, _, _ in self.events:
+            stage = stages.setdefault(name, {"count": 0, "total_s": 0.0, "max_s": 0.0})
+            duration = duration_ns * 1e-9
+            stage["count"] += 1
+            stage["total_s"] += duration
+            stage["max_s"] = max(stage["max_s"], duration)
+        for stage in stages.values():
+            stage["mean_s"] = stage["total_s"] / stage["count"]
+        return {"stages": stages, "counters": dict(self.counters)}
+
+    def chrome_trace(self) -> Dict[str, Any]:
+        """Spans as complete ("X") events, counters as one counter ("C") event at the end."""
+        pid = os.getpid()
+        events = []
+        end_us = 0.0
+        for name, start_ns, duration_ns, tid, args in self.events:
+            ts = (start_ns - self._origin_ns) / 1e3
+            end_us = max(end_us, ts + duration_ns / 1e3)
+            events.append({
+                "name": name, "cat": name.split(".", 1)[0], "ph": "X", "ts": ts, "dur": duration_ns / 1e3,
+                "pid": pid, "tid": tid, "args": {key: _jsonable(value) for key, value in args.items()},
+            })
+        if self.counters:
+            events.append({"name": "counters", "ph": "C", "ts": end_us, "pid": pid, "tid": 0, "args": dict(self.counters)})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def save_chrome_trace(self, path: str = "profile_trace.json") -> None:
+        with open(path, "w") as f:
+            json.dump(self.chrome_trace(), f)
+
+    def save_summary(self, path: str = "profile_summary.json") -> None:
+        with open(path, "w") as f:
+            json.dump(self.summary(), f, indent=4)
+
+    def print_summary(self) -> None:
+        summary = self.summary()
+        print(f"{'stage':<28} {'calls':>7} {'total [s]':>10} {'mean [s]':>10} {'max [s]':>10}")
+        for name, stage in sorted(summary["stages"].items(), key=lambda item: -item[1]["total_s"]):
+            print(f"{name:<28} {stage['count']:>7} {stage['total_s']:>10.4f} {stage['mean_s']:>10.4f} {stage['max_s']:>10.4f}")
+        for name, value in sorted(summary["counters"].items()):
+            print(f"{name:<28} {value:>7}")
+
+
+def _jsonable(value: Any) -> Any:
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return str(value)
+
+
+# shared by all modules of the pipeline
+profiler = Profiler()
@@ -0,0 +1,357 @@
+"""Persistent multi-query roadmap (LazyPRM style) for PlannerInterface.
+
+The roadmap is sampled once for a fixed robot and table, then reused for
+every query. Node validity is checked when the roadmap is built, edge
+validity is checked lazily the first time a query wants to use an edge
+and remembered afterwards. When blocks move, only the nodes/edges whose
+robot links pass near the old or new block position are reset to
+"unknown", everything else keeps its cached result. The links are taken
+as segments from each link to its parent, so long links count over their
+whole length, not just at their origin.
+
+Validity depends on the block held in the gripper, so it is kept per
+attached object (set_attached): the results without a held block are put
+aside while one is held, and restored once it is released.
+
+Usage:
+    roadmap = Roadmap(q_lower, q_upper)
+    roadmap.build(planner_interface, n_nodes=1000)
+    path = roadmap.query(planner_interface, q_start, q_goal)
+    roadmap.save("roadmap.npz")
+"""
+import heapq
+from typing import Any, List, Optional
+
+import numpy as np
+
+# node / edge states
+UNKNOWN = 0
+VALID = 1
+INVALID = -1
+
+
+def interpolate_waypoints(points: np.ndarray, num_waypoints: int) -> np.ndarray:
+    """Resample a piecewise-linear joint-space path to `num_waypoints` points,
+    evenly spaced along its length."""
+    points = np.asarray(points, dtype=float)
+    if len(points) == 1 or num_waypoints is None:
+        return points
+    seg_len = np.linalg.norm(np.diff(points, axis=0), axis=1)
+    cum_len = np.concatenate([[0.0], np.cumsum(seg_len)])
+    if cum_len[-1] == 0.0:
+        return np.repeat(points[:1], num_waypoints, axis=0)
+    s = np.linspace(0.0, cum_len[-1], num_waypoints)
+    return np.stack([np.interp(s, cum_len, points[:, i]) for i in range(points.shape[1])], axis=1)
+
+
+def _segment_distance(a: np.ndarray, b: np.ndarray, points: np.ndarray) -> np.ndarray:
+    """Distance of every point to every segment a -> b.
+
+    Args:
+        a, b: (..., 3) segment ends
+        points: (P, 3) positions
+
+    Returns:
+        (..., P) distances
+    """
+    a = a[..., None, :]
+    ab = b[..., None, :] - a
+    ap = points - a
+    t = np.clip((ap * ab).sum(-1) / np.maximum((ab * ab).sum(-1), 1e-12), 0.0, 1.0)
+    return np.linalg.norm(a + t[..., None] * ab - points, axis=-1)
+
+
+class Roadmap:
+    def __init__(self, q_lower, q_upper, k_neighbors: int = 10, resolution: float = 0.05):
+        """
+        Args:
+            q_lower, q_upper: joint limits of the robot
+            k_neighbors: number of nearest neighbors each node is connected to
+            resolution: max joint-space step (rad) between collision checks on an edge
+        """
+        self.q_lower = np.asarray(q_lower, dtype=float)
+        self.q_upper = np.asarray(q_upper, dtype=float)
+        self.k_neighbors = k_neighbors
+        self.resolution = resolution
+
+        n_qs = len(self.q_lower)
+        self.nodes = np.empty((0, n_qs))
+        self.node_state = np.empty(0, dtype=np.int8)
+        # world positions of every robot link at each node, used for invalidation
+        self.link_pos = np.empty((0, 0, 3))
+        # parent of every link (itself for the root), the links are segments to their parent
+        self.link_parent = np.empty(0, dtype=np.int64)
+        self.edges = np.empty((0, 2), dtype=np.int64)
+        self.edge_state = np.empty(0, dtype=np.int8)
+        self.edge_cost = np.empty(0)
+        # obstacle positions the cached validity refers to, keyed by name
+        self.obstacle_pos = {}
+        # name of the held object node_state/edge_state refer to, and the states kept for other held objects
+        self.attached = None
+        self._states_by_attached = {}
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.nodes)
+
+    ########## construction ##########
+
+    def build(self, planner_interface: Any, n_nodes: int = 1000, seed: Optional[int] = None,
+              attached: Optional[str] = None) -> None:
+        """Sample `n_nodes` collision-free configurations (holding `attached`) and connect them."""
+        self.attached = attached
+        self._states_by_attached = {}
+        rng = np.random.default_rng(seed)
+        samples = rng.uniform(self.q_lower, self.q_upper, size=(n_nodes, len(self.q_lower)))
+        valid = planner_interface.check_states_valid(samples)
+        self.nodes = samples[valid]
+        self.node_state = np.full(len(self.nodes), VALID, dtype=np.int8)
+        self.link_pos = self._compute_link_pos(planner_interface, self.nodes)
+        self.link_parent = self._link_parents(planner_interface.robot, self.link_pos.shape[1])
+        self._connect()
+
+    @staticmethod
+    def _link_parents(robot: Any, n_links: int) -> np.ndarray:
+        """Local parent index of every link of `robot`, the link itself for the root."""
+        try:
+            parent = np.array([link.parent_idx - robot.link_start for link in robot.links], dtype=np.int64)
+        except AttributeError:
+            # serial chain
+            parent = np.arange(n_links, dtype=np.int64) - 1
+        return np.where((parent < 0) | (parent >= n_links), np.arange(n_links), parent)
+
+    def _compute_link_pos(self, planner_interface: Any, qs: np.ndarray) -> np.ndarray:
+        # genesis only when a robot is at hand, the roadmap itself is plain numpy
+        from genesis.utils.misc import tensor_to_array
+
+        robot = planner_interface.robot
+        qpos_cur = robot.get_qpos()
+        link_pos = []
+        for q in qs:
+            robot.set_qpos(q)
+            link_pos.append(np.asarray(tensor_to_array(robot.get_links_pos()), dtype=float))
+        robot.set_qpos(qpos_cur)
+        if not link_pos:
+            return np.empty((0, 0, 3))
+        return np.stack(link_pos)
+
+    def _connect(self) -> None:
+        """Connect every node to its k nearest neighbors (undirected, no duplicates)."""
+        if self.n_nodes < 2:
+            return
+        dist = np.linalg.norm(self.nodes[:, None, :] - self.nodes[None, :, :], axis=-1)
+        np.fill_diagonal(dist, np.inf)
+        k = min(self.k_neighbors, self.n_nodes - 1)
+        nearest = np.argpartition(dist, k - 1, axis=1)[:, :k]
+        i = np.repeat(np.arange(self.n_nodes), k)
+        j = nearest.ravel()
+        edges = np.unique(np.sort(np.stack([i, j], axis=1), axis=1), axis=0)
+        self.edges = edges
+        self.edge_state = np.full(len(edges), UNKNOWN, dtype=np.int8)
+        self.edge_cost = dist[edges[:, 0], edges[:, 1]]
+
+    ########## invalidation ##########
+
+    def invalidate_near(self, points, radius: float = 0.15) -> int:
+        """Reset cached validity of everything that passes within `radius` of `points`.
+
+        Args:
+            points: (P, 3) world positions, e.g. old and new positions of moved blocks
+            radius: clearance around each point, in meters
+
+        Returns:
+            number of edges that were reset
+        """
+        points = np.atleast_2d(np.asarray(points, dtype=float))
+        if self.n_nodes == 0 or len(points) == 0:
+            return 0
+        parent = self.link_parent if len(self.link_parent) else np.arange(self.link_pos.shape[1])
+
+        # nodes: any link segment within radius of any point
+        d_nodes = _segment_distance(self.link_pos, self.link_pos[:, parent], points)
+        near_nodes = (d_nodes < radius).any(axis=(1, 2))
+
+        # edges: near either end, the links halfway along the edge, or the paths swept by the link origins
+        pos_a = self.link_pos[self.edges[:, 0]]
+        pos_b = self.link_pos[self.edges[:, 1]]
+        pos_mid = 0.5 * (pos_a + pos_b)
+        near_edges = near_nodes[self.edges].any(axis=1)
+        near_edges |= (_segment_distance(pos_mid, pos_mid[:, parent], points) < radius).any(axis=(1, 2))
+        near_edges |= (_segment_distance(pos_a, pos_b, points) < radius).any(axis=(1, 2))
+
+        # the same geometry for every held object
+        for node_state, edge_state in [(self.node_state, self.edge_state), *self._states_by_attached.values()]:
+            node_state[near_nodes] = UNKNOWN
+            edge_state[near_edges] = UNKNOWN
+        return int(near_edges.sum())
+
+    def set_attached(self, attached: Optional[str]) -> None:
+        """Switch the cached validity to the one for holding `attached` (None: nothing held)."""
+        if attached == self.attached:
+            return
+        self._states_by_attached[self.attached] = (self.node_state, self.edge_state)
+        states = self._states_by_attached.pop(attached, None)
+        if states is None:
+            # never queried holding this object, nothing is known yet
+            states = (np.full(self.n_nodes, UNKNOWN, dtype=np.int8), np.full(len(self.edges), UNKNOWN, dtype=np.int8))
+        self.node_state, self.edge_state = states
+        self.attached = attached
+
+    ########## query ##########
+
+    def query(self, planner_interface: Any, q_start, q_goal, max_iterations: int = 50) -> Optional[np.ndarray]:
+        """Find a path from `q_start` to `q_goal` through the roadmap.
+
+        Returns:
+            (M, n_qs) array of configurations including start and goal, or None
+        """
+        q_start = np.asarray(q_start, dtype=float)
+        q_goal = np.asarray(q_goal, dtype=float)
+        if self.n_nodes == 0:
+            return None
+
+        # temporary start/goal nodes and their connections, not stored in the roadmap
+        i_start, i_goal = self.n_nodes, self.n_nodes + 1
+        nodes = np.vstack([self.nodes, q_start, q_goal])
+        node_state = np.concatenate([self.node_state, [VALID, VALID]]).astype(np.int8)
+        k = min(self.k_neighbors, self.n_nodes)
+        query_edges = []
+        for i_query, q in ((i_start, q_start), (i_goal, q_goal)):
+            d = np.linalg.norm(self.nodes - q, axis=1)
+            for j in np.argpartition(d, k - 1)[:k]:
+                query_edges.append((j, i_query, d[j]))
+        query_edges.append((i_start, i_goal, float(np.linalg.norm(q_goal - q_start))))
+
+        edges = np.vstack([self.edges, np.array([(a, b) for a, b, _ in query_edges], dtype=np.int64)])
+        edge_state = np.concatenate([self.edge_state, np.full(len(query_edges), UNKNOWN, dtype=np.int8)])
+        edge_cost = np.concatenate([self.edge_cost, [c for _, _, c in query_edges]])
+
+        path = None
+        for _ in range(max_iterations):
+            edge_path = self._shortest_path(len(nodes), edges, edge_state, edge_cost, node_state, i_start, i_goal)
+            if edge_path is None:
+                break
+            if self._check_path_edges(planner_interface, nodes, node_state, edges, edge_state, edge_path):
+                path = self._edge_path_to_nodes(edges, edge_path, i_start)
+                break
+
+        # write back what we learned about the persistent part of the roadmap
+        n_edges = len(self.edges)
+        self.edge_state = edge_state[:n_edges]
+        self.node_state = node_state[:self.n_nodes]
+
+        if path is None:
+            return None
+        return nodes[path]
+
+    def _shortest_path(self, n_nodes, edges, edge_state, edge_cost, node_state, i_start, i_goal) -> Optional[List[int]]:
+        """Dijkstra over edges/nodes not known to be invalid. Returns a list of edge indices."""
+        usable = (edge_state != INVALID) & (node_state[edges] != INVALID).all(axis=1)
+        adjacency: List[List[int]] = [[] for _ in range(n_nodes)]
+        for i_edge in np.flatnonzero(usable):
+            a, b = edges[i_edge]
+            adjacency[a].append(i_edge)
+            adjacency[b].append(i_edge)
+
+        dist = np.full(n_nodes, np.inf)
+        via_edge = np.full(n_nodes, -1, dtype=np.int64)
+        dist[i_start] = 0.0
+        heap = [(0.0, i_start)]
+        while heap:
+            d, node = heapq.heappop(heap)
+            if node == i_goal:
+                break
+            if d > dist[node]:
+                continue
+            for i_edge in adjacency[node]:
+                a, b = edges[i_edge]
+                other = b if a == node else a
+                nd = d + edge_cost[i_edge]
+                if nd < dist[other]:
+                    dist[other] = nd
+                    via_edge[other] = i_edge
+                    heapq.heappush(heap, (nd, other))
+
+        if not np.isfinite(dist[i_goal]):
+            return None
+        edge_path = []
+        node = i_goal
+        while node != i_start:
+            i_edge = via_edge[node]
+            edge_path.append(int(i_edge))
+            a, b = edges[i_edge]
+            node = a if b == node else b
+        return edge_path[::-1]
+
+    def _check_path_edges(self, planner_interface, nodes, node_state, edges, edge_state, edge_path) -> bool:
+        """Lazily collision check all unknown edges of a candidate path with one check_states_valid call."""
+        to_check = [i_edge for i_edge in edge_path if edge_state[i_edge] == UNKNOWN]
+        if not to_check:
+            return True
+
+        qs, owner = [], []
+        for i_edge in to_check:
+            qa, qb = nodes[edges[i_edge]]
+            n_steps = max(int(np.ceil(np.abs(qb - qa).max() / self.resolution)), 1)
+            t = np.linspace(0.0, 1.0, n_steps + 1)
+            qs.append(qa + t[:, None] * (qb - qa))
+            owner.append(np.full(n_steps + 1, i_edge))
+        valid = planner_interface.check_states_valid(np.vstack(qs))
+        owner = np.concatenate(owner)
+
+        all_valid = True
+        for i_edge in to_check:
+            edge_valid = bool(valid[owner == i_edge].all())
+            edge_state[i_edge] = VALID if edge_valid else INVALID
+            if edge_valid:
+                node_state[edges[i_edge]] = VALID
+            all_valid &= edge_valid
+        return all_valid
+
+    @staticmethod
+    def _edge_path_to_nodes(edges, edge_path, i_start) -> List[int]:
+        path = [i_start]
+        for i_edge in edge_path:
+            a, b = edges[i_edge]
+            path.append(int(b if a == path[-1] else a))
+        return path
+
+    ########## persistence ##########
+    # only the validity for the current held object is saved
+
+    def save(self, path: str) -> None:
+        names = sorted(self.obstacle_pos)
+        np.savez_compressed(
+            path,
+            q_lower=self.q_lower,
+            q_upper=self.q_upper,
+            k_neighbors=self.k_neighbors,
+            resolution=self.resolution,
+            nodes=self.nodes,
+            node_state=self.node_state,
+            link_pos=self.link_pos,
+            link_parent=self.link_parent,
+            edges=self.edges,
+            edge_state=self.edge_state,
+            edge_cost=self.edge_cost,
+            obstacle_names=np.array(names, dtype=str),
+            obstacle_pos=np.array([self.obstacle_pos[name] for name in names], dtype=float).reshape(-1, 3),
+            attached=np.array("" if self.attached is None else self.attached, dtype=str),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "Roadmap":
+        data = np.load(path)
+        roadmap = cls(data["q_lower"], data["q_upper"], int(data["k_neighbors"]), float(data["resolution"]))
+        roadmap.nodes = data["nodes"]
+        roadmap.node_state = data["node_state"]
+        roadmap.link_pos = data["link_pos"]
+        if "link_parent" in data:
+            roadmap.link_parent = data["link_parent"]
+        roadmap.edges = data["edges"]
+        roadmap.edge_state = data["edge_state"]
+        roadmap.edge_cost = data["edge_cost"]
+        roadmap.obstacle_pos = {str(name): pos for name, pos in zip(data["obstacle_names"], data["obstacle_pos"])}
+        if "attached" in data and str(data["attached"]):
+            roadmap.attached = str(data["attached"])
+        return roadmap
@@ -16,6 +16,8 @@ adds an explicit .robot property to access the raw object when needed.
 """
 from typing import Any
 
+from profiling import profiler
+
 
 class RobotAdapter:
     def __init__(self, robot: Any, scene: Any = None):
@@ -48,8 +50,8 @@ class RobotAdapter:
     def get_qpos(self):
         return self.robot.get_qpos()
 
-    def set_qpos(self, qpos):
-        return self.robot.set_qpos(qpos)
+    def set_qpos(self, qpos, *args, **kwargs):
+        return self.robot.set_qpos(qpos, *args, **kwargs)
 
     def control_dofs_position(self, *args, **kwargs):
         return self.robot.control_dofs_position(*args, **kwargs)
@@ -61,7 +63,8 @@ class RobotAdapter:
         return self.robot.get_link(*args, **kwargs)
 
     def inverse_kinematics(self, *args, **kwargs):
-        return self.robot.inverse_kinematics(*args, **kwargs)
+        with profiler.span("ik"):
+            return self.robot.inverse_kinematics(*args, **kwargs)
 
     def detect_collision(self, *args, **kwargs):
         return self.robot.detect_collision(*args, **kwargs)
@@ -1,19 +1,40 @@
 """Scene factory helpers.
 
 Provide functions to create common demo scenes. Each factory returns a
-tuple (scene, franka, blocks_state, end_effector) to be used by demos.
+tuple (scene, franka, blocks_state) to be used by demos, plus slots_state
+for the special structures. Block and slot layouts are declared in
+layouts/*.json and built by build_scene_from_layout.
 """
 from typing import Any, Dict, Tuple
+import functools
+import json
+import os
 import random
 import time
 random.seed(time.time())
 
 import numpy as np
 import genesis as gs
+from genesis.utils.misc import tensor_to_array
+from profiling import profiler
 from robot_adapter import RobotAdapter
+from symbolic_state import parse_facts
 
 
-def _build_base_scene(camera_pos=(3, -1, 1.5), camera_lookat=(0.0, 0.0, 0.5)) -> gs.Scene:
+def _build_base_scene(camera_pos=(3, -1, 1.5), camera_lookat=(0.0, 0.0, 0.5), headless: bool = False) -> gs.Scene:
+    """Scene with the demo physics settings.
+
+    Args:
+        camera_pos, camera_lookat: viewer camera
+        headless: no viewer and no rendering, physics steps as fast as possible
+            (batch evaluation, servers without a display)
+    """
+    if headless:
+        return gs.Scene(
+            sim_options=gs.options.SimOptions(dt=0.01, substeps=8),
+            show_viewer=False,
+            show_FPS=False,
+        )
     scene = gs.Scene(
         sim_options=gs.options.SimOptions(dt=0.01, substeps=8),
         viewer_options=gs.options.ViewerOptions(
@@ -28,9 +49,9 @@ def _build_base_scene(camera_pos=(3, -1, 1.5), camera_lookat=(0.0, 0.0, 0.5)) ->
 
 def _elevate_robot_base(franka: Any) -> None:
     """Slightly raise robot base to avoid initial collisions."""
-    base_pos = np.asarray(franka.get_pos(), dtype=float)
+    base_pos = np.asarray(tensor_to_array(franka.get_pos()), dtype=float)
     new_pos = base_pos.copy()
-    new_pos[2] += 0.01
+    new_pos[..., 2] += 0.01
     franka.set_pos(new_pos) 
 
 def _rand_xy(base, noise=0.05):
@@ -41,450 +62,351 @@ def _rand_xy(base, noise=0.05):
 def add(pos, delta):
     return tuple(a + b for a, b in zip(pos, delta))
 
-def create_scene_6blocks() -> Tuple[Any, Any, Dict[str, Any], Dict[str, Any]]:
-    """Create the default demo scene (layout 1).
+@profiler.timed("scene.build_collision")
+def create_collision_scene(block_names, n_envs: int = 0) -> Tuple[Any, Any, Dict[str, Any]]:
+    """Create a viewer-less copy of the robot and blocks for collision checking only.
+
+    Entities are added in the same order as the demo scenes (plane, blocks,
+    robot) so geom indices line up with them. Block poses are placeholders,
+    callers set them from the live scene before checking.
+
+    Args:
+        block_names: names of the blocks to add, in the live scene's order
+        n_envs: number of parallel envs to build (0 for a single env)
 
     Returns:
-        scene, franka_adapter, blocks_state, end_effector
+        scene, franka_adapter, blocks_state
     """
-    scene = _build_base_scene()
-
-    # basic geometry
+    scene = _build_base_scene(headless=True)
     plane = scene.add_entity(gs.morphs.Plane())
-    # add some random noise up to 5 cm in x/y
-
-    # TODO: Add back random position for red
-    posR = (0.65, 0.0, 0.02)
-    posG = _rand_xy((0.65, 0.2, 0.02))
-    posB = _rand_xy((0.65, 0.4, 0.02))
-    posY = _rand_xy((0.45, 0.0, 0.02))
-    posM = _rand_xy((0.45, 0.2, 0.02))
-    posC = _rand_xy((0.45, 0.4, 0.02))
-    posD = _rand_xy((0.45, 0.6, 0.02))
-
-    cubeR = scene.add_entity(
-        gs.morphs.Box(size=(0.04, 0.04, 0.04), pos= posR),
-        surface=gs.options.surfaces.Plastic(color=(1.0, 0.0, 0.0)),
-    )
-    cubeG = scene.add_entity(
-        gs.morphs.Box(size=(0.04, 0.04, 0.04), pos= posG),
-        surface=gs.options.surfaces.Plastic(color=(0.0, 1.0, 0.0)),
-    )
-    cubeB = scene.add_entity(
-        gs.morphs.Box(size=(0.04, 0.04, 0.04), pos= posB),
-        surface=gs.options.surfaces.Plastic(color=(0.0, 0.0, 1.0)),
-    )
-    cubeY = scene.add_entity(
-        gs.morphs.Box(size=(0.04, 0.04, 0.04), pos=posY),
-        surface=gs.options.surfaces.Plastic(color=(1.0, 1.0, 0.0)),
-    )
-    cubeM = scene.add_entity(
-        gs.morphs.Box(size=(0.04, 0.04, 0.04), pos=posM),
-        surface=gs.options.surfaces.Plastic(color=(1.0, 0, 1.0)),
-    )
 
-    cubeC = scene.add_entity(
-        gs.morphs.Box(size=(0.04, 0.04, 0.04), pos=posC),
-        surface=gs.options.surfaces.Plastic(color=(0, 1.0, 1.0)),
-    )
+    blocks_state: Dict[str, Any] = {}
+    for i, name in enumerate(block_names):
+        # park blocks out of reach until real poses are synced in
+        blocks_state[name] = scene.add_entity(
+            gs.morphs.Box(size=(0.04, 0.04, 0.04), pos=(-1.0, -1.0 + 0.1 * i, 0.02)),
+        )
 
     franka_raw = scene.add_entity(gs.morphs.MJCF(file="xml/franka_emika_panda/panda.xml"))
     franka = RobotAdapter(franka_raw, scene)
 
-    # build scene (construct physics/visuals)
-    scene.build()
-
-    # initial robot pose (7 arm joints + 2 gripper fingers)
-    franka.set_qpos(np.array([0.0, -0.5, -0.2, -1.0, 0.0, 1.00, 0.5, 0.02, 0.02]))
+    if n_envs > 0:
+        scene.build(n_envs=n_envs)
+    else:
+        scene.build()
 
-    # slightly raise robot base to avoid initial collisions
     _elevate_robot_base(franka)
 
-    blocks_state: Dict[str, Any] = {"r": cubeR, "g": cubeG, "b": cubeB, "y": cubeY, "m": cubeM, "c": cubeC}
-
     return scene, franka, blocks_state
 
-def create_scene_8blocks() -> Tuple[Any, Any, Dict[str, Any], Dict[str, Any]]:
-    """Create the default demo scene (Bonus layout)
+# Declarative layouts: layouts/<name>.json
+LAYOUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "layouts")
+DEFAULT_QPOS = (0.0, -0.5, -0.2, -1.0, 0.0, 1.00, 0.5, 0.02, 0.02)
 
-    Returns:
-        scene, franka_adapter, blocks_state, end_effector
-    """
-    scene = _build_base_scene()
 
-    # basic geometry
-    plane = scene.add_entity(gs.morphs.Plane())
-    # add some random noise up to 5 cm in x/y
-
-    # TODO: Add back random position for red
-    posR = (0.65, 0.0, 0.02)
-    posG = _rand_xy((0.65, 0.2, 0.02))
-    posB = _rand_xy((0.65, 0.4, 0.02))
-    posY = _rand_xy((0.45, 0.0, 0.02))
-    posM = _rand_xy((0.45, 0.2, 0.02))
-    posC = _rand_xy((0.45, 0.4, 0.02))
-    posD = _rand_xy((0.45, 0.6, 0.02))
-    # Add 4 additional blocks for second and third layer
-    posO = _rand_xy((0.45, -0.2, 0.02))
-    posP = _rand_xy((0.45, -0.4, 0.02))
-    # posBr = _rand_xy((0.65, -0.2, 0.02))
-    # posW = _rand_xy((0.6, -0.37, 0.02))
-
-    cubeR = scene.add_entity(
-        gs.morphs.Box(size=(0.04, 0.04, 0.04), pos= posR),
-        surface=gs.options.surfaces.Plastic(color=(1.0, 0.0, 0.0)),
-    )
-    cubeG = scene.add_entity(
-        gs.morphs.Box(size=(0.04, 0.04, 0.04), pos= posG),
-        surface=gs.options.surfaces.Plastic(color=(0.0, 1.0, 0.0)),
-    )
-    cubeB = scene.add_entity(
-        gs.morphs.Box(size=(0.04, 0.04, 0.04), pos= posB),
-        surface=gs.options.surfaces.Plastic(color=(0.0, 0.0, 1.0)),
-    )
-    cubeY = scene.add_entity(
-        gs.morphs.Box(size=(0.04, 0.04, 0.04), pos=posY),
-        surface=gs.options.surfaces.Plastic(color=(1.0, 1.0, 0.0)),
-    )
-    cubeM = scene.add_entity(
-        gs.morphs.Box(size=(0.04, 0.04, 0.04), pos=posM),
-        surface=gs.options.surfaces.Plastic(color=(1.0, 0, 1.0)),
-    )
+def _readonly(values, shape=None) -> np.ndarray:
+    array = np.array(values, dtype=float)
+    if shape is not None:
+        array = np.broadcast_to(array, shape).copy()
+    array.setflags(write=False)
+    return array
 
-    cubeC = scene.add_entity(
-        gs.morphs.Box(size=(0.04, 0.04, 0.04), pos=posC),
-        surface=gs.options.surfaces.Plastic(color=(0, 1.0, 1.0)),
-    )
-    cubeO = scene.add_entity(
-        gs.morphs.Box(size=(0.04, 0.04, 0.04), pos= posO),
-        surface=gs.options.surfaces.Plastic(color=(1.0, 0.647, 0.0)),
-    )
-    cubeP = scene.add_entity(
-        gs.morphs.Box(size=(0.04, 0.04, 0.04), pos= posP),
-        surface=gs.options.surfaces.Plastic(color=(1.0, 0.753, 0.796)),
-    )
-    # cubeBr = scene.add_entity(
-    #     gs.morphs.Box(size=(0.04, 0.04, 0.04), pos= posBr),
-    #     surface=gs.options.surfaces.Plastic(color=(0.647, 0.165, 0.165)),
-    # )
-    # cubeW = scene.add_entity(
-    #     gs.morphs.Box(size=(0.04, 0.04, 0.04), pos= posW),
-    #     surface=gs.options.surfaces.Plastic(color=(1.0, 1.0, 1.0)),
-    # )
-
-    franka_raw = scene.add_entity(gs.morphs.MJCF(file="xml/franka_emika_panda/panda.xml"))
-    franka = RobotAdapter(franka_raw, scene)
-
-    # build scene (construct physics/visuals)
-    scene.build()
-
-    # initial robot pose (7 arm joints + 2 gripper fingers)
-    franka.set_qpos(np.array([0.0, -0.5, -0.2, -1.0, 0.0, 1.00, 0.5, 0.02, 0.02]))
 
-    # slightly raise robot base to avoid initial collisions
-    _elevate_robot_base(franka)
+@functools.lru_cache(maxsize=None)
+def load_layout(name: str) -> Dict[str, Any]:
+    """Parse a layout file once; later calls return the cached result.
 
-    blocks_state: Dict[str, Any] = {"r": cubeR, "g": cubeG, "b": cubeB, "y": cubeY, "m": cubeM, "c": cubeC,
-                                    "o": cubeO, "p": cubeP}
+    A layout lists the blocks (and optionally the slots of a structure) as
+    arrays, see layouts/*.json:
 
-    return scene, franka, blocks_state
+        "blocks": {"names": [...], "anchors": [[x, y, z], ...], "colors": [[r, g, b], ...],
+                   "noise": per block or scalar x/y noise, "group_noise": noise shared by all blocks}
+        "slots":  {"names": [...], "origin": [x, y, z], "noise": x/y noise of the origin,
+                   "offsets": [[dx, dy, dz], ...] from the origin,
+                   "init_file": static slot relations (relative to the layout file) or
+                   "relations": the same relations inline, e.g. "(ontable s1) (north s2 s1)"}
+        "goal":   optional goal facts, e.g. "(on r g) (on b r)"
+        "camera": {"pos": [...], "lookat": [...]}
 
+    Args:
+        name: name of a file in layouts/ (e.g. "6blocks") or a path to a .json file
 
-def create_scene_stacked() -> Tuple[Any, Any, Dict[str, Any], Dict[str, Any]]:
-    """Create an alternative demo scene (layout 2) with cube positions. one on top of the other."""
-    scene = _build_base_scene(camera_pos=(2.5, -1.2, 1.2), camera_lookat=(0.6, 0.0, 0.2))
-
-    plane = scene.add_entity(gs.morphs.Plane())
+    Returns:
+        dict with read-only numpy arrays, don't modify it (it is shared)
+    """
+    path = name if name.endswith(".json") else os.path.join(LAYOUT_DIR, name + ".json")
+    if not os.path.exists(path):
+        gs.raise_exception(f"Layout {name} not found.")
+    with open(path, "r", encoding="utf-8") as f:
+        spec = json.load(f)
+    return layout_from_spec(spec, os.path.splitext(os.path.basename(path))[0], os.path.dirname(os.path.abspath(path)))
 
-    # slightly different positions
-    startx, starty, _ = _rand_xy((0.45, 0.0, 0.02), noise=0.2) 
-    cubeR = scene.add_entity(
-        gs.morphs.Box(size=(0.04, 0.04, 0.04), pos=(startx, starty, 0.02)),
-        surface=gs.options.surfaces.Plastic(color=(1.0, 0.0, 0.0)),
-    )
-    cubeG = scene.add_entity(
-        gs.morphs.Box(size=(0.04, 0.04, 0.04), pos=(startx, starty, 0.06)),
-        surface=gs.options.surfaces.Plastic(color=(0.0, 1.0, 0.0)),
-    )
-    cubeB = scene.add_entity(
-        gs.morphs.Box(size=(0.04, 0.04, 0.04), pos=(startx, starty, 0.10)),
-        surface=gs.options.surfaces.Plastic(color=(0.0, 0.0, 1.0)),
-    )
-    cubeY = scene.add_entity(
-        gs.morphs.Box(size=(0.04, 0.04, 0.04), pos=(startx, starty, 0.14)),
-        surface=gs.options.surfaces.Plastic(color=(1.0, 1.0, 0.0)),
-    )
 
-    cubeM = scene.add_entity(
-        gs.morphs.Box(size=(0.04, 0.04, 0.04), pos=(startx, starty, 0.18)),
-        surface=gs.options.surfaces.Plastic(color=(1.0, 0, 1.0)),
-    )
+def layout_from_spec(spec: Dict[str, Any], name: str, base_dir: str = LAYOUT_DIR) -> Dict[str, Any]:
+    """Turn a parsed layout spec (see load_layout) into arrays.
 
-    cubeC = scene.add_entity(
-        gs.morphs.Box(size=(0.04, 0.04, 0.04), pos=(startx, starty, 0.22)),
-        surface=gs.options.surfaces.Plastic(color=(0, 1.0, 1.0)),
-    )
-    
+    Args:
+        spec: layout as read from a .json file, or generated (see procedural_scenes)
+        name: name of the layout
+        base_dir: directory relative "init_file" paths are resolved against
 
-    franka_raw = scene.add_entity(gs.morphs.MJCF(file="xml/franka_emika_panda/panda.xml"))
-    franka = RobotAdapter(franka_raw, scene)
-    scene.build()
+    Returns:
+        dict with read-only numpy arrays
+    """
+    blocks = spec["blocks"]
+    n_blocks = len(blocks["names"])
+    layout = {
+        "name": name,
+        "camera_pos": tuple(spec.get("camera", {}).get("pos", (3, -1, 1.5))),
+        "camera_lookat": tuple(spec.get("camera", {}).get("lookat", (0.0, 0.0, 0.5))),
+        "block_size": float(spec.get("block_size", 0.04)),
+        "block_names": tuple(blocks["names"]),
+        "block_anchors": _readonly(blocks["anchors"], (n_blocks, 3)),
+        "block_colors": _readonly(blocks["colors"], (n_blocks, 3)),
+        "block_noise": _readonly(blocks.get("noise", 0.0), (n_blocks,)),
+        "block_group_noise": float(blocks.get("group_noise", 0.0)),
+        "goal": tuple(parse_facts(spec.get("goal", ""))),
+        "slot_names": (),
+        "slot_origin": _readonly((0.0, 0.0, 0.0)),
+        "slot_noise": 0.0,
+        "slot_offsets": _readonly(np.zeros((0, 3))),
+        "slot_facts": (),
+    }
+    slots = spec.get("slots")
+    if slots is not None:
+        layout["slot_names"] = tuple(slots["names"])
+        layout["slot_origin"] = _readonly(slots["origin"])
+        layout["slot_noise"] = float(slots.get("noise", 0.0))
+        layout["slot_offsets"] = _readonly(slots["offsets"], (len(slots["names"]), 3))
+        relations = slots.get("relations", "")
+        if "init_file" in slots:
+            with open(os.path.join(base_dir, slots["init_file"]), "r", encoding="utf-8") as f:
+                relations = f.read()
+        layout["slot_facts"] = tuple(parse_facts(relations))
+    return layout
+
+
+def sample_layout(layout: Dict[str, Any], n_samples: int = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Draw random block and slot positions around the layout's anchors.
+
+    Args:
+        layout: result of load_layout
+        n_samples: number of independent samples (e.g. one per env), None for a single one
 
-    franka.set_qpos(np.array([0.0, -0.5, -0.2, -1.0, 0.0, 1.00, 0.5, 0.02, 0.02]))
+    Returns:
+        block positions (n_blocks, 3) and slot positions (n_slots, 3), with a leading
+        n_samples dimension if n_samples is given
+    """
+    n = 1 if n_samples is None else n_samples
+    n_blocks = len(layout["block_names"])
 
-    _elevate_robot_base(franka)
+    block_pos = np.repeat(layout["block_anchors"][None], n, axis=0)
+    block_pos[..., :2] += np.random.uniform(-1.0, 1.0, (n, n_blocks, 2)) * layout["block_noise"][None, :, None]
+    block_pos[..., :2] += np.random.uniform(-1.0, 1.0, (n, 1, 2)) * layout["block_group_noise"]
 
-    blocks_state: Dict[str, Any] = {"r": cubeR, "g": cubeG, "b": cubeB, "y": cubeY, "m": cubeM, "c": cubeC}
+    origin = np.repeat(layout["slot_origin"][None], n, axis=0)
+    origin[:, :2] += np.random.uniform(-1.0, 1.0, (n, 2)) * layout["slot_noise"]
+    slot_pos = origin[:, None, :] + layout["slot_offsets"][None]
 
-    return scene, franka, blocks_state
+    if n_samples is None:
+        return block_pos[0], slot_pos[0]
+    return block_pos, slot_pos
 
 
+@profiler.timed("scene.build")
+def build_scene_from_layout(layout, headless: bool = False, block_positions: np.ndarray = None,
+                            slot_positions: np.ndarray = None, n_envs: int = 0) -> Tuple[Any, Any, Dict[str, Any], Dict[str, Any]]:
+    """Build a scene with the blocks of a layout.
 
-def create_scene_special_1() -> Tuple[Any, Any, Dict[str, Any],  Dict[str, Any]]:
-    """Create the default demo scene (layout 1) but for the 1st special design
+    Args:
+        layout: layout name/path (see load_layout) or an already loaded layout
+        headless: no viewer/rendering, for throughput runs (see _build_base_scene)
+        block_positions: optional (n_blocks, 3) positions, sampled from the layout otherwise
+            ((n_envs, n_blocks, 3) for batched scenes)
+        slot_positions: optional (n_slots, 3) positions, sampled from the layout otherwise
+            ((n_envs, n_slots, 3) for batched scenes)
+        n_envs: number of parallel envs to build (0 for a single env)
 
     Returns:
-        scene, franka_adapter, blocks_state, slots_state
+        scene, franka_adapter, blocks_state, slots_state (empty if the layout has no slots;
+        slot positions are (n_envs, 3) arrays for batched scenes)
     """
-    scene = _build_base_scene()
+    if isinstance(layout, str):
+        layout = load_layout(layout)
+    sampled_blocks, sampled_slots = sample_layout(layout, n_envs if n_envs > 0 else None)
+    block_positions = sampled_blocks if block_positions is None else np.asarray(block_positions, dtype=float)
+    slot_positions = sampled_slots if slot_positions is None else np.asarray(slot_positions, dtype=float)
+
+    scene = _build_base_scene(camera_pos=layout["camera_pos"], camera_lookat=layout["camera_lookat"], headless=headless)
 
     # basic geometry
     plane = scene.add_entity(gs.morphs.Plane())
-    # add some random noise up to 5 cm in x/y
-
-    # Define random position for blocks
-    # posR = ((0.65, 0.0, 0.02))
-    posR = _rand_xy((0.65, 0.0, 0.02))
-    posG = _rand_xy((0.65, 0.2, 0.02))
-    posB = _rand_xy((0.65, -0.2, 0.02))
-    posY = _rand_xy((0.45, 0.0, 0.02))
-    posM = _rand_xy((0.45, 0.2, 0.02))
-    posC = _rand_xy((0.45, -0.2, 0.02))
-
-    cubeR = scene.add_entity(
-        gs.morphs.Box(size=(0.04, 0.04, 0.04), pos= posR),
-        surface=gs.options.surfaces.Plastic(color=(1.0, 0.0, 0.0)),
-    )
-    cubeG = scene.add_entity(
-        gs.morphs.Box(size=(0.04, 0.04, 0.04), pos= posG),
-        surface=gs.options.surfaces.Plastic(color=(0.0, 1.0, 0.0)),
-    )
-    cubeB = scene.add_entity(
-        gs.morphs.Box(size=(0.04, 0.04, 0.04), pos= posB),
-        surface=gs.options.surfaces.Plastic(color=(0.0, 0.0, 1.0)),
-    )
-    cubeY = scene.add_entity(
-        gs.morphs.Box(size=(0.04, 0.04, 0.04), pos=posY),
-        surface=gs.options.surfaces.Plastic(color=(1.0, 1.0, 0.0)),
-    )
-    cubeM = scene.add_entity(
-        gs.morphs.Box(size=(0.04, 0.04, 0.04), pos=posM),
-        surface=gs.options.surfaces.Plastic(color=(1.0, 0, 1.0)),
-    )
 
-    cubeC = scene.add_entity(
-        gs.morphs.Box(size=(0.04, 0.04, 0.04), pos=posC),
-        surface=gs.options.surfaces.Plastic(color=(0, 1.0, 1.0)),
-    )
+    # entities are added at env 0's positions, the other envs are set after build
+    first_positions = block_positions[0] if n_envs > 0 else block_positions
+    size = (layout["block_size"],) * 3
+    blocks_state: Dict[str, Any] = {}
+    for name, pos, color in zip(layout["block_names"], first_positions.tolist(), layout["block_colors"].tolist()):
+        blocks_state[name] = scene.add_entity(
+            gs.morphs.Box(size=size, pos=tuple(pos)),
+            surface=gs.options.surfaces.Plastic(color=tuple(color)),
+        )
 
-    # Define position of slots
-    # Define all slots based on random first position
-    # slot1_pos = ((0.65, 0.0, 0.02))
-    slot1_pos = _rand_xy((0.45, -0.25, 0.02))
-    slot2_pos = add(slot1_pos, (0.04, 0.0, 0.0))
-    slot3_pos = add(slot1_pos, (0.0, 0.04, 0.0))
-    slot4_pos = add(slot2_pos, (0.04, 0.04, 0.0))
-    slot5_pos = add(slot3_pos, (0.04, 0.04, 0.0))
-    slot6_pos = add(slot5_pos, (0.04, 0.0, 0.0))
-    
-    # slot1 = scene.add_entity(
-    #     gs.morphs.Box(size=(0.04, 0.04, 0.00), pos= slot1_pos),
-    #     surface=gs.options.surfaces.Plastic(color=(0.0, 0.0, 0.0)),
-    # )
-    # slot2 = scene.add_entity(
-    #     gs.morphs.Box(size=(0.04, 0.04, 0.00), pos= slot2_pos),
-    #     surface=gs.options.surfaces.Plastic(color=(0.0, 0.0, 0.0)),
-    # )
-    # slot3 = scene.add_entity(
-    #     gs.morphs.Box(size=(0.04, 0.04, 0.00), pos= slot3_pos),
-    #     surface=gs.options.surfaces.Plastic(color=(0.0, 0.0, 0.0)),
-    # )
-    # slot4 = scene.add_entity(
-    #     gs.morphs.Box(size=(0.04, 0.04, 0.00), pos=slot4_pos),
-    #     surface=gs.options.surfaces.Plastic(color=(0.0, 0.0, 0.0)),
-    # )
-    # slot5 = scene.add_entity(
-    #     gs.morphs.Box(size=(0.04, 0.04, 0.00), pos=slot5_pos),
-    #     surface=gs.options.surfaces.Plastic(color=(0.0, 0, 0.0)),
-    # )
-    # slot6 = scene.add_entity(
-    #     gs.morphs.Box(size=(0.04, 0.04, 0.00), pos=slot6_pos),
-    #     surface=gs.options.surfaces.Plastic(color=(0, 0.0, 0.0)),
-    # )
-
-    # Define position of Franka
     franka_raw = scene.add_entity(gs.morphs.MJCF(file="xml/franka_emika_panda/panda.xml"))
     franka = RobotAdapter(franka_raw, scene)
 
     # build scene (construct physics/visuals)
-    scene.build()
+    if n_envs > 0:
+        scene.build(n_envs=n_envs)
+        # every env gets its own sampled layout
+        for i, block in enumerate(blocks_state.values()):
+            block.set_pos(block_positions[:, i])
+    else:
+        scene.build()
 
     # initial robot pose (7 arm joints + 2 gripper fingers)
-    franka.set_qpos(np.array([0.0, -0.5, -0.2, -1.0, 0.0, 1.00, 0.5, 0.02, 0.02]))
+    qpos = np.array(DEFAULT_QPOS)
+    franka.set_qpos(np.tile(qpos, (n_envs, 1)) if n_envs > 0 else qpos)
 
     # slightly raise robot base to avoid initial collisions
     _elevate_robot_base(franka)
 
-    blocks_state: Dict[str, Any] = {"r": cubeR, "g": cubeG, "b": cubeB, "y": cubeY, "m": cubeM, "c": cubeC}
-
-    slots_state: Dict[str, Any] = {"s1": slot1_pos, "s3": slot2_pos, "s2": slot3_pos, "s4": slot4_pos, "s5": slot5_pos, "s6": slot6_pos}
+    if n_envs > 0:
+        slots_state: Dict[str, Any] = {name: slot_positions[:, i] for i, name in enumerate(layout["slot_names"])}
+    else:
+        slots_state = {name: tuple(pos) for name, pos in zip(layout["slot_names"], slot_positions.tolist())}
 
     return scene, franka, blocks_state, slots_state
 
-def create_scene_special_2() -> Tuple[Any, Any, Dict[str, Any],  Dict[str, Any]]:
-    """Create the default demo scene (layout 1) but for the 2nd special design
+def create_scene_6blocks(headless: bool = False) -> Tuple[Any, Any, Dict[str, Any]]:
+    """Create the default demo scene (layout 1, layouts/6blocks.json).
+
+    Args:
+        headless: no viewer/rendering, for throughput runs (see _build_base_scene)
 
     Returns:
-        scene, franka_adapter, blocks_state, slots_state
+        scene, franka_adapter, blocks_state
     """
-    scene = _build_base_scene()
+    scene, franka, blocks_state, _ = build_scene_from_layout("6blocks", headless=headless)
+    return scene, franka, blocks_state
 
-    # basic geometry
-    plane = scene.add_entity(gs.morphs.Plane())
-    # add some random noise up to 5 cm in x/y
-
-    # Define random position for blocks
-    posR = _rand_xy((0.65, 0.0, 0.02))
-    posG = _rand_xy((0.65, 0.2, 0.02))
-    posB = _rand_xy((0.6, 0.37, 0.02))
-    posY = _rand_xy((0.45, 0.0, 0.02))
-    posM = _rand_xy((0.45, 0.2, 0.02))
-    posC = _rand_xy((0.45, 0.4, 0.02))
-    # Add 4 additional blocks for second and third layer
-    posO = _rand_xy((0.45, -0.2, 0.02))
-    posP = _rand_xy((0.45, -0.4, 0.02))
-    posBr = _rand_xy((0.65, -0.2, 0.02))
-    posW = _rand_xy((0.6, -0.37, 0.02))
-
-    cubeR = scene.add_entity(
-        gs.morphs.Box(size=(0.04, 0.04, 0.04), pos= posR),
-        surface=gs.options.surfaces.Plastic(color=(1.0, 0.0, 0.0)),
-    )
-    cubeG = scene.add_entity(
-        gs.morphs.Box(size=(0.04, 0.04, 0.04), pos= posG),
-        surface=gs.options.surfaces.Plastic(color=(0.0, 1.0, 0.0)),
-    )
-    cubeB = scene.add_entity(
-        gs.morphs.Box(size=(0.04, 0.04, 0.04), pos= posB),
-        surface=gs.options.surfaces.Plastic(color=(0.0, 0.0, 1.0)),
-    )
-    cubeY = scene.add_entity(
-        gs.morphs.Box(size=(0.04, 0.04, 0.04), pos=posY),
-        surface=gs.options.surfaces.Plastic(color=(1.0, 1.0, 0.0)),
-    )
-    cubeM = scene.add_entity(
-        gs.morphs.Box(size=(0.04, 0.04, 0.04), pos=posM),
-        surface=gs.options.surfaces.Plastic(color=(1.0, 0, 1.0)),
-    )
-    cubeC = scene.add_entity(
-        gs.morphs.Box(size=(0.04, 0.04, 0.04), pos=posC),
-        surface=gs.options.surfaces.Plastic(color=(0.0, 1.0, 1.0)),
-    )
+def create_scene_8blocks(headless: bool = False) -> Tuple[Any, Any, Dict[str, Any]]:
+    """Create the default demo scene (Bonus layout, layouts/8blocks.json)
 
-    cubeO = scene.add_entity(
-        gs.morphs.Box(size=(0.04, 0.04, 0.04), pos= posO),
-        surface=gs.options.surfaces.Plastic(color=(1.0, 0.647, 0.0)),
-    )
-    cubeP = scene.add_entity(
-        gs.morphs.Box(size=(0.04, 0.04, 0.04), pos= posP),
-        surface=gs.options.surfaces.Plastic(color=(1.0, 0.753, 0.796)),
-    )
-    cubeBr = scene.add_entity(
-        gs.morphs.Box(size=(0.04, 0.04, 0.04), pos= posBr),
-        surface=gs.options.surfaces.Plastic(color=(0.647, 0.165, 0.165)),
-    )
-    cubeW = scene.add_entity(
-        gs.morphs.Box(size=(0.04, 0.04, 0.04), pos= posW),
-        surface=gs.options.surfaces.Plastic(color=(1.0, 1.0, 1.0)),
-    )
+    Args:
+        headless: no viewer/rendering, for throughput runs (see _build_base_scene)
 
-    # Define position of slots
-    # Define all slots based on random first position
-    # First layer
-    slot11_pos = _rand_xy((0.45, -0.25, 0.02))
-    slot12_pos = add(slot11_pos, (0.04, 0.0, 0.0))
-    slot13_pos = add(slot11_pos, (0.0, 0.04, 0.0))
-    slot14_pos = add(slot11_pos, (0.04, 0.04, 0.0))
-    slot15_pos = add(slot12_pos, (0.04, 0.00, 0.0))
-    slot16_pos = add(slot13_pos, (0.00, 0.04, 0.0))
-    # Second layer
-    slot21_pos = add(slot11_pos, (0.0, 0.0, 0.04))
-    slot22_pos = add(slot12_pos, (0.0, 0.0, 0.04))
-    slot23_pos = add(slot13_pos, (0.0, 0.0, 0.04))
-    # Third layer
-    slot31_pos = add(slot21_pos, (0.0, 0.0, 0.04))
-
-    # # First layer
-    # slot11 = scene.add_entity(
-    #     gs.morphs.Box(size=(0.04, 0.04, 0.00), pos= slot11_pos),
-    #     surface=gs.options.surfaces.Plastic(color=(0.0, 0.0, 0.0)),
-    # )
-    # slot12 = scene.add_entity(
-    #     gs.morphs.Box(size=(0.04, 0.04, 0.00), pos= slot12_pos),
-    #     surface=gs.options.surfaces.Plastic(color=(0.0, 0.0, 0.0)),
-    # )
-    # slot13 = scene.add_entity(
-    #     gs.morphs.Box(size=(0.04, 0.04, 0.00), pos= slot13_pos),
-    #     surface=gs.options.surfaces.Plastic(color=(0.0, 0.0, 0.0)),
-    # )
-    # slot14 = scene.add_entity(
-    #     gs.morphs.Box(size=(0.04, 0.04, 0.00), pos=slot14_pos),
-    #     surface=gs.options.surfaces.Plastic(color=(0.0, 0.0, 0.0)),
-    # )
-    # slot15 = scene.add_entity(
-    #     gs.morphs.Box(size=(0.04, 0.04, 0.00), pos=slot15_pos),
-    #     surface=gs.options.surfaces.Plastic(color=(0.0, 0, 0.0)),
-    # )
-    # slot16 = scene.add_entity(
-    #     gs.morphs.Box(size=(0.04, 0.04, 0.00), pos=slot16_pos),
-    #     surface=gs.options.surfaces.Plastic(color=(0, 0.0, 0.0)),
-    # )
-    # # Second layer
-    # slot21 = scene.add_entity(
-    #     gs.morphs.Box(size=(0.04, 0.04, 0.00), pos= slot21_pos),
-    #     surface=gs.options.surfaces.Plastic(color=(1.0, 1.0, 1.0)),
-    # )
-    # slot22 = scene.add_entity(
-    #     gs.morphs.Box(size=(0.04, 0.04, 0.00), pos= slot22_pos),
-    #     surface=gs.options.surfaces.Plastic(color=(1.0, 1.0, 1.0)),
-    # )
-    # slot23 = scene.add_entity(
-    #     gs.morphs.Box(size=(0.04, 0.04, 0.00), pos= slot23_pos),
-    #     surface=gs.options.surfaces.Plastic(color=(1.0, 1.0, 1.0)),
-    # )
-    # # Third layer
-    # slot31 = scene.add_entity(
-    #     gs.morphs.Box(size=(0.04, 0.04, 0.00), pos= slot31_pos),
-    #     surface=gs.options.surfaces.Plastic(color=(0.0, 0.0, 0.0)),
-    # )
-
-    # Define position of Franka
-    franka_raw = scene.add_entity(gs.morphs.MJCF(file="xml/franka_emika_panda/panda.xml"))
-    franka = RobotAdapter(franka_raw, scene)
+    Returns:
+        scene, franka_adapter, blocks_state
+    """
+    scene, franka, blocks_state, _ = build_scene_from_layout("8blocks", headless=headless)
+    return scene, franka, blocks_state
 
-    # build scene (construct physics/visuals)
-    scene.build()
 
-    # initial robot pose (7 arm joints + 2 gripper fingers)
-    franka.set_qpos(np.array([0.0, -0.5, -0.2, -1.0, 0.0, 1.00, 0.5, 0.02, 0.02]))
+def create_scene_stacked(headless: bool = False) -> Tuple[Any, Any, Dict[str, Any]]:
+    """Create an alternative demo scene (layout 2) with cube positions. one on top of the other (layouts/stacked.json)."""
+    scene, franka, blocks_state, _ = build_scene_from_layout("stacked", headless=headless)
+    return scene, franka, blocks_state
 
-    # slightly raise robot base to avoid initial collisions
-    _elevate_robot_base(franka)
 
-    blocks_state: Dict[str, Any] = {"r": cubeR, "g": cubeG, "b": cubeB, "y": cubeY, "m": cubeM, "c": cubeC,
-                                    "o": cubeO, "w": cubeW, "x": cubeBr, "p": cubeP}
 
-    slots_state: Dict[str, Any] = {"s3": slot11_pos, "s5": slot12_pos, "s2": slot13_pos, "s4": slot14_pos, "s6": slot15_pos, "s1": slot16_pos,
-                                   "s8": slot21_pos, "s9": slot22_pos, "s7": slot23_pos, "s10": slot31_pos}
+def create_scene_special_1(headless: bool = False) -> Tuple[Any, Any, Dict[str, Any],  Dict[str, Any]]:
+    """Create the default demo scene (layout 1) but for the 1st special design (layouts/special_1.json)
+
+    Args:
+        headless: no viewer/rendering, for throughput runs (see _build_base_scene)
+
+    Returns:
+        scene, franka_adapter, blocks_state, slots_state
+    """
+    return build_scene_from_layout("special_1", headless=headless)
+
+def create_scene_special_2(headless: bool = False) -> Tuple[Any, Any, Dict[str, Any],  Dict[str, Any]]:
+    """Create the default demo scene (layout 1) but for the 2nd special design (layouts/special_2.json)
 
-    return scene, franka, blocks_state, slots_state
\ No newline at end of file
+    Args:
+        headless: no viewer/rendering, for throughput runs (see _build_base_scene)
+
+    Returns:
+        scene, franka_adapter, blocks_state, slots_state
+    """
+    return build_scene_from_layout("special_2", headless=headless)
+
+class SceneSnapshot:
+    """Rigid-body state of a built scene (robot qpos/qvel, block poses).
+
+    Restoring writes the state back into the same scene, so repeated trials
+    don't pay for scene.build(), MJCF loading and adding the blocks again.
+
+    Usage:
+        scene, franka, blocks_state = create_scene_6blocks()
+        snapshot = SceneSnapshot.capture(franka, blocks_state)
+        ...
+        snapshot.restore(franka, blocks_state, noise=0.05)  # new trial, blocks jittered
+    """
+
+    def __init__(self, qpos, qvel, block_pos: Dict[str, np.ndarray], block_quat: Dict[str, np.ndarray]):
+        self.qpos = qpos
+        self.qvel = qvel
+        self.block_pos = block_pos
+        self.block_quat = block_quat
+
+    @classmethod
+    def capture(cls, franka: Any, blocks_state: Dict[str, Any]) -> "SceneSnapshot":
+        """Capture the current state of the robot and all blocks."""
+        return cls(
+            qpos=np.array(tensor_to_array(franka.get_qpos()), dtype=float),
+            qvel=np.array(tensor_to_array(franka.get_dofs_velocity()), dtype=float),
+            block_pos={name: np.array(tensor_to_array(block.get_pos()), dtype=float) for name, block in blocks_state.items()},
+            block_quat={name: np.array(tensor_to_array(block.get_quat()), dtype=float) for name, block in blocks_state.items()},
+        )
+
+    def restore(self, franka: Any, blocks_state: Dict[str, Any], block_positions: Dict[str, Any] = None,
+                noise: float = 0.0) -> Dict[str, np.ndarray]:
+        """Write the captured state back into the scene in place.
+
+        Args:
+            franka: robot of the scene the snapshot was captured from
+            blocks_state: blocks of that scene
+            block_positions: optional new positions for (some of) the blocks
+            noise: random x/y offset (up to `noise` m, like _rand_xy) added to each block's position
+
+        Returns:
+            the block positions that were set
+        """
+        franka.set_qpos(self.qpos)
+        franka.set_dofs_velocity(self.qvel)
+        # hold the restored pose, otherwise the PD controllers drive back to the last targets
+        franka.control_dofs_position(self.qpos)
+
+        positions = {}
+        for name, block in blocks_state.items():
+            pos = np.array(self.block_pos[name], dtype=float)
+            if block_positions is not None and name in block_positions:
+                pos = np.array(block_positions[name], dtype=float)
+            if noise > 0.0:
+                # per env in batched scenes
+                pos[..., :2] += np.random.uniform(-noise, noise, size=pos[..., :2].shape)
+            block.set_pos(pos)
+            block.set_quat(self.block_quat[name])
+            block.zero_all_dofs_velocity()
+            positions[name] = pos
+        return positions
+
+
+def create_scene_batched(layout: str, n_envs: int, headless: bool = True) -> Tuple[Any, Any, Dict[str, Any], np.ndarray]:
+    """Create one scene with `n_envs` parallel envs, each with its own random block layout.
+
+    Args:
+        layout: layout name/path (see load_layout), e.g. "6blocks", "8blocks" or "stacked"
+        n_envs: number of parallel envs
+        headless: no viewer/rendering (see _build_base_scene)
+
+    Returns:
+        scene, franka_adapter, blocks_state, block_positions (n_envs, n_blocks, 3) as sampled
+    """
+    block_positions, slot_positions = sample_layout(load_layout(layout), n_envs)
+    scene, franka, blocks_state, _ = build_scene_from_layout(
+        layout, headless=headless, block_positions=block_positions, slot_positions=slot_positions, n_envs=n_envs,
+    )
+    return scene, franka, blocks_state, block_positions
@@ -0,0 +1,107 @@
+"""Step the simulation until the scene has come to rest.
+
+The motion primitives used to wait a fixed number of steps (25, 50 or 100)
+after every motion, whether the robot and blocks had already stopped or
+not. step_until_settled steps until every watched quantity is within its
+tolerance, up to a step cap:
+
+    joints      error of the controlled dofs to their targets, and their velocity
+    blocks      linear velocity of the blocks
+    grasp       fingers in contact with the grasped block and no longer closing
+
+Usage:
+    n_steps = step_until_settled(scene, robot, qpos_target=qpos, dofs=np.arange(7),
+                                 blocks=list(blocks.values()), max_steps=50)
+"""
+from typing import Any, Optional, Sequence
+
+import numpy as np
+import genesis as gs
+from genesis.utils.misc import tensor_to_array
+
+from profiling import profiler
+
+# default tolerances
+JOINT_TOL = 0.01        # rad
+JOINT_VEL_TOL = 0.05    # rad/s
+BLOCK_VEL_TOL = 0.005   # m/s
+FINGER_VEL_TOL = 0.005  # m/s
+FINGER_LINKS = ("left_finger", "right_finger")
+
+
+def _blocks_velocity(scene: Any, blocks: Sequence[Any]) -> np.ndarray:
+    """(N,) linear speed of every block, read in one call where possible."""
+    try:
+        # every block is a single-link entity (see symbolic_abstraction.get_block_positions)
+        vel = scene.rigid_solver.get_links_vel([block.link_start for block in blocks])
+    except AttributeError:
+        vel = [block.get_vel() for block in blocks]
+    vel = np.asarray([np.asarray(tensor_to_array(v), dtype=float) for v in vel]).reshape(len(blocks), 3)
+    return np.linalg.norm(vel, axis=1)
+
+
+def _fingers_touch(robot: Any, block: Any) -> bool:
+    """Both fingers are in contact with `block` (True if contacts can't be queried)."""
+    try:
+        contacts = robot.get_contacts(with_entity=block)
+    except (AttributeError, TypeError):
+        return True
+    links = set(np.asarray(tensor_to_array(contacts["link_a"])).ravel().tolist())
+    links |= set(np.asarray(tensor_to_array(contacts["link_b"])).ravel().tolist())
+    return all(robot.get_link(name).idx in links for name in FINGER_LINKS)
+
+
+def step_until_settled(scene: Any, robot: Any = None, qpos_target=None, dofs=None, blocks: Sequence[Any] = (),
+                       grasped: Optional[Any] = None, finger_dofs=None, min_steps: int = 1, max_steps: int = 100,
+                       joint_tol: float = JOINT_TOL, joint_vel_tol: float = JOINT_VEL_TOL,
+                       block_vel_tol: float = BLOCK_VEL_TOL, finger_vel_tol: float = FINGER_VEL_TOL) -> int:
+    """Step `scene` until it is settled, at least `min_steps` and at most `max_steps` times.
+
+    Args:
+        scene: the scene to step
+        robot: robot whose joints are watched (optional)
+        qpos_target: targets of `dofs`; None to only wait for the joints to stop
+        dofs: dofs of `robot` to watch, all by default
+        blocks: entities that have to come to rest
+        grasped: block being grasped; the fingers have to touch it and stop closing
+        finger_dofs: finger dofs of `robot` (needed with `grasped`)
+        min_steps, max_steps: bounds of the number of steps
+        joint_tol, joint_vel_tol, block_vel_tol, finger_vel_tol: tolerances
+
+    Returns:
+        number of steps taken
+    """
+    dofs = None if dofs is None else np.asarray(dofs)
+    target = None if qpos_target is None else np.asarray(tensor_to_array(qpos_target), dtype=float)
+    blocks = list(blocks)
+
+    def settled() -> bool:
+        if robot is not None:
+            qpos = np.asarray(tensor_to_array(robot.get_qpos()), dtype=float)
+            qvel_all = np.asarray(tensor_to_array(robot.get_dofs_velocity()), dtype=float)
+            qvel = qvel_all
+            if dofs is not None:
+                qpos, qvel = qpos[dofs], qvel_all[dofs]
+            if target is not None and np.abs(qpos - target).max() > joint_tol:
+                return False
+            if np.abs(qvel).max() > joint_vel_tol:
+                return False
+            if grasped is not None:
+                if np.abs(qvel_all[finger_dofs]).max() > finger_vel_tol or not _fingers_touch(robot, grasped):
+                    return False
+        if blocks and _blocks_velocity(scene, blocks).max() > block_vel_tol:
+            return False
+        return True
+
+    n_steps = 0
+    with profiler.span("scene.step", max_steps=max_steps):
+        while n_steps < max_steps:
+            if n_steps >= min_steps and settled():
+                break
+            scene.step()
+            n_steps += 1
+    profiler.count("sim_steps", n_steps)
+    if n_steps >= max_steps:
+        profiler.count("settle_timeouts")
+        gs.logger.debug(f"Scene not settled after {max_steps} steps.")
+    return n_steps
@@ -0,0 +1,185 @@
+"""Compact PDDL encoding of the special structures (goals 4 and 5).
+
+custom_domain.pddl describes the slot geometry with static relations
+(north/east/northeast/above, no-*) and enumerates every support pattern as
+its own action (place-north ... place-above-16). Each of those actions is
+parameterized over the block being placed, a reference block and up to six
+slots, so grounding goes over block x block x slot^k combinations.
+
+Here the static relations of one structure (Init_1.txt / Init_2.txt) are
+resolved once in Python and compiled into a domain with the slots as
+constants and one action per way of filling a slot:
+
+    (fill-first-s1 ?b)      first block of the structure, into a table slot
+    (fill-s2-next-s1 ?b)    table slot s2, next to the filled slot s1
+    (fill-s7 ?b)            upper slot s7, once its whole support is filled
+
+Every action only has the block as parameter. The dynamic predicates are
+the same as in custom_domain.pddl, so problems grounded by
+symbolic_abstraction can be planned with either domain.
+
+Usage:
+    encoding = SlotEncoding.from_init_file("Init_1.txt")
+    task_planner = encoding.task_planner(search="gbf")
+    plan = task_planner.plan_problem(problem)
+    slot = encoding.slot_of_action(plan[0])
+"""
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from task_planning import Action, Fact, TaskPlanner, parse_facts
+
+# direction -> (relation, whether the neighbour is the first argument of the relation)
+# e.g. (north s2 s1) means s2 is the north neighbour of s1
+LATERAL_RELATIONS = {
+    "north": ("north", True),
+    "south": ("north", False),
+    "east": ("east", True),
+    "west": ("east", False),
+    "northeast": ("northeast", True),
+    "southwest": ("northeast", False),
+}
+# directions a block resting on a slot has to be supported from
+SUPPORT_DIRECTIONS = ("north", "east", "south", "west")
+
+_FILL_RE = re.compile(r"^fill-(?:first-)?(?P<slot>[^-]+)")
+
+
+class SlotEncoding:
+    def __init__(self, static_facts: Iterable[Fact], name: str = "SLOTS"):
+        """Resolve the static slot relations of one structure.
+
+        Args:
+            static_facts: slot relations, e.g. parse_facts(open("Init_1.txt").read())
+            name: PDDL domain name
+        """
+        self.name = name
+        self.static_facts = frozenset(tuple(fact) for fact in static_facts)
+
+        slots = set()
+        for fact in self.static_facts:
+            slots.update(fact[1:])
+        self.slots: Tuple[str, ...] = tuple(sorted(slots, key=_slot_sort_key))
+        self.table_slots: Tuple[str, ...] = tuple(s for s in self.slots if ("ontable", s) in self.static_facts)
+
+        # neighbours[s][direction] = slot next to s in that direction
+        self.neighbours: Dict[str, Dict[str, str]] = {s: {} for s in self.slots}
+        for direction, (relation, neighbour_first) in LATERAL_RELATIONS.items():
+            for fact in self.static_facts:
+                if fact[0] != relation:
+                    continue
+                neighbour, slot = (fact[1], fact[2]) if neighbour_first else (fact[2], fact[1])
+                self.neighbours[slot][direction] = neighbour
+
+        # lateral placements: table slot -> table slots it can be placed next to
+        self.lateral: Dict[str, Tuple[str, ...]] = {
+            s: tuple(sorted(set(self.neighbours[s].values()) & set(self.table_slots), key=_slot_sort_key))
+            for s in self.table_slots
+        }
+
+        # upper slot -> slots that must all be filled before it can be
+        self.supports: Dict[str, Tuple[str, ...]] = {}
+        for fact in self.static_facts:
+            if fact[0] != "above":
+                continue
+            slot, below = fact[1], fact[2]
+            support = self._support_of(below)
+            if support is not None:
+                self.supports[slot] = support
+
+    @classmethod
+    def from_init_file(cls, path: str, name: Optional[str] = None) -> "SlotEncoding":
+        with open(path, "r", encoding="utf-8") as file:
+            static_facts = parse_facts(file.read())
+        if name is None:
+            name = "SLOTS-" + re.sub(r"\W+", "-", path.rsplit(".", 1)[0]).upper()
+        return cls(static_facts, name)
+
+    def _support_of(self, below: str) -> Optional[Tuple[str, ...]]:
+        # same patterns as place-above-1..16: every side of the slot below either
+        # has a neighbour, which must be filled, or is marked as an edge (no-*)
+        support = [below]
+        for direction in SUPPORT_DIRECTIONS:
+            neighbour = self.neighbours[below].get(direction)
+            if neighbour is not None:
+                support.append(neighbour)
+            elif ("no-" + direction, below) not in self.static_facts:
+                # neither: custom_domain.pddl has no action for this, keep it unreachable too
+                return None
+        return tuple(support)
+
+    def actions(self) -> List[Tuple[str, Tuple[str, ...], Optional[str]]]:
+        """All compiled place actions as (name, slots that must be filled, extra precondition)."""
+        actions = []
+        for s in self.table_slots:
+            actions.append((f"fill-first-{s}", (), "(gridempty)"))
+        for s in self.table_slots:
+            for ref in self.lateral[s]:
+                actions.append((f"fill-{s}-next-{ref}", (ref,), None))
+        for s in sorted(self.supports, key=_slot_sort_key):
+            actions.append((f"fill-{s}", self.supports[s], None))
+        return actions
+
+    def domain_pddl(self) -> str:
+        """PDDL text of the compiled domain."""
+        lines = [
+            f"(define (domain {self.name})",
+            "    (:requirements :strips :typing)",
+            "    (:types block slot)",
+            f"    (:constants {' '.join(self.slots)} - slot)",
+            "    (:predicates",
+            "            (handempty)",
+            "            (gridempty)",
+            "            (holding ?x - block)",
+            "            (unused ?x - block)",
+            "            (empty ?x - slot)",
+            "            (filled ?x - slot)",
+            "            (in ?b - block ?s - slot)",
+            "            )",
+            "",
+            "    (:action pick-up",
+            "        :parameters (?x - block)",
+            "        :precondition (and (handempty) (unused ?x))",
+            "        :effect (and (not (handempty)) (holding ?x))",
+            "    )",
+        ]
+        for name, filled, extra in self.actions():
+            slot = _FILL_RE.match(name).group("slot")
+            preconditions = ["(holding ?b)", "(unused ?b)", f"(empty {slot})"]
+            preconditions += [f"(filled {ref})" for ref in filled]
+            if extra is not None:
+                preconditions.append(extra)
+            effects = ["(not (holding ?b))", "(handempty)", "(not (unused ?b))",
+                       f"(not (empty {slot}))", f"(filled {slot})", f"(in ?b {slot})"]
+            if extra == "(gridempty)":
+                effects.append("(not (gridempty))")
+            lines += [
+                "",
+                f"    (:action {name}",
+                "        :parameters (?b - block)",
+                f"        :precondition (and {' '.join(preconditions)})",
+                f"        :effect (and {' '.join(effects)})",
+                "    )",
+            ]
+        lines.append(")")
+        return "\n".join(lines) + "\n"
+
+    def write_domain(self, path: str) -> None:
+        with open(path, "w") as f:
+            f.write(self.domain_pddl())
+
+    def task_planner(self, search: str = "gbf", plan_cache=None) -> TaskPlanner:
+        """TaskPlanner over the compiled domain (no file is written)."""
+        return TaskPlanner(self.name, search=search, plan_cache=plan_cache, domain_text=self.domain_pddl())
+
+    @staticmethod
+    def slot_of_action(action: Action) -> Optional[str]:
+        """Slot a compiled place action fills, e.g. ("fill-s2-next-s1", "r") -> "s2"."""
+        match = _FILL_RE.match(action[0])
+        return match.group("slot") if match else None
+
+
+def _slot_sort_key(slot: str):
+    # s2 before s10
+    digits = re.sub(r"\D", "", slot)
+    return (int(digits) if digits else 0, slot)
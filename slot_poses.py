@@ -0,0 +1,106 @@
+"""Precomputed placing poses of the special structures (goals 4 and 5).
+
+The slots of a structure are fixed once the scene is built, and so are the
+hand poses the placing primitives move through: above the slot, down into
+it, and back up after releasing. place_in_slot and place_direction used to
+redo the Euler math, the offsets and the IK for every placement. Here they
+are computed once from the slots_state of the scene:
+
+    (slot, None)         placing into `slot` (place_in_slot)
+    (slot, direction)    placing next to the block in `slot` (place_direction),
+                         only for directions that lead onto another slot
+
+Every entry holds the pre-place, place and retreat joint configurations and
+the descent from pre-place to place, collision checked in the scene as it
+is when the table is built (MotionPrimitives builds it on the first
+placement). Approach paths are not precomputed: the free-space approach to
+the pre-place configuration starts wherever the block was picked up, so it
+is still planned (or prefetched, see pipelined_execution) at run time.
+
+Usage:
+    table = SlotPoseTable(motion, slots_state)
+    entry = table.lookup("s2")                  # None if not precomputed
+    entry = table.lookup(table.slot_at(block.get_pos()), "north")
+"""
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from genesis.utils.misc import tensor_to_array
+
+from profiling import profiler
+
+DIRECTIONS = ("north", "south", "east", "west", "northeast", "northwest", "southeast", "southwest")
+# hand above a slot at the start of a placement, descent and retreat (see MotionPrimitives.place_in_slot)
+PRE_PLACE_Z = 0.22
+PLACE_DROP = 0.05
+RETREAT_RISE = 0.1
+PLACE_QUAT = np.array([0.0, 1.0, 0.0, 0.0])
+# orientation of a block placed by the hand, for the approach quaternion of place_direction
+PLACED_BLOCK_QUAT = np.array([1.0, 0.0, 0.0, 0.0])
+# max xy distance of a block (or placement target) to the slot it is in
+SLOT_TOL = 0.015
+GRIPPER_OPEN = 0.04
+
+
+class SlotPose:
+    """Joint configurations of one placement and the descent between the first two."""
+
+    def __init__(self, pre_place, place, retreat, descent: List[Any]):
+        self.pre_place = pre_place
+        self.place = place
+        self.retreat = retreat
+        # empty if the straight descent was not collision free
+        self.descent = descent
+
+
+class SlotPoseTable:
+    def __init__(self, motion: Any, slots_state: Dict[str, Any], directions=DIRECTIONS, descent_waypoints: int = 50):
+        """Solve the placing poses of every slot (and direction) of the structure.
+
+        Args:
+            motion: motion_primitives.MotionPrimitives of the scene, its robot's configuration seeds the IK
+            slots_state: slot name -> slot position (see scenes.build_scene_from_layout)
+            directions: directions of place_direction to precompute
+            descent_waypoints: waypoints of every descent path
+        """
+        self.motion = motion
+        self.slot_names: Tuple[str, ...] = tuple(slots_state)
+        self.slot_positions = np.array([np.asarray(tensor_to_array(slots_state[name]), dtype=float) for name in self.slot_names])
+        self.entries: Dict[Tuple[str, Optional[str]], SlotPose] = {}
+
+        with profiler.span("slot_poses.build", n_slots=len(self.slot_names)):
+            for slot, slot_pos in zip(self.slot_names, self.slot_positions):
+                pre_place_pos = slot_pos.copy()
+                pre_place_pos[2] += PRE_PLACE_Z
+                self.entries[(slot, None)] = self._solve(pre_place_pos, PLACE_QUAT, descent_waypoints)
+                for direction in directions:
+                    pre_place_pos, approach_quat = motion.prePlaceTargetAt(slot_pos, PLACED_BLOCK_QUAT, direction)
+                    # only directions onto a slot of the structure
+                    if self.slot_at(pre_place_pos) is None:
+                        continue
+                    self.entries[(slot, direction)] = self._solve(pre_place_pos, approach_quat, descent_waypoints)
+
+    def _solve(self, pre_place_pos: np.ndarray, approach_quat: np.ndarray, descent_waypoints: int) -> SlotPose:
+        place_pos = pre_place_pos.copy()
+        place_pos[2] -= PLACE_DROP
+        retreat_pos = place_pos.copy()
+        retreat_pos[2] += RETREAT_RISE
+        pre_place, place, retreat = self.motion.ik.solve([
+            (pre_place_pos, approach_quat), (place_pos, PLACE_QUAT), (retreat_pos, PLACE_QUAT)])
+        pre_place[-2:] = GRIPPER_OPEN
+        retreat[-2:] = GRIPPER_OPEN
+        descent = self.motion.planner.plan_straight_line(place, qpos_start=pre_place, num_waypoints=descent_waypoints)
+        return SlotPose(pre_place, place, retreat, descent)
+
+    def slot_at(self, pos, tol: float = SLOT_TOL) -> Optional[str]:
+        """Slot whose xy position is within `tol` of `pos`, None if there is none."""
+        if not len(self.slot_names):
+            return None
+        pos = np.asarray(tensor_to_array(pos), dtype=float)
+        dist = np.linalg.norm(self.slot_positions[:, :2] - pos[:2], axis=1)
+        i_slot = int(np.argmin(dist))
+        return self.slot_names[i_slot] if dist[i_slot] <= tol else None
+
+    def lookup(self, slot: Optional[str], direction: Optional[str] = None) -> Optional[SlotPose]:
+        """Precomputed poses of placing into `slot` (or next to it in `direction`), None if there are none."""
+        return self.entries.get((slot, direction))
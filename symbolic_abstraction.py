@@ -1,293 +1,176 @@
+import functools
 import numpy as np
+from genesis.utils.misc import tensor_to_array
+from profiling import profiler
 from robot_adapter import RobotAdapter
-from scipy.spatial.transform import Rotation as R
-
-# Generates the pddl for the original 3 goals
-def generate_pddl(scene, franka, BlocksState, goal_num):
-    """Generate a pddl file based on provided scene."""
-
-    # Get all blocks in single string, separated by a space 
-    blocks = " ".join(BlocksState.keys())
-
-    # Define all initial conditions of predicates (OG)
-    hand_empty =  ""
-    holding = ""
-    clear = ""
-    on_table = ""
-    on = ""
-
-    # Get pose of franka's end effector
+from symbolic_state import SymbolicProblem, SymbolicState, parse_facts
+
+# Goals of the original 3 tasks
+GOALS = {
+    1: "(on g b) (on r g) (on m c) (on y m)",
+    2: "(on r g) (on b r) (on y b) (on m y)",
+    3: "(on r g) (on b r) (on y b) (on m y) (on p m) (on o p)",
+}
+
+# Predicates each domain uses
+BLOCKS_PREDICATES = ("ontable", "on", "clear", "holding", "handempty")
+# FIXME: ontable and clear are not used by the special domain for now
+SPECIAL_PREDICATES = ("on", "holding", "filled", "empty", "in", "unused", "gridempty", "handempty")
+
+# Geometric tolerances used for grounding (m)
+BLOCK_SIZE = 0.04
+TABLE_Z = 0.02
+XY_TOL = 0.01
+EE_BLOCK_Z_OFFSET = 0.11
+# max z distance of a held block below its EE offset, and of a stacked block to one block height
+Z_TOL = 0.01
+STACK_Z_TOL = 0.005
+SLOT_ATOL = 0.001
+
+
+def get_block_positions(scene, BlocksState):
+    """Fetch the positions of all blocks in one call.
+
+    Returns an (N, 3) array in the order of BlocksState.
+    """
+    blocks = list(BlocksState.values())
+    try:
+        # every block is a single-link entity, read all links from the solver at once
+        links_idx = [block.link_start for block in blocks]
+        pos = tensor_to_array(scene.rigid_solver.get_links_pos(links_idx))
+    except AttributeError:
+        pos = [tensor_to_array(block.get_pos()) for block in blocks]
+    return np.asarray(pos, dtype=float).reshape(len(blocks), 3)
+
+
+def ground_facts(block_names, block_pos, ee_pos, gripper_qpos, slot_names=None, slot_pos=None):
+    """Compute all predicates of both domains at once with broadcasting.
+
+    Args:
+        block_names: list of N block names
+        block_pos: (N, 3) block positions
+        ee_pos: (3,) position of the end effector ("hand" link)
+        gripper_qpos: (2,) finger joint positions
+        slot_names: optional list of M slot names
+        slot_pos: optional (M, 3) slot positions
+
+    Returns:
+        frozenset of fact tuples, e.g. {("on", "r", "g"), ("handempty",)}
+    """
+    names = np.asarray(block_names)
+    block_pos = np.asarray(block_pos, dtype=float).reshape(len(names), 3)
+    ee_pos = np.asarray(ee_pos, dtype=float)
+    facts = set()
+
+    # HOLDING(A) - first block right below the end effector, if the fingers are closed on it
+    # Note: Z offset required between EE and block of roughly 0.11
+    d_ee = ee_pos[None, :] - block_pos
+    under_ee = (np.abs(d_ee[:, 0]) < XY_TOL) & (np.abs(d_ee[:, 1]) < XY_TOL) & (np.abs(d_ee[:, 2]) - EE_BLOCK_Z_OFFSET < Z_TOL)
+    gripper_qpos = np.abs(np.asarray(gripper_qpos, dtype=float))
+    gripping = bool((gripper_qpos - 0.02 < 0.005).all())
+    if gripping and under_ee.any():
+        facts.add(("holding", str(names[np.argmax(under_ee)])))
+    else:
+        # HANDEMPTY() - if not holding any blocks -> hand is empty
+        facts.add(("handempty",))
+
+    # ONTABLE(A) - blocks at table height
+    on_table = np.abs(block_pos[:, 2] - TABLE_Z) < 0.001
+    facts.update(("ontable", str(name)) for name in names[on_table])
+
+    # ON(A,B) - same x/y and one block height above, only for blocks not on the table
+    # Note: two-sided z test of the blocks domain generator for both domains, the special one used
+    # abs(dz) - 0.04 < 0.005 which also matched a block right below, or closer than one block height
+    d = block_pos[:, None, :] - block_pos[None, :, :]  # d[top, bottom]
+    on = (np.abs(d[..., 0]) < XY_TOL) & (np.abs(d[..., 1]) < XY_TOL) & (np.abs(d[..., 2] - BLOCK_SIZE) < STACK_Z_TOL)
+    np.fill_diagonal(on, False)
+    on &= ~on_table[:, None]
+    # a block can only be on top of one block by definition, keep the first match
+    has_bottom = on.any(axis=1)
+    bottom = np.argmax(on, axis=1)
+    facts.update(("on", str(names[top]), str(names[bottom[top]])) for top in np.flatnonzero(has_bottom))
+
+    # CLEAR(A) - no block on top of it
+    covered = np.zeros(len(names), dtype=bool)
+    covered[bottom[has_bottom]] = True
+    facts.update(("clear", str(name)) for name in names[~covered])
+
+    if slot_names is None:
+        return frozenset(facts)
+
+    # IN(B,S) / FILLED(S) / EMPTY(S) / UNUSED(B) - blocks sitting exactly in a slot
+    slot_names = np.asarray(slot_names)
+    slot_pos = np.asarray(slot_pos, dtype=float).reshape(len(slot_names), 3)
+    # same test as np.allclose(slot, block_pos, atol=SLOT_ATOL) for every pair
+    in_slot = (np.abs(slot_pos[:, None, :] - block_pos[None, :, :]) <= SLOT_ATOL + 1e-5 * np.abs(block_pos[None, :, :])).all(axis=-1)
+    filled = in_slot.any(axis=1)
+    facts.update(("filled", str(name)) for name in slot_names[filled])
+    facts.update(("empty", str(name)) for name in slot_names[~filled])
+    facts.update(("in", str(names[i_block]), str(slot_names[i_slot])) for i_slot, i_block in zip(*np.nonzero(in_slot)))
+    facts.update(("unused", str(name)) for name in names[~in_slot.any(axis=0)])
+    # GRIDEMPTY() - the entire grid is empty
+    if not filled.any():
+        facts.add(("gridempty",))
+
+    return frozenset(facts)
+
+
+@profiler.timed("ground")
+def ground_scene(scene, franka, BlocksState, SlotsState=None):
+    """Read the scene in batched calls and ground it (see ground_facts).
+
+    Returns a SymbolicState over the blocks (and slots, if given).
+    """
     end_effector = franka.get_link("hand")
-    ee_pos = end_effector.get_pos()
-    ee_quat = end_effector.get_quat()
-    ee_R = R.from_quat(ee_quat)
-    ee_roll, ee_pitch, ee_yaw = ee_R.as_euler('xyz', degrees=False)
-    
-    # HOLDING(A) - Check if the robot is holding a block based on pose
-    valid_pos = False
-    valid_quat = False
-    valid_grip = False
-    # Loop through blocks to determine if one is held
-    for key, block in BlocksState.items():
-        # Check if positions are valid for holding
-        block_pos = block.get_pos()
-        if abs(ee_pos[0] - block_pos[0]) < 0.01:
-            if abs(ee_pos[1] - block_pos[1]) < 0.01:
-                # Note: Z offset required between EE and block of roughly 0.11
-                if abs(ee_pos[2] - block_pos[2]) - 0.11 < 0.01:
-                    valid_pos = True
-        # Check if orientations are valid for holding (only if positions are valid)
-        # if (valid_pos):
-        #     # Get orientations
-        #     block_quat = block.get_quat()
-        #     block_R = R.from_quat(block_quat)
-        #     block_roll, block_pitch, block_yaw = block_R.as_euler('xyz', degrees=False)
-        #     # Check z rotated by 180 degrees (EE pointing down at block) & normalize
-        #     delta_yaw = (ee_yaw - block_yaw + np.pi) % (2*np.pi) - np.pi
-        #     if abs(delta_yaw - np.pi) < 0.1:
-        #         valid_quat = True
-        # Check if gripping if pose deemed valid using contact forces
-        if (valid_pos):
-            print("checking collision")
-            # TODO: Consider moving depending on how expensive this collision check is
-            # Positions of grippers
-            if (abs((franka.get_qpos())[-1]) - 0.02 < 0.005 and abs((franka.get_qpos())[-2]) - 0.02 < 0.005):
-                valid_grip = True
-            # Add initial condition if valid grip
-            if valid_grip:
-                # TODO: note dangling space
-                holding = "(holding " + key + ")"
-                # Break loop since can only be holding one block at a time
-                break
-    
+    ee_pos = np.asarray(tensor_to_array(end_effector.get_pos()), dtype=float)
+    gripper_qpos = np.asarray(tensor_to_array(franka.get_qpos()), dtype=float)[-2:]
+    block_pos = get_block_positions(scene, BlocksState)
+    objects = {key: "block" for key in BlocksState}
+    if SlotsState is None:
+        facts = ground_facts(list(BlocksState.keys()), block_pos, ee_pos, gripper_qpos)
+    else:
+        objects.update({key: "slot" for key in SlotsState})
+        facts = ground_facts(
+            list(BlocksState.keys()), block_pos, ee_pos, gripper_qpos,
+            list(SlotsState.keys()), np.asarray(list(SlotsState.values()), dtype=float),
+        )
+    return SymbolicState(objects, facts)
 
-    # HANDEMPTY() - if not holding any blocks -> hand is empty
-    if holding == "":
-        hand_empty += "(handempty)"
 
-    # ONTABLE(A) - Check if blocks are on table based on z coordinate
-    # Create boolean list that indicates if a specific block is on the table
-    on_table_bools = [False] * len(BlocksState)
-    i = 0
-    for key, block in BlocksState.items():
-        block_pos = block.get_pos()
-        if abs(block_pos[2] - 0.02) < 0.001:
-            on_table += "(ontable " + key + ") "
-            on_table_bools[i] = True
-        i += 1
+@functools.lru_cache(maxsize=None)
+def read_init_file(path):
+    """Static slot relations of a special structure (Init_1.txt / Init_2.txt)."""
+    with open(path, "r", encoding="utf-8") as file:
+        return tuple(parse_facts(file.read()))
 
-    # ON(A,B) - check if all blocks not on table are on another block
-    j = 0
-    for top_key, top_block in BlocksState.items():
-        # Check if block not on the table
-        if on_table_bools[j] == False:
-            top_pos = top_block.get_pos()
-            k = 0
-            for bottom_key, bottom_block in BlocksState.items():
-                # Don't compare block against itself
-                if (j != k):
-                    bottom_pos = bottom_block.get_pos()
-                    # Check if "same" x and y, proper z offset (0.04)
-                    if abs(top_pos[0] - bottom_pos[0]) < 0.01:
-                        if abs(top_pos[1] - bottom_pos[1]) < 0.01:
-                            # Note: Z offset required between blocks is 0.04
-                            if top_pos[2] - bottom_pos[2] - 0.04 < 0.005 and top_pos[2] - bottom_pos[2] - 0.04 > -0.005:
-                                on += "(on " + top_key + " " + bottom_key + ") "
-                                # Break since can only be on top of one block by definition
-                                break
-                k +=1
-        j += 1
-    
-    # CLEAR(A) - check if a block has no blocks on top of it 
-    # Check for all blocks that do not appear in the bottom position in "ON(A,B)"
-    # Use logic that the bottom block always appears right before ")"
-    bottom_blocks_indices = [index - 1 for index, char in enumerate(on) if char == ")"]
-    bottom_blocks = [on[index] for index in bottom_blocks_indices]
-    for key, block in BlocksState.items():
-        if key not in bottom_blocks:
-            clear += "(clear " + key + ") "
-            holder = 1
 
-    # Create the pddl file (can be treated as txt file)
-    with open("problem.pddl", "w") as f:
-        f.write("(define (problem BLOCKSPROBLEM)\n")
-        f.write("(:domain BLOCKS)\n")
-        f.write("(:objects " + blocks + " - block )\n")
-        f.write("(:init " + on_table + on + clear + holding + hand_empty + ")\n")
-        if goal_num == 1:
-            f.write("(:goal (AND (on g b) (on r g) (on m c) (on y m)))\n)")
-        elif goal_num == 2:
-            f.write("(:goal (AND (on r g) (on b r) (on y b) (on m y)))\n)")
-        else:
-            f.write("(:goal (AND (on r g) (on b r) (on y b) (on m y) (on p m) (on o p)))\n)")
+# Generates the pddl problem for the original 3 goals
+@profiler.timed("generate_pddl")
+def generate_pddl(scene, franka, BlocksState, goal_num):
+    """Ground the scene into a SymbolicProblem for the BLOCKS domain.
 
+    Call .write() on the result to get a problem.pddl file.
+    """
+    state = ground_scene(scene, franka, BlocksState).select(BLOCKS_PREDICATES)
+    goal = GOALS[goal_num] if goal_num in GOALS else GOALS[3]
+    return SymbolicProblem("BLOCKS", state, parse_facts(goal))
 
 
-# Generates pddl for the special structures 
+# Generates the pddl problem for the special structures
+@profiler.timed("generate_pddl_special")
 def generate_pddl_special(scene, franka, BlocksState, SlotsState, goal_num):
-    """Generate a pddl file based on provided scene."""
-
-    # Get all blocks in single string, separated by a space 
-    blocks = " ".join(BlocksState.keys())
-
-    # Get all slots in a single string, separated by a space
-    slots = " ".join(SlotsState.keys())
-
-    # Define all initial conditions of predicates (OG)
-    hand_empty =  ""
-    holding = ""
-    clear = ""
-    on_table = ""
-    on = ""
-
-    # Define new predicates for slots and blocks
-    slot_empty = ""
-    slot_occupied = ""
-    block_unused = "" 
-    block_used = ""
-    grid_empty = ""
-
-    # Define goal
-    filled = ""
-    for key_slot, slot in SlotsState.items():
-        filled = filled + "(filled " + key_slot + ") "
-
-    # Get pose of franka's end effector
-    end_effector = franka.get_link("hand")
-    ee_pos = end_effector.get_pos()
-    ee_quat = end_effector.get_quat()
-    ee_R = R.from_quat(ee_quat)
-    ee_roll, ee_pitch, ee_yaw = ee_R.as_euler('xyz', degrees=False)
-    
-    # HOLDING(A) - Check if the robot is holding a block based on pose
-    valid_pos = False
-    valid_quat = False
-    valid_grip = False
-    # Loop through blocks to determine if one is held
-    for key, block in BlocksState.items():
-        # Check if positions are valid for holding
-        block_pos = block.get_pos()
-        if abs(ee_pos[0] - block_pos[0]) < 0.01:
-            if abs(ee_pos[1] - block_pos[1]) < 0.01:
-                # Note: Z offset required between EE and block of roughly 0.11
-                if abs(ee_pos[2] - block_pos[2]) - 0.11 < 0.01:
-                    valid_pos = True
-        # # Check if orientations are valid for holding (only if positions are valid)
-        # if (valid_pos):
-        #     # Get orientations
-        #     block_quat = block.get_quat()
-        #     block_R = R.from_quat(block_quat)
-        #     block_roll, block_pitch, block_yaw = block_R.as_euler('xyz', degrees=False)
-        #     # Check z rotated by 180 degrees (EE pointing down at block) & normalize
-        #     delta_yaw = (ee_yaw - block_yaw + np.pi) % (2*np.pi) - np.pi
-        #     if abs(delta_yaw - np.pi) < 0.1:
-        #         valid_quat = True
-        # # Check if gripping if pose deemed valid using contact forces
-        if (valid_pos):
-            print("checking collision")
-            # TODO: Consider moving depending on how expensive this collision check is
-            # Positions of grippers
-            if (abs((franka.get_qpos())[-1]) - 0.02 < 0.005 and abs((franka.get_qpos())[-2]) - 0.02 < 0.005):
-                valid_grip = True
-            # Add initial condition if valid grip
-        if valid_grip:
-                # TODO: note dangling space
-            holding = "(holding " + key + ")"
-            print(holding)
-                # Break loop since can only be holding one block at a time
-            break
-    
-
-    # HANDEMPTY() - if not holding any blocks -> hand is empty
-    if holding == "":
-        print("hand empty")
-        hand_empty += "(handempty)"
-
-    # ONTABLE(A) - Check if blocks are on table based on z coordinate
-    # Create boolean list that indicates if a specific block is on the table
-    on_table_bools = [False] * len(BlocksState)
-    i = 0
-    for key, block in BlocksState.items():
-        block_pos = block.get_pos()
-        if abs(block_pos[2] - 0.02) < 0.001:
-            # FIXME: REMOVE ONTABLE FOR NOW
-            #on_table += "(ontable " + key + ") "
-            on_table_bools[i] = True
-        i += 1
-
-    # TODO: There is most likely better and more efficient logic for this check
-    # ON(A,B) - check if all blocks not on table are on another block
-    j = 0
-    for top_key, top_block in BlocksState.items():
-        # Check if block not on the table
-        if on_table_bools[j] == False:
-            top_pos = top_block.get_pos()
-            k = 0
-            for bottom_key, bottom_block in BlocksState.items():
-                # Don't compare block against itself
-                if (j != k):
-                    bottom_pos = bottom_block.get_pos()
-                    # Check if "same" x and y, proper z offset (0.04)
-                    if abs(top_pos[0] - bottom_pos[0]) < 0.01:
-                        if abs(top_pos[1] - bottom_pos[1]) < 0.01:
-                            # Note: Z offset required between blocks is 0.04
-                            if abs(top_pos[2] - bottom_pos[2]) - 0.04 < 0.005:
-                                on += "(on " + top_key + " " + bottom_key + ") "
-                                # Break since can only be on top of one block by definition
-                                break
-                k +=1
-        j += 1
-    print(on)
-    # CLEAR(A) - check if a block has no blocks on top of it 
-    # Check for all blocks that do not appear in the bottom position in "ON(A,B)"
-    # Use logic that the bottom block always appears right before ")"
-    bottom_blocks_indices = [index - 1 for index, char in enumerate(on) if char == ")"]
-    bottom_blocks = [on[index] for index in bottom_blocks_indices]
-    for key, block in BlocksState.items():
-        if key not in bottom_blocks:
-            # clear += "(clear " + key + ") "
-            holder = 1
-
-    # SLOTOCCUPIED(S) - checks if a slot is occupied (checks if a block has same location)
-    # BLOCKUSED(B,S) - checks if a block is used (in a slot)
-    # SLOTEMPTY(S) - checks if a slot is empty (no block at that location)
-    # GRIDEMPTY() - checks if the entire grid is empty
-    empty_count = 0
-    for key_slot, slot in SlotsState.items():
-        empty = True
-        for key_block, block in BlocksState.items():
-            if np.allclose(slot, block.get_pos(), atol=0.001):
-                slot_occupied += "(filled " + key_slot + ") "
-                block_used += "(in " + key_block + " " + key_slot + ") "
-                empty = False
-        if empty:
-            slot_empty += "(empty " + key_slot + ") "
-            empty_count = empty_count + 1
-    
-    if empty_count == 6 or empty_count == 10:
-        grid_empty = "(gridempty) "
+    """Ground the scene into a SymbolicProblem for the BLOCKS2 (slot) domain.
 
-    # BLOCKUNUSED(B) - checks if a block is unused (not in a slot)
-    for key_block, block in BlocksState.items():
-        unused = True
-        for key_slot, slot in SlotsState.items():
-            if np.allclose(slot, block.get_pos(), atol=0.001):
-                unused = False
-        if unused:
-            block_unused += "(unused " + key_block + ") "
+    Call .write() on the result to get a problem.pddl file.
+    """
+    state = ground_scene(scene, franka, BlocksState, SlotsState).select(SPECIAL_PREDICATES)
 
-    # Read text file for specific task
+    # Static slot relations for the specific task
     if goal_num == 4:
-        with open("Init_1.txt", "r", encoding="utf-8") as file:
-            content = file.read()
+        static_facts = read_init_file("Init_1.txt")
     else:
-        with open("Init_2.txt", "r", encoding="utf-8") as file:
-            content = file.read()
+        static_facts = read_init_file("Init_2.txt")
 
-    # Create the pddl file (can be treated as txt file)
-    with open("problem.pddl", "w") as f:
-        f.write("(define (problem BLOCKSPROBLEM)\n")
-        f.write("(:domain BLOCKS2)\n")
-        f.write("(:objects " + blocks + " - block \n" + slots + " - slot)\n")
-        f.write("(:init " + on_table + on + clear + holding + slot_occupied + slot_empty + block_used + block_unused + grid_empty + hand_empty + "\n" + content + ")\n")
-        f.write("(:goal (AND " + filled + ")))\n")
\ No newline at end of file
+    # Goal: every slot filled
+    filled = [("filled", key_slot) for key_slot in SlotsState]
+    return SymbolicProblem("BLOCKS2", state.union(static_facts), filled)
@@ -0,0 +1,133 @@
+"""Typed, hashable symbolic states and problems.
+
+The grounder (symbolic_abstraction.ground_facts) produces facts as tuples
+of strings. SymbolicState freezes them together with the objects into an
+immutable value with a cached hash, so states can be used directly as
+dict/cache keys and compared/deduplicated without any text round trip.
+PDDL text is only produced on demand (to_pddl / write), e.g. for
+debugging or for running an external planner.
+
+Usage:
+    state = SymbolicState(objects, facts)
+    problem = SymbolicProblem("BLOCKS", state, goal)
+    plan = task_planner.plan_problem(problem)
+    problem.write("problem.pddl")  # only if a file is needed
+"""
+import re
+from typing import Dict, FrozenSet, Iterable, List, Tuple
+
+Fact = Tuple[str, ...]
+Action = Tuple[str, ...]
+
+# Order predicates are written in problem files
+PREDICATE_ORDER = ["ontable", "on", "clear", "holding", "filled", "empty", "in", "unused", "gridempty", "handempty"]
+_PREDICATE_RANK = {name: i for i, name in enumerate(PREDICATE_ORDER)}
+
+_FACT_RE = re.compile(r"\(([^()]*)\)")
+
+
+def parse_facts(text: str) -> List[Fact]:
+    """Parse PDDL atoms like "(on r g) (handempty)" into fact tuples, ignoring ; comments."""
+    text = re.sub(r";[^\n]*", "", text)
+    return [tuple(match.split()) for match in _FACT_RE.findall(text) if match.split()]
+
+
+def fact_to_str(fact: Fact) -> str:
+    """Format a fact tuple the way pyperplan names grounded facts, e.g. "(on r g)"."""
+    return "(" + " ".join(fact) + ")"
+
+
+def facts_to_pddl(facts: Iterable[Fact]) -> str:
+    """Format facts as PDDL atoms, in a stable order."""
+    ordered = sorted(facts, key=lambda fact: (_PREDICATE_RANK.get(fact[0], len(_PREDICATE_RANK)), fact))
+    return " ".join(fact_to_str(fact) for fact in ordered)
+
+
+class SymbolicState:
+    """Immutable set of facts over a fixed set of typed objects."""
+
+    __slots__ = ("objects", "facts", "_hash")
+
+    def __init__(self, objects: Dict[str, str], facts: Iterable[Fact]):
+        """
+        Args:
+            objects: object name -> type name, e.g. {"r": "block", "s1": "slot"}
+            facts: fact tuples, e.g. [("on", "r", "g"), ("handempty",)]
+        """
+        self.objects: Tuple[Tuple[str, str], ...] = tuple(sorted(objects.items()))
+        self.facts: FrozenSet[Fact] = frozenset(tuple(fact) for fact in facts)
+        self._hash = hash((self.objects, self.facts))
+
+    def __hash__(self) -> int:
+        return self._hash
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, SymbolicState):
+            return NotImplemented
+        return self._hash == other._hash and self.objects == other.objects and self.facts == other.facts
+
+    def __contains__(self, fact: Fact) -> bool:
+        return tuple(fact) in self.facts
+
+    def __len__(self) -> int:
+        return len(self.facts)
+
+    def __repr__(self) -> str:
+        return f"SymbolicState({facts_to_pddl(self.facts)})"
+
+    @property
+    def object_types(self) -> Dict[str, str]:
+        return dict(self.objects)
+
+    def canonical(self) -> Tuple[Tuple[Tuple[str, str], ...], Tuple[Fact, ...]]:
+        """Sorted tuple form, stable across processes (the builtin hash of strings is not)."""
+        return self.objects, tuple(sorted(self.facts))
+
+    def select(self, predicates: Iterable[str]) -> "SymbolicState":
+        """State restricted to the given predicates."""
+        predicates = set(predicates)
+        return SymbolicState(self.object_types, (fact for fact in self.facts if fact[0] in predicates))
+
+    def union(self, facts: Iterable[Fact]) -> "SymbolicState":
+        return SymbolicState(self.object_types, self.facts.union(tuple(fact) for fact in facts))
+
+    def to_pddl_objects(self) -> str:
+        by_type: Dict[str, list] = {}
+        for name, type_name in self.objects:
+            by_type.setdefault(type_name, []).append(name)
+        return " ".join(" ".join(names) + " - " + type_name for type_name, names in by_type.items())
+
+    def to_pddl_init(self) -> str:
+        return facts_to_pddl(self.facts)
+
+
+class SymbolicProblem:
+    """A symbolic state together with the goal and the PDDL domain it is posed in."""
+
+    __slots__ = ("domain_name", "state", "goal")
+
+    def __init__(self, domain_name: str, state: SymbolicState, goal: Iterable[Fact]):
+        self.domain_name = domain_name
+        self.state = state
+        self.goal: FrozenSet[Fact] = frozenset(tuple(fact) for fact in goal)
+
+    def __hash__(self) -> int:
+        return hash((self.domain_name, self.state, self.goal))
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, SymbolicProblem):
+            return NotImplemented
+        return (self.domain_name, self.state, self.goal) == (other.domain_name, other.state, other.goal)
+
+    def to_pddl(self, name: str = "BLOCKSPROBLEM") -> str:
+        return (
+            f"(define (problem {name})\n"
+            f"(:domain {self.domain_name})\n"
+            f"(:objects {self.state.to_pddl_objects()})\n"
+            f"(:init {self.state.to_pddl_init()})\n"
+            f"(:goal (AND {facts_to_pddl(self.goal)}))\n)"
+        )
+
+    def write(self, path: str = "problem.pddl") -> None:
+        with open(path, "w") as f:
+            f.write(self.to_pddl())
@@ -0,0 +1,244 @@
+"""In-process task planning with pyperplan.
+
+Replaces running the `pyperplan` command line tool in a subprocess: the
+domain is parsed once and kept in memory, problems are passed in as
+Python data and the plan comes back as a list of action tuples, e.g.
+[("pick-up", "m"), ("stack", "m", "c")]. No files are read or written
+per query.
+
+Facts are tuples of strings, (predicate, arg1, arg2, ...), e.g.
+("on", "r", "g") or ("handempty",).
+
+Between re-planning steps only the initial state changes, so the grounded
+operators (and the search heuristic) are cached per objects/static facts/
+goal and only the initial state is swapped in. If the remainder of the
+previous plan still reaches the goal from the new state, it is returned
+without searching again.
+
+An optional persistent plan cache (caching.PersistentLRUCache) maps the
+canonical symbolic state and goal straight to a plan, so states that were
+already solved in this or a previous run never reach the planner.
+
+Usage:
+    task_planner = TaskPlanner("domain.pddl", search="bfs")
+    plan = task_planner.plan(objects, init, goal)
+"""
+import os
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Note: besides the public API this relies on pyperplan internals, grounding._get_statics and
+# Parser.domInput (to parse a domain from text), as of pyperplan 2.1 (pip install pyperplan==2.1)
+from pyperplan import grounding
+from pyperplan.heuristics.relaxation import hFFHeuristic
+from pyperplan.pddl.parser import Parser
+from pyperplan.pddl.pddl import Predicate, Problem
+from pyperplan.search import breadth_first_search, greedy_best_first_search
+from pyperplan.task import Task
+
+from caching import stable_hash
+from profiling import profiler
+# fact parsing lives in the pyperplan-free symbolic_state, imported from here by the planners
+from symbolic_state import Action, Fact, fact_to_str, parse_facts
+
+# search algorithms (same names as the pyperplan command line), and whether they need a heuristic
+SEARCHES = {
+    "bfs": (breadth_first_search, False),
+    "gbf": (greedy_best_first_search, True),
+}
+
+def write_plan(plan: Iterable[Action], path: str) -> None:
+    """Write a plan in pyperplan's .soln format, one action per line."""
+    with open(path, "w") as f:
+        for action in plan:
+            f.write(fact_to_str(action) + "\n")
+
+
+class TaskPlanner:
+    def __init__(self, domain_file: str, search: str = "bfs", plan_cache=None, domain_text: Optional[str] = None):
+        """Parse `domain_file` once and keep it resident.
+
+        Args:
+            domain_file: path of the PDDL domain (e.g. domain.pddl or custom_domain.pddl)
+            search: "bfs" (breadth first) or "gbf" (greedy best first with hFF)
+            plan_cache: optional caching.PersistentLRUCache for solved (state, goal) pairs
+            domain_text: PDDL text of a generated domain, `domain_file` is then only used as its name
+        """
+        if search not in SEARCHES:
+            raise ValueError(f"Search {search} is not supported. Supported searches: {list(SEARCHES)}.")
+        self.domain_file = domain_file
+        self.search = search
+        if domain_text is None:
+            self.domain = Parser(domain_file).parse_domain()
+            self._domain_id = os.path.basename(domain_file)
+        else:
+            parser = Parser(domain_file)
+            parser.domInput = domain_text
+            self.domain = parser.parse_domain(read_from_file=False)
+            self._domain_id = domain_file + ":" + stable_hash(domain_text)
+        self.plan_cache = plan_cache
+        self.static_predicates = set(
+            grounding._get_statics(self.domain.predicates.values(), self.domain.actions.values())
+        )
+
+        # grounded tasks keyed by (objects, static facts, goal), with their heuristic and operators by name
+        self._grounded = {}
+        # key and plan of the last query, for suffix reuse
+        self._last_key = None
+        self._last_plan = None
+        self.n_groundings = 0
+        self.n_searches = 0
+
+    @profiler.timed("task_plan")
+    def plan(self, objects: Dict[str, str], init: Iterable[Fact], goal: Iterable[Fact]) -> Optional[List[Action]]:
+        """Solve a problem over the resident domain.
+
+        Args:
+            objects: object name -> type name, e.g. {"r": "block", "s1": "slot"}
+            init: facts true in the initial state
+            goal: facts that must hold in the goal
+
+        Returns:
+            list of action tuples, or None if the problem is unsolvable
+        """
+        # facts over predicates the domain does not know (e.g. static relations it compiled away) are dropped
+        init = [tuple(fact) for fact in init if fact[0] in self.domain.predicates]
+        goal = [tuple(fact) for fact in goal]
+
+        key = (
+            frozenset(objects.items()),
+            frozenset(fact for fact in init if fact[0] in self.static_predicates),
+            frozenset(goal),
+        )
+        cache_key = None
+        if self.plan_cache is not None:
+            cache_key = self._plan_cache_key(objects, init, goal)
+            cached = self.plan_cache.get(cache_key)
+            if cached is not None:
+                profiler.count("task_plan_cache_hits")
+                # the next query reuses a suffix of this plan, not of the one before it
+                self._last_key = key
+                self._last_plan = list(cached)
+                return list(cached)
+
+        grounded = self._grounded.get(key)
+        if grounded is None:
+            grounded = self._ground(objects, init, goal)
+            self._grounded[key] = grounded
+
+        # only the initial state changes between queries, statics were compiled into the operators
+        base_task = grounded["task"]
+        initial_state = frozenset(fact_to_str(fact) for fact in init) & base_task.facts
+        task = Task(base_task.name, base_task.facts, initial_state, base_task.goals, base_task.operators)
+
+        plan = None
+        if key == self._last_key:
+            plan = self._reuse_plan(task, grounded["operators"], self._last_plan)
+            if plan is not None:
+                profiler.count("task_plan_reused")
+        if plan is None:
+            plan = self._search(task, grounded)
+        self._last_key = key
+        self._last_plan = plan
+        if cache_key is not None and plan is not None:
+            self.plan_cache.put(cache_key, tuple(plan))
+        return plan
+
+    def _plan_cache_key(self, objects: Dict[str, str], init: List[Fact], goal: List[Fact]) -> tuple:
+        # sorted tuples of strings, so keys are stable across runs when the cache is stored on disk
+        return (
+            self._domain_id,
+            self.search,
+            tuple(sorted(objects.items())),
+            tuple(sorted(set(init))),
+            tuple(sorted(set(goal))),
+        )
+
+    def plan_stages(self, objects: Dict[str, str], init: Iterable[Fact], goal: Iterable[Fact]) -> Tuple[Optional[List[Action]], dict]:
+        """Ground and search a problem from scratch, bypassing every cache, and time both stages.
+
+        Meant for benchmarks, the arguments are the same as for plan.
+
+        Returns:
+            the plan (or None) and a dict with the number of grounded "facts" and "operators" and the
+            "grounding_s"/"search_s" durations
+        """
+        init = [tuple(fact) for fact in init if fact[0] in self.domain.predicates]
+        goal = [tuple(fact) for fact in goal]
+        t0 = time.perf_counter()
+        grounded = self._ground(objects, init, goal)
+        t1 = time.perf_counter()
+        plan = self._search(grounded["task"], grounded)
+        t2 = time.perf_counter()
+        task = grounded["task"]
+        return plan, {
+            "facts": len(task.facts),
+            "operators": len(task.operators),
+            "grounding_s": t1 - t0,
+            "search_s": t2 - t1,
+        }
+
+    def plan_problem(self, problem) -> Optional[List[Action]]:
+        """Solve a symbolic_state.SymbolicProblem (see plan)."""
+        return self.plan(problem.state.object_types, problem.state.facts, problem.goal)
+
+    @profiler.timed("task_plan.ground")
+    def _ground(self, objects: Dict[str, str], init: List[Fact], goal: List[Fact]) -> dict:
+        problem = self._make_problem(objects, init, goal)
+        task = grounding.ground(problem)
+        self.n_groundings += 1
+        _, needs_heuristic = SEARCHES[self.search]
+        return {
+            "task": task,
+            # the relaxation heuristics only depend on facts, operators and goals
+            "heuristic": hFFHeuristic(task) if needs_heuristic else None,
+            "operators": {op.name: op for op in task.operators},
+        }
+
+    @staticmethod
+    def _reuse_plan(task, operators, last_plan) -> Optional[List[Action]]:
+        """Return the shortest-offset suffix of `last_plan` that still reaches the goal from `task`'s initial state."""
+        if last_plan is None:
+            return None
+        for i_start in range(len(last_plan) + 1):
+            state = task.initial_state
+            valid = True
+            for action in last_plan[i_start:]:
+                op = operators.get(fact_to_str(action))
+                if op is None or not op.applicable(state):
+                    valid = False
+                    break
+                state = op.apply(state)
+            if valid and task.goal_reached(state):
+                return list(last_plan[i_start:])
+        return None
+
+    def _make_problem(self, objects: Dict[str, str], init: Iterable[Fact], goal: Iterable[Fact]) -> Problem:
+        types = self.domain.types
+        problem_objects = {
+            name: types[type_name] for name, type_name in objects.items() if name not in self.domain.constants
+        }
+        return Problem(
+            "BLOCKSPROBLEM",
+            self.domain,
+            problem_objects,
+            [self._make_atom(fact) for fact in init],
+            [self._make_atom(fact) for fact in goal],
+        )
+
+    @staticmethod
+    def _make_atom(fact: Fact) -> Predicate:
+        # grounding only reads the argument names of the signature
+        return Predicate(fact[0], [(arg, ()) for arg in fact[1:]])
+
+    @profiler.timed("task_plan.search")
+    def _search(self, task, grounded: dict) -> Optional[List[Action]]:
+        search, needs_heuristic = SEARCHES[self.search]
+        self.n_searches += 1
+        if needs_heuristic:
+            solution = search(task, grounded["heuristic"])
+        else:
+            solution = search(task)
+        if solution is None:
+            return None
+        return [tuple(op.name.strip("()").split()) for op in solution]
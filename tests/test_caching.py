@@ -0,0 +1,56 @@
+import numpy as np
+
+from caching import PersistentLRUCache, quantize, stable_hash
+
+
+def test_quantize_rounds_to_grid():
+    assert quantize([0.1234, -0.0004, 2.0], 1e-3) == (123, 0, 2000)
+    # values within half a step share a key, hashable and independent of the input type
+    assert quantize(np.array([0.1234]), 1e-2) == quantize((0.1199,), 1e-2)
+    assert quantize([0.1234], 1e-2) != quantize([0.1351], 1e-2)
+    assert quantize(np.zeros((2, 2)), 0.1) == (0, 0, 0, 0)
+    hash(quantize([1.5, 2.5], 0.5))
+
+
+def test_stable_hash_depends_on_value_only():
+    assert stable_hash(("r", (1, 2))) == stable_hash(("r", (1, 2)))
+    assert stable_hash(("r", (1, 2))) != stable_hash(("g", (1, 2)))
+
+
+def test_lru_eviction_and_counts():
+    cache = PersistentLRUCache(max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    # "b" is now the least recently used
+    cache.put("c", 3)
+    assert "b" not in cache and "a" in cache and "c" in cache
+    assert len(cache) == 2
+    assert cache.get("b") is None
+    assert cache.get("b", "missing") == "missing"
+    assert (cache.hits, cache.misses) == (1, 2)
+    assert cache.pop("a") == 1 and "a" not in cache
+
+
+def test_persists_across_instances(tmp_path):
+    path = str(tmp_path / "cache.pkl")
+    cache = PersistentLRUCache(max_entries=3, path=path)
+    for i in range(4):
+        cache.put(("key", i), np.full(2, i))
+
+    reloaded = PersistentLRUCache(max_entries=3, path=path)
+    assert len(reloaded) == 3 and ("key", 0) not in reloaded
+    np.testing.assert_array_equal(reloaded.get(("key", 3)), [3, 3])
+
+    # a smaller cache keeps the most recent entries
+    smaller = PersistentLRUCache(max_entries=1, path=path)
+    assert ("key", 3) in smaller and len(smaller) == 1
+
+
+def test_no_autosave(tmp_path):
+    path = tmp_path / "cache.pkl"
+    cache = PersistentLRUCache(path=str(path), autosave=False)
+    cache.put("a", 1)
+    assert not path.exists()
+    cache.save()
+    assert PersistentLRUCache(path=str(path)).get("a") == 1
@@ -0,0 +1,58 @@
+import pickle
+
+import pytest
+
+pytest.importorskip("genesis")
+pytest.importorskip("pyperplan")
+from plan_parser import ACTION_KINDS, PlanAction, _family, as_plan_action, parse_plan  # noqa: E402
+
+
+def test_families():
+    assert _family("place-above-16") == "place-above"
+    assert _family("fill-s2-next-s1") == "fill"
+    assert _family("pick-up") == "pick-up"
+    assert ACTION_KINDS["unstack"] == "pick"
+    assert ACTION_KINDS["place-northeast"] == "place-direction"
+
+
+def test_plan_action_fields():
+    stack = PlanAction(("stack", "r", "g"))
+    assert stack == ("stack", "r", "g")
+    assert (stack.kind, stack.block, stack.target, stack.direction) == ("stack", "r", "g", None)
+
+    above = PlanAction(("place-above-16", "b10", "b2"))
+    assert (above.kind, above.target) == ("place-above", "b2")
+
+    north = PlanAction(("place-north", "b10", "b2", "s1"))
+    assert (north.kind, north.target, north.direction) == ("place-direction", "b2", "north")
+
+    fill = PlanAction(("fill-s2-next-s1", "r"))
+    assert (fill.kind, fill.block, fill.target) == ("fill", "r", "s2")
+
+    unknown = PlanAction(("noop",))
+    assert (unknown.kind, unknown.block, unknown.target) == (None, None, None)
+
+
+def test_invalid_actions():
+    with pytest.raises(ValueError):
+        PlanAction(())
+    with pytest.raises(ValueError):
+        PlanAction(("stack", "r"))
+
+
+def test_parse_plan_and_pickle():
+    plan = parse_plan("; cost = 2\n(pick-up m)\n(stack m c)\n")
+    assert [action.kind for action in plan] == ["pick", "stack"]
+    assert plan[1].target == "c"
+
+    action = pickle.loads(pickle.dumps(plan[1]))
+    assert isinstance(action, PlanAction)
+    assert (action, action.kind, action.target) == (("stack", "m", "c"), "stack", "c")
+
+
+def test_as_plan_action():
+    action = PlanAction(("put-down", "m"))
+    assert as_plan_action(action) is action
+    assert as_plan_action("(stack r g)").target == "g"
+    assert as_plan_action(("unstack", "r", "g")).kind == "pick"
+    assert as_plan_action("; nothing") is None
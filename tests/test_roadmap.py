@@ -0,0 +1,124 @@
+import types
+
+import numpy as np
+import pytest
+
+from roadmap import INVALID, UNKNOWN, VALID, Roadmap
+
+OBSTACLE = np.array([0.5, 0.5])
+OBSTACLE_RADIUS = 0.2
+
+
+class DiskWorld:
+    """Planner interface of a 2-dof point robot in [0, 1]^2 with a disk obstacle in the middle.
+
+    The robot has a root link at the origin and one link at (q0, q1, 0).
+    """
+
+    def __init__(self):
+        self.robot = types.SimpleNamespace()
+        self.n_checks = 0
+
+    def check_states_valid(self, qs):
+        qs = np.atleast_2d(qs)
+        self.n_checks += len(qs)
+        return np.linalg.norm(qs - OBSTACLE, axis=1) > OBSTACLE_RADIUS
+
+
+def link_pos(qs):
+    qs = np.atleast_2d(qs)
+    pos = np.zeros((len(qs), 2, 3))
+    pos[:, 1, :2] = qs
+    return pos
+
+
+@pytest.fixture
+def roadmap(monkeypatch):
+    roadmap = Roadmap(np.zeros(2), np.ones(2), k_neighbors=8, resolution=0.02)
+    monkeypatch.setattr(roadmap, "_compute_link_pos", lambda planner_interface, qs: link_pos(qs))
+    roadmap.build(DiskWorld(), n_nodes=300, seed=0)
+    return roadmap
+
+
+def test_build_keeps_valid_nodes(roadmap):
+    assert roadmap.n_nodes > 0
+    assert (np.linalg.norm(roadmap.nodes - OBSTACLE, axis=1) > OBSTACLE_RADIUS).all()
+    assert (roadmap.node_state == VALID).all()
+    # undirected edges without duplicates, unknown until queried
+    assert (roadmap.edges[:, 0] < roadmap.edges[:, 1]).all()
+    assert len(np.unique(roadmap.edges, axis=0)) == len(roadmap.edges)
+    assert (roadmap.edge_state == UNKNOWN).all()
+    np.testing.assert_array_equal(roadmap.link_parent, [0, 0])
+
+
+def test_query_avoids_obstacle(roadmap):
+    world = DiskWorld()
+    path = roadmap.query(world, [0.1, 0.5], [0.9, 0.5])
+    assert path is not None
+    np.testing.assert_allclose(path[0], [0.1, 0.5])
+    np.testing.assert_allclose(path[-1], [0.9, 0.5])
+    for qa, qb in zip(path[:-1], path[1:]):
+        t = np.linspace(0.0, 1.0, 50)[:, None]
+        assert world.check_states_valid(qa + t * (qb - qa)).all()
+    # what was learned is kept, the straight line through the obstacle is not part of the roadmap
+    assert (roadmap.edge_state == VALID).any()
+    assert len(roadmap.edge_state) == len(roadmap.edges)
+
+
+def test_query_reuses_checked_edges(roadmap):
+    first, second = DiskWorld(), DiskWorld()
+    roadmap.query(first, [0.1, 0.5], [0.9, 0.5])
+    roadmap.query(second, [0.1, 0.5], [0.9, 0.5])
+    # only the temporary start/goal edges are checked again
+    assert 0 < second.n_checks < first.n_checks
+
+
+def test_invalidate_near_resets_only_nearby(roadmap):
+    roadmap.edge_state[:] = VALID
+    # the link of the node closest to the upper right corner
+    i_node = int(np.argmin(np.linalg.norm(roadmap.nodes - [0.9, 0.9], axis=1)))
+    point = np.append(roadmap.nodes[i_node], 0.0)
+    n_reset = roadmap.invalidate_near(point[None], radius=0.05)
+
+    assert n_reset == int((roadmap.edge_state == UNKNOWN).sum()) > 0
+    # edges of that node are reset
+    assert roadmap.node_state[i_node] == UNKNOWN
+    assert (roadmap.edge_state[(roadmap.edges == i_node).any(axis=1)] == UNKNOWN).all()
+    # edges whose links stay in the other corner keep their state
+    far_nodes = (roadmap.nodes < 0.4).all(axis=1)
+    far_edges = far_nodes[roadmap.edges].all(axis=1)
+    assert far_edges.any() and (roadmap.edge_state[far_edges] == VALID).all()
+
+
+def test_set_attached_keeps_states_per_object(roadmap):
+    roadmap.edge_state[:] = VALID
+    roadmap.set_attached("r")
+    assert roadmap.attached == "r"
+    assert (roadmap.edge_state == UNKNOWN).all() and (roadmap.node_state == UNKNOWN).all()
+    roadmap.edge_state[:] = INVALID
+
+    # invalidation applies to the validity put aside for the empty gripper as well
+    roadmap.invalidate_near(np.array([[0.9, 0.9, 0.0]]), radius=0.05)
+    roadmap.set_attached(None)
+    assert np.isin(roadmap.edge_state, (VALID, UNKNOWN)).all()
+    assert (roadmap.edge_state == UNKNOWN).any()
+
+    roadmap.set_attached("r")
+    assert (roadmap.edge_state != VALID).all()
+
+
+def test_save_load_roundtrip(roadmap, tmp_path):
+    roadmap.query(DiskWorld(), [0.1, 0.5], [0.9, 0.5])
+    roadmap.obstacle_pos = {"r": np.array([0.1, 0.2, 0.02]), "g": np.array([0.3, 0.4, 0.02])}
+    roadmap.set_attached("g")
+    path = str(tmp_path / "roadmap.npz")
+    roadmap.save(path)
+
+    loaded = Roadmap.load(path)
+    for name in ("q_lower", "q_upper", "nodes", "node_state", "link_pos", "link_parent", "edges", "edge_state", "edge_cost"):
+        np.testing.assert_array_equal(getattr(loaded, name), getattr(roadmap, name))
+    assert loaded.k_neighbors == roadmap.k_neighbors
+    assert loaded.resolution == roadmap.resolution
+    assert loaded.attached == "g"
+    assert sorted(loaded.obstacle_pos) == ["g", "r"]
+    np.testing.assert_array_equal(loaded.obstacle_pos["r"], roadmap.obstacle_pos["r"])
@@ -0,0 +1,46 @@
+from symbolic_state import SymbolicProblem, SymbolicState, fact_to_str, facts_to_pddl, parse_facts
+
+OBJECTS = {"r": "block", "g": "block"}
+FACTS = [("on", "r", "g"), ("ontable", "g"), ("clear", "r"), ("handempty",)]
+
+
+def test_parse_facts():
+    text = "(on r g) ; a comment (ontable x)\n(handempty)\n()"
+    assert parse_facts(text) == [("on", "r", "g"), ("handempty",)]
+    assert fact_to_str(("on", "r", "g")) == "(on r g)"
+
+
+def test_equal_states_hash_equal():
+    a = SymbolicState(OBJECTS, FACTS)
+    # same facts in another order, as lists, objects inserted in another order
+    b = SymbolicState({"g": "block", "r": "block"}, [list(fact) for fact in reversed(FACTS)])
+    assert a == b and hash(a) == hash(b)
+    assert len({a, b}) == 1
+    assert {a: 1}[b] == 1
+    assert a.canonical() == b.canonical()
+    assert ("on", "r", "g") in a and ["on", "r", "g"] in a
+    assert len(a) == len(FACTS)
+
+
+def test_different_states_differ():
+    a = SymbolicState(OBJECTS, FACTS)
+    assert a != SymbolicState(OBJECTS, FACTS[:-1])
+    assert a != SymbolicState({"r": "block", "g": "slot"}, FACTS)
+    assert a.union([("holding", "r")]) != a
+    assert a.union([("handempty",)]) == a
+    assert a.select(["on"]) == SymbolicState(OBJECTS, [("on", "r", "g")])
+
+
+def test_problem_hash_and_pddl():
+    state = SymbolicState(OBJECTS, FACTS)
+    a = SymbolicProblem("BLOCKS", state, [("on", "g", "r")])
+    b = SymbolicProblem("BLOCKS", SymbolicState(OBJECTS, reversed(FACTS)), (("on", "g", "r"),))
+    assert a == b and hash(a) == hash(b)
+    assert a != SymbolicProblem("SPECIAL", state, [("on", "g", "r")])
+
+    pddl = a.to_pddl()
+    assert "(:objects g r - block)" in pddl
+    # predicates in PREDICATE_ORDER
+    assert "(:init (ontable g) (on r g) (clear r) (handempty))" in pddl
+    assert "(:goal (AND (on g r)))" in pddl
+    assert facts_to_pddl(FACTS) == state.to_pddl_init()
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("genesis")
+from trajectory import FRANKA_ACC_LIMITS, FRANKA_VEL_LIMITS, time_parameterize  # noqa: E402
+
+DT = 0.01
+VEL = np.array([1.0, 2.0])
+ACC = np.array([4.0, 4.0])
+
+
+def retime(waypoints, **kwargs):
+    return time_parameterize(np.asarray(waypoints, dtype=float), DT, vel_limits=VEL, acc_limits=ACC,
+                             vel_scale=1.0, acc_scale=1.0, **kwargs)
+
+
+def check_limits(waypoints, setpoints, vel=VEL, acc=ACC, acc_slack=1.01):
+    q = np.vstack([waypoints[:1], setpoints])
+    v = np.diff(q, axis=0) / DT
+    a = np.diff(v, axis=0) / DT
+    assert (np.abs(v) <= vel * (1 + 1e-6)).all()
+    # finite differences across a change of segment acceleration, small slack
+    assert (np.abs(a) <= acc * acc_slack).all()
+
+
+def test_straight_line_trapezoid():
+    waypoints = np.linspace([0.0, 0.0], [2.0, 1.0], 20)
+    setpoints = retime(waypoints)
+    np.testing.assert_allclose(setpoints[-1], waypoints[-1])
+    check_limits(waypoints, setpoints)
+    # joint 0 is limiting: 1 rad/s cruise after 0.25 s of acceleration, 2.25 s in total
+    assert len(setpoints) * DT == pytest.approx(2.25, abs=2 * DT)
+
+
+def test_corner_and_rest_at_ends():
+    waypoints = np.array([[0.0, 0.0], [0.5, 0.0], [0.5, 0.8], [-0.2, 0.8]])
+    setpoints = retime(waypoints)
+    # the velocity jump at a corner is one step of acceleration on top of the braking
+    check_limits(waypoints, setpoints, acc_slack=2.01)
+    np.testing.assert_allclose(setpoints[-1], waypoints[-1])
+    # starts and ends at rest
+    assert np.abs(setpoints[0] - waypoints[0]).max() <= 0.5 * ACC.max() * DT ** 2 * 1.01
+    assert np.abs(setpoints[-1] - setpoints[-2]).max() <= 0.5 * ACC.max() * DT ** 2 * 4
+
+
+def test_default_limits_and_scales():
+    waypoints = np.linspace(np.zeros(9), np.full(9, 0.5), 10)
+    setpoints = time_parameterize(waypoints, DT)
+    check_limits(waypoints, setpoints, vel=0.5 * FRANKA_VEL_LIMITS, acc=0.5 * FRANKA_ACC_LIMITS)
+    np.testing.assert_allclose(setpoints[-1], waypoints[-1])
+
+
+def test_degenerate_paths():
+    assert time_parameterize([], DT).shape == (0, 0)
+    np.testing.assert_array_equal(retime([[0.3, 0.1]]), [[0.3, 0.1]])
+    # repeated waypoints and a joint that never moves
+    setpoints = retime([[0.0, 0.5], [0.0, 0.5], [1.0, 0.5], [1.0, 0.5]])
+    np.testing.assert_allclose(setpoints[:, 1], 0.5)
+    np.testing.assert_allclose(setpoints[-1], [1.0, 0.5])
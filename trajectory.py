@@ -0,0 +1,101 @@
+"""Time-parameterization of joint-space paths.
+
+Planned paths (OMPL, straight lines, the roadmap) are lists of waypoints
+without timing. Streaming one waypoint per simulation step makes the
+execution time depend on the number of waypoints rather than on how fast
+the robot can actually move. Here a path is retimed under per-joint
+velocity and acceleration limits and resampled at the simulation rate:
+
+    1. segments longer than `max_segment` are split, then every waypoint of
+       the piecewise-linear path gets the largest path speed that keeps all
+       joints within their velocity limits on the adjacent segments, and
+       the jump of the joint velocities at a corner within one step of
+       acceleration
+    2. a forward pass (accelerating from rest) and a backward pass
+       (decelerating to rest) cap the speed with the acceleration limits,
+       which gives a trapezoidal profile on straight stretches
+    3. the path is sampled every `dt` seconds of the resulting timing
+
+Usage:
+    setpoints = time_parameterize(waypoints, dt=scene.sim_options.dt)
+    for q in setpoints:
+        robot.control_dofs_position(q)
+        scene.step()
+"""
+from typing import Optional, Sequence
+
+import numpy as np
+from genesis.utils.misc import tensor_to_array
+
+# Franka Emika Panda joint limits (rad/s, rad/s^2), fingers in m/s and m/s^2
+FRANKA_VEL_LIMITS = np.array([2.175, 2.175, 2.175, 2.175, 2.61, 2.61, 2.61, 0.2, 0.2])
+FRANKA_ACC_LIMITS = np.array([15.0, 7.5, 10.0, 12.5, 15.0, 20.0, 20.0, 1.0, 1.0])
+
+
+def time_parameterize(waypoints, dt: float, vel_limits: Optional[Sequence[float]] = None,
+                      acc_limits: Optional[Sequence[float]] = None, vel_scale: float = 0.5,
+                      acc_scale: float = 0.5, max_segment: float = 0.05) -> np.ndarray:
+    """Retime a path under velocity/acceleration limits and sample it every `dt`.
+
+    Args:
+        waypoints: (N, n_q) path (array, or list of arrays/tensors)
+        dt: sampling period, usually the simulation step (s)
+        vel_limits, acc_limits: per joint limits, the Franka limits by default
+            (the first n_q entries are used)
+        vel_scale, acc_scale: fractions of the limits to plan with
+        max_segment: longer segments are split (in the largest joint move, rad), so a single
+            segment can accelerate and brake
+
+    Returns:
+        (M, n_q) setpoints, one per `dt`, starting after the first waypoint and
+        ending exactly at the last one
+    """
+    if len(waypoints) == 0:
+        return np.zeros((0, 0))
+    q = np.stack([np.asarray(tensor_to_array(w), dtype=float) for w in waypoints])
+    n_q = q.shape[1]
+    v_max = np.asarray(FRANKA_VEL_LIMITS if vel_limits is None else vel_limits, dtype=float)[:n_q] * vel_scale
+    a_max = np.asarray(FRANKA_ACC_LIMITS if acc_limits is None else acc_limits, dtype=float)[:n_q] * acc_scale
+
+    # drop repeated waypoints, the path parameter must strictly increase
+    keep = np.concatenate([[True], np.abs(np.diff(q, axis=0)).max(axis=1) > 1e-9])
+    q = q[keep]
+    if len(q) == 1:
+        return q.copy()
+
+    # path parameter s: max joint displacement, so ds of a segment is its longest joint move
+    n_pieces = np.ceil(np.abs(np.diff(q, axis=0)).max(axis=1) / max_segment).astype(int)
+    if (n_pieces > 1).any():
+        q = np.vstack([q[:1]] + [
+            q[i] + np.arange(1, n + 1)[:, None] / n * (q[i + 1] - q[i]) for i, n in enumerate(np.maximum(n_pieces, 1))
+        ])
+    dq = np.diff(q, axis=0)
+    ds = np.abs(dq).max(axis=1)
+    direction = dq / ds[:, None]  # dq/ds per segment, |.| <= 1
+    with np.errstate(divide="ignore"):
+        seg_v = np.min(v_max[None, :] / np.abs(direction), axis=1)
+        seg_a = np.min(a_max[None, :] / np.abs(direction), axis=1)
+        # the joint velocities jump by (change of direction) * speed at a waypoint
+        corner_v = np.min(a_max[None, :] * dt / np.abs(np.diff(direction, axis=0)), axis=1)
+
+    # speed limit at every waypoint from its adjacent segments and its corner, at rest at both ends
+    v = np.empty(len(q))
+    v[1:-1] = np.minimum(np.minimum(seg_v[:-1], seg_v[1:]), corner_v)
+    v[0] = v[-1] = 0.0
+    for i in range(len(ds)):
+        v[i + 1] = min(v[i + 1], np.sqrt(v[i] ** 2 + 2.0 * seg_a[i] * ds[i]))
+    for i in range(len(ds) - 1, -1, -1):
+        v[i] = min(v[i], np.sqrt(v[i + 1] ** 2 + 2.0 * seg_a[i] * ds[i]))
+
+    # constant acceleration on every segment
+    seg_t = 2.0 * ds / np.maximum(v[:-1] + v[1:], 1e-12)
+    t = np.concatenate([[0.0], np.cumsum(seg_t)])
+
+    n_steps = max(1, int(np.ceil(t[-1] / dt)))
+    t_samples = np.minimum(np.arange(1, n_steps + 1) * dt, t[-1])
+    i_seg = np.clip(np.searchsorted(t, t_samples, side="right") - 1, 0, len(ds) - 1)
+    tau = t_samples - t[i_seg]
+    v0 = v[i_seg]
+    acc = (v[i_seg + 1] ** 2 - v0 ** 2) / (2.0 * ds[i_seg])
+    s = np.clip((v0 * tau + 0.5 * acc * tau ** 2) / ds[i_seg], 0.0, 1.0)
+    return q[i_seg] + s[:, None] * dq[i_seg]